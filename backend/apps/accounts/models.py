@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 
 class UserProfile(models.Model):
@@ -69,7 +70,8 @@ class UsageLog(models.Model):
         help_text="For tracking anonymous users"
     )
     action_type = models.CharField(max_length=50, choices=ACTION_TYPES)
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Set from the event time, since rows are written later in batches (see quotas)
+    created_at = models.DateTimeField(default=timezone.now)
     
     def __str__(self):
         user_display = self.user.username if self.user else f"Anonymous ({self.session_id[:8]})"
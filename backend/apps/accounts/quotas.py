@@ -0,0 +1,397 @@
+"""
+Tier-aware question quotas.
+
+Limits come from settings.QUESTION_QUOTAS, keyed by
+UserProfile.subscription_tier (None means unlimited), over a sliding window
+of settings.QUOTA_WINDOW_SECONDS. The window is approximated the usual way
+from two fixed buckets: the previous bucket's count, weighted by how much
+of it still overlaps the window, plus the current bucket's count.
+
+settings.QUOTA_BACKEND selects where the counters live:
+    'redis' - one atomic Lua script per check, shared by every worker
+    'local' - in-process counters, for development (per process only)
+
+Accepted questions are also queued as UsageLog entries. A background
+thread in each process writes them in batches every
+QUOTA_FLUSH_INTERVAL seconds, so the request path never touches the table.
+
+A question that gets no answer (the LLM fails or times out) is refunded:
+the bucket it was counted in is decremented. Its usage log entry stays.
+
+Quotas fail open: if Redis is unreachable, questions are allowed (and
+not logged) rather than every question failing with a server error.
+Quotas cap spend, and an outage is short next to a day's window.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+import weakref
+from dataclasses import dataclass
+from datetime import datetime, timezone as dt_timezone
+
+import redis
+import redis.asyncio
+from django.conf import settings
+from django.db import DataError, IntegrityError, OperationalError, close_old_connections, transaction
+
+from .models import UsageLog, UserProfile
+
+logger = logging.getLogger(__name__)
+
+QUESTION_ASKED = 'question_asked'
+LOCAL_MAX_KEYS = 10000
+USAGE_LOG_KEY = 'quota:usage-log'
+
+# KEYS: current bucket, previous bucket, usage log list
+# ARGV: limit (-1 for unlimited), previous bucket weight, bucket TTL, log entry
+CONSUME_SCRIPT = """
+local limit = tonumber(ARGV[1])
+local current = tonumber(redis.call('GET', KEYS[1]) or '0')
+local previous = tonumber(redis.call('GET', KEYS[2]) or '0')
+local used = math.floor(previous * tonumber(ARGV[2])) + current
+if limit >= 0 and used >= limit then
+    return {0, used}
+end
+if redis.call('INCR', KEYS[1]) == 1 then
+    redis.call('EXPIRE', KEYS[1], ARGV[3])
+end
+redis.call('RPUSH', KEYS[3], ARGV[4])
+return {1, used + 1}
+"""
+
+# KEYS: bucket. Never creates the key, so an expired bucket stays gone
+REFUND_SCRIPT = """
+local count = tonumber(redis.call('GET', KEYS[1]) or '0')
+if count > 0 then
+    return redis.call('DECR', KEYS[1])
+end
+return 0
+"""
+
+
+@dataclass(frozen=True)
+class QuotaDecision:
+    """
+    Outcome of a quota check. used includes this request if it was allowed;
+    limit is None for unlimited tiers. bucket is the counter charged, if
+    any, for refunds.
+    """
+    allowed: bool
+    used: int
+    limit: int = None
+    bucket: str = None
+
+
+def _buckets(identity, action, now):
+    window = settings.QUOTA_WINDOW_SECONDS
+    bucket = int(now // window)
+    weight = 1.0 - (now % window) / window
+    return (
+        f'quota:{action}:{identity}:{bucket}',
+        f'quota:{action}:{identity}:{bucket - 1}',
+        weight,
+    )
+
+
+class LocalQuotaBackend:
+    """
+    In-process stand-in for Redis. Counts are per process, so limits are
+    only exact with a single worker.
+    """
+
+    def __init__(self):
+        self._counts = {}
+        self._pending = []
+        self._lock = threading.Lock()
+
+    def consume(self, identity, action, limit, entry, now):
+        current_key, previous_key, weight = _buckets(identity, action, now)
+        with self._lock:
+            current = self._counts.get(current_key, 0)
+            used = int(self._counts.get(previous_key, 0) * weight) + current
+            if limit is not None and used >= limit:
+                return False, used, None
+            self._counts[current_key] = current + 1
+            self._pending.append(entry)
+            if len(self._counts) > LOCAL_MAX_KEYS:
+                self._prune(previous_key)
+        return True, used + 1, current_key
+
+    def refund(self, bucket):
+        with self._lock:
+            if self._counts.get(bucket, 0) > 0:
+                self._counts[bucket] -= 1
+
+    def _prune(self, previous_key):
+        # Drop buckets that have left the window
+        oldest = int(previous_key.rsplit(':', 1)[1])
+        self._counts = {
+            key: count for key, count in self._counts.items()
+            if int(key.rsplit(':', 1)[1]) >= oldest
+        }
+
+    async def aconsume(self, identity, action, limit, entry, now):
+        return self.consume(identity, action, limit, entry, now)
+
+    async def arefund(self, bucket):
+        self.refund(bucket)
+
+    def pop_entries(self, count):
+        with self._lock:
+            entries, self._pending = self._pending[:count], self._pending[count:]
+        return entries
+
+    def push_back(self, entries):
+        with self._lock:
+            self._pending[:0] = entries
+
+
+class RedisQuotaBackend:
+    """
+    Counters and the pending usage log in Redis, updated atomically by one
+    script call per check (a single round trip).
+    """
+
+    def __init__(self, url=None):
+        self.url = url or settings.QUOTA_REDIS_URL
+        self.client = redis.Redis.from_url(self.url)
+        self.script = self.client.register_script(CONSUME_SCRIPT)
+        self.refund_script = self.client.register_script(REFUND_SCRIPT)
+        self._async_scripts = weakref.WeakKeyDictionary()
+
+    def _args(self, identity, action, limit, entry, now):
+        current_key, previous_key, weight = _buckets(identity, action, now)
+        keys = [current_key, previous_key, USAGE_LOG_KEY]
+        args = [-1 if limit is None else limit, weight, 2 * settings.QUOTA_WINDOW_SECONDS, entry]
+        return keys, args
+
+    def consume(self, identity, action, limit, entry, now):
+        keys, args = self._args(identity, action, limit, entry, now)
+        allowed, used = self.script(keys=keys, args=args)
+        return bool(allowed), int(used), keys[0] if allowed else None
+
+    def refund(self, bucket):
+        self.refund_script(keys=[bucket])
+
+    def _loop_scripts(self):
+        # redis.asyncio clients are bound to the event loop that created them
+        loop = asyncio.get_running_loop()
+        scripts = self._async_scripts.get(loop)
+        if scripts is None:
+            client = redis.asyncio.Redis.from_url(self.url)
+            scripts = self._async_scripts[loop] = (
+                client.register_script(CONSUME_SCRIPT),
+                client.register_script(REFUND_SCRIPT),
+            )
+        return scripts
+
+    async def aconsume(self, identity, action, limit, entry, now):
+        keys, args = self._args(identity, action, limit, entry, now)
+        allowed, used = await self._loop_scripts()[0](keys=keys, args=args)
+        return bool(allowed), int(used), keys[0] if allowed else None
+
+    async def arefund(self, bucket):
+        await self._loop_scripts()[1](keys=[bucket])
+
+    def pop_entries(self, count):
+        # LPOP with a count is atomic, so concurrent flushers never share entries
+        return self.client.lpop(USAGE_LOG_KEY, count) or []
+
+    def push_back(self, entries):
+        if entries:
+            self.client.lpush(USAGE_LOG_KEY, *reversed(entries))
+
+
+QUOTA_BACKENDS = {
+    'local': LocalQuotaBackend,
+    'redis': RedisQuotaBackend,
+}
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_quota_backend():
+    """
+    Return the shared quota backend selected by settings.QUOTA_BACKEND,
+    starting this process's usage log flusher on first use.
+    """
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                backend = QUOTA_BACKENDS[settings.QUOTA_BACKEND]()
+                if settings.QUOTA_FLUSH_INTERVAL > 0:
+                    threading.Thread(
+                        target=_flush_forever,
+                        args=(backend,),
+                        name='usage-log-flusher',
+                        daemon=True,
+                    ).start()
+                _backend = backend
+    return _backend
+
+
+def tier_for(user):
+    """
+    Return a user's subscription tier; users without a profile are free.
+    """
+    try:
+        return user.profile.subscription_tier
+    except UserProfile.DoesNotExist:
+        return 'free'
+
+
+def question_limit(tier):
+    quotas = settings.QUESTION_QUOTAS
+    return quotas[tier] if tier in quotas else quotas['free']
+
+
+def _check_args(user, session_id, tier, now):
+    identity = f'user:{user.pk}' if user is not None else f'session:{session_id}'
+    entry = json.dumps([user.pk if user is not None else None, session_id, QUESTION_ASKED, now])
+    return identity, question_limit(tier), entry
+
+
+def _unavailable(limit):
+    logger.warning('Quota backend unavailable, allowing the question', exc_info=True)
+    return QuotaDecision(True, 0, limit)
+
+
+def consume_question(user=None, session_id=None, tier='free'):
+    """
+    Count one question against a user's (or anonymous session's) quota.
+    Returns a QuotaDecision; nothing is counted when it isn't allowed.
+    """
+    now = time.time()
+    identity, limit, entry = _check_args(user, session_id, tier, now)
+    try:
+        allowed, used, bucket = get_quota_backend().consume(identity, QUESTION_ASKED, limit, entry, now)
+    except redis.RedisError:
+        return _unavailable(limit)
+    return QuotaDecision(allowed, used, limit, bucket)
+
+
+async def aconsume_question(user=None, session_id=None, tier='free'):
+    """
+    Async consume_question.
+    """
+    now = time.time()
+    identity, limit, entry = _check_args(user, session_id, tier, now)
+    try:
+        allowed, used, bucket = await get_quota_backend().aconsume(identity, QUESTION_ASKED, limit, entry, now)
+    except redis.RedisError:
+        return _unavailable(limit)
+    return QuotaDecision(allowed, used, limit, bucket)
+
+
+def refund_question(decision):
+    """
+    Give back a question counted by consume_question, for one that got
+    no answer.
+    """
+    if decision.bucket is None:
+        return
+    try:
+        get_quota_backend().refund(decision.bucket)
+    except redis.RedisError:
+        logger.warning('Refunding a question failed', exc_info=True)
+
+
+async def arefund_question(decision):
+    """
+    Async refund_question.
+    """
+    if decision.bucket is None:
+        return
+    try:
+        await get_quota_backend().arefund(decision.bucket)
+    except redis.RedisError:
+        logger.warning('Refunding a question failed', exc_info=True)
+
+
+def _usage_log(entry):
+    """
+    Build the UsageLog row for a queued entry, or None if it's malformed.
+    """
+    try:
+        user_id, session_id, action_type, timestamp = json.loads(entry)
+        return UsageLog(
+            user_id=user_id,
+            session_id=session_id,
+            action_type=action_type,
+            created_at=datetime.fromtimestamp(timestamp, tz=dt_timezone.utc),
+        )
+    except (ValueError, TypeError, OverflowError):
+        logger.warning('Dropping malformed usage log entry %r', entry)
+        return None
+
+
+def _insert_usage_logs(backend, entries, logs):
+    """
+    Insert a batch of rows. If the batch violates a constraint (e.g. the
+    user was deleted since), rows are inserted one by one and the bad ones
+    dropped. On a transient database error the entries not yet written are
+    requeued. Returns the number of rows written.
+    """
+    try:
+        with transaction.atomic():
+            UsageLog.objects.bulk_create(logs)
+        return len(logs)
+    except (IntegrityError, DataError):
+        pass
+    except OperationalError:
+        backend.push_back(entries)
+        raise
+
+    written = 0
+    for index, (entry, log) in enumerate(zip(entries, logs)):
+        try:
+            with transaction.atomic():
+                UsageLog.objects.bulk_create([log])
+            written += 1
+        except (IntegrityError, DataError) as error:
+            logger.warning('Dropping usage log entry %r: %s', entry, error)
+        except OperationalError:
+            backend.push_back(entries[index:])
+            raise
+    return written
+
+
+def flush_usage_log(backend=None, batch_size=None):
+    """
+    Write queued usage entries to UsageLog in batches. Returns the number
+    of rows written. Malformed entries and rows that can't be inserted are
+    logged and dropped, so one bad entry can't block the queue; entries are
+    requeued only if the database is unavailable.
+    """
+    backend = backend or get_quota_backend()
+    batch_size = batch_size or settings.QUOTA_FLUSH_BATCH_SIZE
+    written = 0
+    while True:
+        popped = backend.pop_entries(batch_size)
+        if not popped:
+            return written
+        entries = []
+        logs = []
+        for entry in popped:
+            log = _usage_log(entry)
+            if log is not None:
+                entries.append(entry)
+                logs.append(log)
+        if logs:
+            written += _insert_usage_logs(backend, entries, logs)
+        if len(popped) < batch_size:
+            return written
+
+
+def _flush_forever(backend):
+    while True:
+        time.sleep(settings.QUOTA_FLUSH_INTERVAL)
+        close_old_connections()
+        try:
+            flush_usage_log(backend)
+        except Exception:
+            logger.exception('Flushing the usage log failed')
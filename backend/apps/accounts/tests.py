@@ -1,3 +1,115 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+import json
+
+import redis
+from django.contrib.auth.models import User
+from django.db import OperationalError
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+
+from . import quotas
+from .models import UsageLog
+from .quotas import LocalQuotaBackend, flush_usage_log
+
+DAY = 24 * 3600
+
+
+@override_settings(QUOTA_WINDOW_SECONDS=DAY)
+class LocalQuotaBackendTests(SimpleTestCase):
+    """
+    Sliding window limits, refunds and unlimited tiers.
+    """
+
+    def setUp(self):
+        self.backend = LocalQuotaBackend()
+
+    def consume(self, limit, now, identity='user:1'):
+        return self.backend.consume(identity, quotas.QUESTION_ASKED, limit, '[]', now)
+
+    def test_allows_up_to_the_limit(self):
+        results = [self.consume(3, 10 * DAY + index) for index in range(4)]
+        self.assertEqual([(allowed, used) for allowed, used, _ in results], [
+            (True, 1), (True, 2), (True, 3), (False, 3),
+        ])
+        # Denied questions aren't counted or logged
+        self.assertEqual(self.consume(3, 10 * DAY + 5)[:2], (False, 3))
+        self.assertEqual(len(self.backend.pop_entries(10)), 3)
+
+    def test_limits_are_per_identity(self):
+        self.consume(1, 10 * DAY)
+        self.assertFalse(self.consume(1, 10 * DAY)[0])
+        self.assertTrue(self.consume(1, 10 * DAY, identity='session:abc')[0])
+
+    def test_previous_bucket_counts_by_its_overlap(self):
+        for _ in range(4):
+            self.consume(4, 10 * DAY + DAY - 1)
+        # A quarter into the next bucket, 3/4 of the previous 4 still count
+        self.assertEqual(self.consume(4, 11 * DAY + DAY // 4)[:2], (True, 4))
+        self.assertFalse(self.consume(4, 11 * DAY + DAY // 4)[0])
+        self.assertTrue(self.consume(4, 11 * DAY + DAY // 2)[0])
+
+    def test_refund_frees_a_question(self):
+        for _ in range(2):
+            _, _, bucket = self.consume(2, 10 * DAY)
+        self.backend.refund(bucket)
+        self.assertEqual(self.consume(2, 10 * DAY)[:2], (True, 2))
+        self.backend.refund(bucket)
+        self.backend.refund(bucket)
+        self.backend.refund(bucket)
+        self.assertEqual(self.consume(2, 10 * DAY)[:2], (True, 1))
+
+    def test_unlimited_tier(self):
+        results = [self.consume(None, 10 * DAY) for _ in range(50)]
+        self.assertTrue(all(allowed for allowed, _, _ in results))
+
+
+class QuotaOutageTests(SimpleTestCase):
+    """
+    Quotas fail open when the backend is unreachable.
+    """
+
+    def test_redis_errors_allow_the_question(self):
+        backend = mock.Mock()
+        backend.consume.side_effect = redis.ConnectionError('down')
+        with mock.patch.object(quotas, 'get_quota_backend', return_value=backend), self.assertLogs(quotas.logger):
+            decision = quotas.consume_question(session_id='abc')
+            quotas.refund_question(decision)
+        self.assertTrue(decision.allowed)
+        backend.refund.assert_not_called()
+
+
+class FlushUsageLogTests(TransactionTestCase):
+    """
+    Bad entries are dropped without blocking the queue. Runs outside a
+    test transaction, as foreign keys are only checked on commit.
+    """
+
+    def setUp(self):
+        self.backend = LocalQuotaBackend()
+        self.user = User.objects.create_user('flush')
+
+    def queue(self, *entries):
+        self.backend._pending.extend(entries)
+
+    def entry(self, user_id=None, session_id=None):
+        return json.dumps([user_id, session_id, quotas.QUESTION_ASKED, 1700000000.0])
+
+    def test_bad_entries_are_dropped(self):
+        self.queue(
+            self.entry(self.user.pk),
+            'not json',
+            self.entry(self.user.pk + 1000),  # a deleted user
+            self.entry(session_id='abc'),
+        )
+        with self.assertLogs(quotas.logger):
+            self.assertEqual(flush_usage_log(self.backend, batch_size=10), 2)
+        self.assertEqual(UsageLog.objects.count(), 2)
+        self.assertEqual(self.backend.pop_entries(10), [])
+
+    def test_entries_are_requeued_while_the_database_is_down(self):
+        entries = [self.entry(self.user.pk), self.entry(session_id='abc')]
+        self.queue(*entries)
+        with mock.patch.object(UsageLog.objects, 'bulk_create', side_effect=OperationalError):
+            with self.assertRaises(OperationalError):
+                flush_usage_log(self.backend, batch_size=10)
+        self.assertEqual(self.backend.pop_entries(10), entries)
@@ -3,11 +3,18 @@ from .models import Conversation, Message
 
 
 class MessageInline(admin.TabularInline):
-    """Shows messages inline within a conversation"""
+    """
+    Shows messages inline within a conversation, read-only: messages are
+    only written by the chat views, which keep the conversation's
+    message_count and last_message_* in step.
+    """
     model = Message
     extra = 0
     readonly_fields = ['role', 'content', 'created_at']
     can_delete = False
+    
+    def has_add_permission(self, request, obj=None):
+        return False
 
 
 @admin.register(Conversation)
@@ -15,7 +22,15 @@ class ConversationAdmin(admin.ModelAdmin):
     list_display = ['id', 'user', 'manual', 'title', 'created_at', 'updated_at']
     list_filter = ['created_at', 'manual__category']
     search_fields = ['user__username', 'manual__name', 'title', 'session_id']
-    readonly_fields = ['created_at', 'updated_at']
+    readonly_fields = [
+        'message_count',
+        'last_message_at',
+        'last_message_preview',
+        'summary',
+        'summary_message_count',
+        'created_at',
+        'updated_at',
+    ]
     inlines = [MessageInline]
     
     def get_queryset(self, request):
@@ -30,6 +45,16 @@ class MessageAdmin(admin.ModelAdmin):
     search_fields = ['content', 'conversation__title']
     readonly_fields = ['created_at']
     
+    # Read-only, like MessageInline
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
+    
     def content_preview(self, obj):
         return obj.content[:100] + "..." if len(obj.content) > 100 else obj.content
     content_preview.short_description = 'Content'
\ No newline at end of file
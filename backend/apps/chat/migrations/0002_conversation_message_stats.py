@@ -0,0 +1,84 @@
+# Generated by Django 4.2.26 on 2026-10-17 20:31
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+
+BATCH_SIZE = 1000
+
+
+def backfill_message_stats(apps, schema_editor):
+    Conversation = apps.get_model("chat", "Conversation")
+    Message = apps.get_model("chat", "Message")
+    last_message = Message.objects.filter(conversation=OuterRef("pk")).order_by(
+        "-created_at", "-id"
+    )
+    conversations = (
+        Conversation.objects.annotate(
+            count=Count("messages"),
+            last_id=Subquery(last_message.values("id")[:1]),
+        )
+        .filter(count__gt=0)
+        .only("id")
+    )
+
+    def flush(batch):
+        last_messages = Message.objects.in_bulk([c.last_id for c in batch])
+        for conversation in batch:
+            message = last_messages[conversation.last_id]
+            content = message.content
+            conversation.message_count = conversation.count
+            conversation.last_message_at = message.created_at
+            conversation.last_message_preview = (
+                content[:100] + "..." if len(content) > 100 else content
+            )
+        Conversation.objects.bulk_update(
+            batch, ["message_count", "last_message_at", "last_message_preview"]
+        )
+
+    batch = []
+    for conversation in conversations.iterator(chunk_size=BATCH_SIZE):
+        batch.append(conversation)
+        if len(batch) == BATCH_SIZE:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("chat", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="conversation",
+            name="last_message_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="conversation",
+            name="last_message_preview",
+            field=models.CharField(blank=True, max_length=103),
+        ),
+        migrations.AddField(
+            model_name="conversation",
+            name="message_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_message_stats, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="conversation",
+            index=models.Index(
+                fields=["user", "-updated_at"], name="conversatio_user_id_e93dff_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="conversation",
+            index=models.Index(
+                fields=["session_id", "-updated_at"],
+                name="conversatio_session_ab6e4b_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.2.26 on 2026-10-17 20:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("chat", "0002_conversation_message_stats"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="message",
+            index=models.Index(
+                fields=["conversation", "created_at", "id"],
+                name="messages_convers_5267e1_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 4.2.26 on 2026-10-17 20:38
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+# Punctuation is replaced before parsing, as for manuals, so "SH-101" is
+# indexed as "sh" and "101" (see apps/chat/search.py for the query side).
+SEARCH_VECTOR_TRIGGER = """
+CREATE OR REPLACE FUNCTION messages_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := to_tsvector(
+        'english', regexp_replace(coalesce(NEW.content, ''), '[^[:alnum:]]+', ' ', 'g')
+    );
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER messages_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF content ON messages
+    FOR EACH ROW EXECUTE FUNCTION messages_search_vector_update();
+
+UPDATE messages SET content = content;
+"""
+
+DROP_SEARCH_VECTOR_TRIGGER = """
+DROP TRIGGER IF EXISTS messages_search_vector_trigger ON messages;
+DROP FUNCTION IF EXISTS messages_search_vector_update();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("chat", "0003_message_keyset_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="message",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="message",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"], name="messages_search_vector_gin"
+            ),
+        ),
+        migrations.RunSQL(SEARCH_VECTOR_TRIGGER, DROP_SEARCH_VECTOR_TRIGGER),
+    ]
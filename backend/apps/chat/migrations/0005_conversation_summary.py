@@ -0,0 +1,23 @@
+# Generated by Django 4.2.26 on 2026-10-17 20:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("chat", "0004_message_search_vector"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="conversation",
+            name="summary",
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name="conversation",
+            name="summary_message_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
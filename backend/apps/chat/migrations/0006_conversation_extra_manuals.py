@@ -0,0 +1,24 @@
+# Generated by Django 4.2.26 on 2026-10-17 20:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("manuals", "0002_manual_search_vector"),
+        ("chat", "0005_conversation_summary"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="conversation",
+            name="extra_manuals",
+            field=models.ManyToManyField(
+                blank=True,
+                help_text="Other manuals searched along with manual, for questions spanning devices",
+                related_name="+",
+                to="manuals.manual",
+            ),
+        ),
+    ]
@@ -1,5 +1,18 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.db.models import F
 from django.contrib.auth.models import User
+from django.utils import timezone
+
+PREVIEW_LENGTH = 100
+
+
+def message_preview(content):
+    """
+    Truncated message content for conversation listings.
+    """
+    return content[:PREVIEW_LENGTH] + "..." if len(content) > PREVIEW_LENGTH else content
 
 
 class Conversation(models.Model):
@@ -20,6 +33,12 @@ class Conversation(models.Model):
         on_delete=models.CASCADE,
         related_name='conversations'
     )
+    extra_manuals = models.ManyToManyField(
+        'manuals.Manual',
+        blank=True,
+        related_name='+',
+        help_text="Other manuals searched along with manual, for questions spanning devices"
+    )
     title = models.CharField(
         max_length=255,
         blank=True,
@@ -31,6 +50,15 @@ class Conversation(models.Model):
         null=True,
         help_text="For tracking anonymous users"
     )
+    # Denormalized from messages so listings don't touch the messages table;
+    # kept current by record_messages()
+    message_count = models.PositiveIntegerField(default=0)
+    last_message_at = models.DateTimeField(null=True, blank=True)
+    last_message_preview = models.CharField(max_length=PREVIEW_LENGTH + 3, blank=True)
+    # Rolling summary of the oldest summary_message_count messages, which
+    # prompts use in place of them; kept current by summarize_conversation
+    summary = models.TextField(blank=True)
+    summary_message_count = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -38,9 +66,31 @@ class Conversation(models.Model):
         user_display = self.user.username if self.user else f"Anonymous ({self.session_id[:8]})"
         return f"{user_display} - {self.manual.name}"
     
+    def record_messages(self, messages):
+        """
+        Apply newly created messages (oldest first) to the denormalized
+        fields of this instance and return the matching update() kwargs,
+        so callers can save them in one UPDATE with F() for the count.
+        """
+        last = messages[-1]
+        self.message_count += len(messages)
+        self.last_message_at = last.created_at
+        self.last_message_preview = message_preview(last.content)
+        self.updated_at = timezone.now()
+        return {
+            'message_count': F('message_count') + len(messages),
+            'last_message_at': self.last_message_at,
+            'last_message_preview': self.last_message_preview,
+            'updated_at': self.updated_at,
+        }
+    
     class Meta:
         db_table = 'conversations'
         ordering = ['-updated_at']
+        indexes = [
+            models.Index(fields=['user', '-updated_at']),
+            models.Index(fields=['session_id', '-updated_at']),
+        ]
         verbose_name = 'Conversation'
         verbose_name_plural = 'Conversations'
 
@@ -62,6 +112,9 @@ class Message(models.Model):
     )
     role = models.CharField(max_length=20, choices=ROLE_CHOICES)
     content = models.TextField()
+    # Maintained by a database trigger from content
+    # (see migration 0004_message_search_vector)
+    search_vector = SearchVectorField(null=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     
     def __str__(self):
@@ -71,5 +124,10 @@ class Message(models.Model):
     class Meta:
         db_table = 'messages'
         ordering = ['created_at']
+        indexes = [
+            # Keyset pagination (see MessageKeysetPagination)
+            models.Index(fields=['conversation', 'created_at', 'id']),
+            GinIndex(fields=['search_vector'], name='messages_search_vector_gin'),
+        ]
         verbose_name = 'Message'
         verbose_name_plural = 'Messages'
\ No newline at end of file
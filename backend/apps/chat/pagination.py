@@ -0,0 +1,120 @@
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, CursorPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class ConversationCursorPagination(CursorPagination):
+    """
+    Conversations, most recently active first. Cursor pagination keeps
+    each page a single indexed range scan however many conversations
+    a user has.
+    """
+    ordering = '-updated_at'
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class MessageSearchPagination(CursorPagination):
+    """
+    Message search results, newest first.
+    """
+    ordering = ('-created_at', '-id')
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class MessageKeysetPagination(BasePagination):
+    """
+    Keyset pagination over a conversation's messages on (created_at, id),
+    served by the messages(conversation_id, created_at, id) index, so
+    any page costs the same however long the conversation is.
+    
+    With no cursor the latest page is returned. `?before=<cursor>` returns
+    the page of older messages, `?after=<cursor>` the page of newer ones.
+    Results are always oldest first; `previous` links to older messages
+    and `next` to newer ones.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+    
+    @staticmethod
+    def encode_cursor(message):
+        position = f'{message.created_at.isoformat()}|{message.pk}'
+        return base64.urlsafe_b64encode(position.encode('ascii')).decode('ascii')
+    
+    @staticmethod
+    def decode_cursor(cursor):
+        try:
+            created_at, pk = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('ascii').split('|')
+            return datetime.fromisoformat(created_at), int(pk)
+        except (ValueError, UnicodeError):
+            raise NotFound('Invalid cursor')
+    
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        before = request.query_params.get('before')
+        after = request.query_params.get('after')
+        
+        if after:
+            created_at, pk = self.decode_cursor(after)
+            # (created_at, id) > cursor; the first condition bounds the index scan
+            queryset = queryset.filter(
+                Q(created_at__gt=created_at) | Q(pk__gt=pk),
+                created_at__gte=created_at,
+            ).order_by('created_at', 'id')
+            page = list(queryset[:page_size + 1])
+            self.has_newer = len(page) > page_size
+            self.has_older = True
+            page = page[:page_size]
+        else:
+            if before:
+                created_at, pk = self.decode_cursor(before)
+                queryset = queryset.filter(
+                    Q(created_at__lt=created_at) | Q(pk__lt=pk),
+                    created_at__lte=created_at,
+                )
+            page = list(queryset.order_by('-created_at', '-id')[:page_size + 1])
+            self.has_older = len(page) > page_size
+            self.has_newer = bool(before)
+            page = page[:page_size][::-1]
+        
+        self.page = page
+        return page
+    
+    def _link(self, param, message):
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(remove_query_param(url, 'before'), 'after')
+        return replace_query_param(url, param, self.encode_cursor(message))
+    
+    def get_previous_link(self):
+        if not self.page or not self.has_older:
+            return None
+        return self._link('before', self.page[0])
+    
+    def get_next_link(self):
+        if not self.page or not self.has_newer:
+            return None
+        return self._link('after', self.page[-1])
+    
+    def get_paginated_response(self, data):
+        return Response({
+            'previous': self.get_previous_link(),
+            'next': self.get_next_link(),
+            'results': data,
+        })
@@ -0,0 +1,62 @@
+"""
+Full-text search over a user's messages.
+
+Message.search_vector is kept by a database trigger (migration 0004) from
+the content with punctuation replaced by spaces, under the English config.
+Queries get the same treatment, so "sh-101" and "SH 101" both find
+"SH-101". Quoted phrases and "or" keep their websearch meaning.
+"""
+import re
+
+from django.contrib.postgres.search import SearchHeadline, SearchQuery
+from django.db.models import Value
+from django.db.models.functions import Replace
+
+SEARCH_CONFIG = 'english'
+
+# Matches the trigger's regexp_replace; quotes are kept for phrase search
+_PUNCTUATION = re.compile(r'(?:[^\w"]|_)+')
+
+# Escaping happens before ts_headline, which would otherwise drop anything
+# that looks like a tag ("<filter>") from the snippet
+_HTML_ESCAPES = [('&', '&amp;'), ('<', '&lt;'), ('>', '&gt;')]
+
+
+def message_search_query(value):
+    """
+    Build the tsquery for a search string, or None if it has no terms.
+    """
+    value = _PUNCTUATION.sub(' ', value).strip()
+    if not value.strip('" '):
+        return None
+    return SearchQuery(value, search_type='websearch', config=SEARCH_CONFIG)
+
+
+def highlight_snippets(messages, query):
+    """
+    Return {message id: snippet} for a page of messages, with matching
+    words wrapped in <mark> and everything else HTML-escaped.
+
+    Headlines are only generated for the page, in one query, since
+    ts_headline re-parses the whole message.
+    """
+    if not messages:
+        return {}
+    content = 'content'
+    for character, entity in _HTML_ESCAPES:
+        content = Replace(content, Value(character), Value(entity))
+    model = type(messages[0])
+    rows = model.objects.filter(pk__in=[message.pk for message in messages]).annotate(
+        snippet=SearchHeadline(
+            content,
+            query,
+            config=SEARCH_CONFIG,
+            start_sel='<mark>',
+            stop_sel='</mark>',
+            max_words=35,
+            min_words=15,
+            max_fragments=2,
+            fragment_delimiter=' … ',
+        )
+    ).values_list('pk', 'snippet')
+    return dict(rows)
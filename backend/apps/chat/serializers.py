@@ -1,7 +1,16 @@
 from rest_framework import serializers
 from .models import Conversation, Message
+from apps.accounts.quotas import tier_for
+from apps.manuals.models import Manual, accessible_manuals
 from apps.manuals.serializers import ManualListSerializer
 
+# Messages embedded in the conversation detail
+RECENT_MESSAGES = 50
+
+# Manuals a conversation can search besides its own; each is searched
+# concurrently for every question
+MAX_EXTRA_MANUALS = 4
+
 
 class MessageSerializer(serializers.ModelSerializer):
     """
@@ -14,13 +23,47 @@ class MessageSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at']
 
 
+class MessageSearchResultSerializer(serializers.ModelSerializer):
+    """
+    A message matching a search, with its conversation and a highlighted
+    snippet (HTML-escaped, matches wrapped in <mark>).
+    """
+    conversation_title = serializers.CharField(source='conversation.title', read_only=True)
+    manual_name = serializers.CharField(source='conversation.manual.name', read_only=True)
+    snippet = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = Message
+        fields = [
+            'id',
+            'conversation',
+            'conversation_title',
+            'manual_name',
+            'role',
+            'snippet',
+            'created_at',
+        ]
+    
+    def get_snippet(self, obj):
+        return self.context.get('snippets', {}).get(obj.pk, '')
+
+
 class ConversationSerializer(serializers.ModelSerializer):
     """
-    Serializer for conversations with nested messages.
+    Serializer for conversations with their latest messages.
+    Older messages are paged from /api/conversations/:id/messages/.
     """
-    messages = MessageSerializer(many=True, read_only=True)
+    messages = serializers.SerializerMethodField()
     manual = ManualListSerializer(read_only=True)
     manual_id = serializers.IntegerField(write_only=True)
+    extra_manuals = ManualListSerializer(many=True, read_only=True)
+    extra_manual_ids = serializers.PrimaryKeyRelatedField(
+        queryset=Manual.objects.all(),
+        many=True,
+        write_only=True,
+        required=False,
+        source='extra_manuals',
+    )
     
     class Meta:
         model = Conversation
@@ -29,13 +72,29 @@ class ConversationSerializer(serializers.ModelSerializer):
             'user',
             'manual',
             'manual_id',
+            'extra_manuals',
+            'extra_manual_ids',
             'title',
             'session_id',
             'messages',
+            'message_count',
             'created_at',
             'updated_at',
         ]
-        read_only_fields = ['id', 'user', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'user', 'message_count', 'created_at', 'updated_at']
+    
+    def validate_extra_manual_ids(self, manuals):
+        if len(manuals) > MAX_EXTRA_MANUALS:
+            raise serializers.ValidationError(f'At most {MAX_EXTRA_MANUALS} extra manuals are allowed.')
+        request = self.context.get('request')
+        tier = tier_for(request.user) if request and request.user.is_authenticated else 'free'
+        if len(accessible_manuals(manuals, tier)) < len(manuals):
+            raise serializers.ValidationError('Premium manuals require a premium subscription.')
+        return manuals
+    
+    def get_messages(self, obj):
+        latest = obj.messages.order_by('-created_at', '-id')[:RECENT_MESSAGES]
+        return MessageSerializer(list(latest)[::-1], many=True).data
     
     def create(self, validated_data):
         # Auto-set user from request context
@@ -48,10 +107,9 @@ class ConversationSerializer(serializers.ModelSerializer):
 class ConversationListSerializer(serializers.ModelSerializer):
     """
     Lightweight serializer for conversation listings (without all messages).
+    Counts and previews come from the conversation row itself.
     """
     manual = ManualListSerializer(read_only=True)
-    message_count = serializers.SerializerMethodField()
-    last_message_preview = serializers.SerializerMethodField()
     
     class Meta:
         model = Conversation
@@ -61,16 +119,7 @@ class ConversationListSerializer(serializers.ModelSerializer):
             'title',
             'message_count',
             'last_message_preview',
+            'last_message_at',
             'created_at',
             'updated_at',
         ]
-    
-    def get_message_count(self, obj):
-        return obj.messages.count()
-    
-    def get_last_message_preview(self, obj):
-        last_message = obj.messages.last()
-        if last_message:
-            preview = last_message.content[:100]
-            return preview + "..." if len(last_message.content) > 100 else preview
-        return None
\ No newline at end of file
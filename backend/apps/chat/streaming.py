@@ -0,0 +1,55 @@
+"""
+Server-Sent Events support for streaming chat answers.
+
+A client asks for a stream with `Accept: text/event-stream` (or
+`?format=sse`) on POST /api/conversations/:id/messages/ and receives:
+
+    event: user_message   the question ({"role", "content"}), not yet saved
+    event: token          {"text": "..."} for each text delta
+    event: done           the saved user and assistant Messages and citations
+    event: error          {"error": "..."} if the answer failed
+
+Streams are async iterators, so under the ASGI application each token is
+flushed to the client as soon as the LLM produces it. Errors before the
+stream starts are sent as a single error event with the HTTP status.
+"""
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+EVENT_STREAM_MEDIA_TYPE = 'text/event-stream'
+
+EVENT_STREAM_HEADERS = {
+    'Cache-Control': 'no-cache',
+    # Stop nginx from buffering the stream
+    'X-Accel-Buffering': 'no',
+}
+
+
+def sse_event(event, data):
+    """
+    Encode one Server-Sent Event with a JSON payload.
+    """
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'.encode('utf-8')
+
+
+async def answer_events(user_message, answer_stream, finish, on_error=None):
+    """
+    Yield the SSE events for one exchange. `finish(text)` is an async
+    callable that saves the exchange once the answer is complete and
+    returns the serialized messages to send with the done event;
+    `on_error()`, if given, is awaited when the answer fails.
+    """
+    yield sse_event('user_message', user_message)
+    try:
+        async for delta in answer_stream:
+            yield sse_event('token', {'text': delta})
+        messages = await finish(answer_stream.text)
+    except Exception:
+        logger.exception('Streaming answer failed')
+        if on_error is not None:
+            await on_error()
+        yield sse_event('error', {'error': 'The answer could not be generated'})
+        return
+    yield sse_event('done', {**messages, 'citations': answer_stream.citations})
@@ -0,0 +1,74 @@
+"""
+Rolling conversation summaries.
+
+Conversation.summary covers the first summary_message_count messages,
+and prompts carry every message after them (see
+apps.rag.query_pipeline.history_limit), so no message falls between the
+two, even one the packer had to leave out. Once RAG_SUMMARY_BATCH_MESSAGES
+messages beyond the last HISTORY_MESSAGES are unsummarized, an exchange
+queues summarize_conversation, which folds just those messages into the
+summary with one LLM call. A turn therefore costs the same however long
+the conversation gets.
+"""
+from django.conf import settings
+
+from apps.rag.openai_client import chat_completion
+from apps.rag.query_pipeline import HISTORY_MESSAGES
+from .models import Conversation
+
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a conversation between a user and "
+    "Elucia, an assistant answering questions about a music gear manual. "
+    "Update the summary with the new messages. Keep the user's goals, their "
+    "setup, what was answered and any page references; drop small talk. "
+    "Reply with the summary only, in under {words} words."
+)
+
+
+def unsummarized_count(conversation):
+    """
+    Return how many messages before the history window aren't summarized.
+    """
+    return conversation.message_count - HISTORY_MESSAGES - conversation.summary_message_count
+
+
+def needs_summary(conversation):
+    batch = settings.RAG_SUMMARY_BATCH_MESSAGES
+    return batch > 0 and unsummarized_count(conversation) >= batch
+
+
+def summary_messages(summary, messages):
+    """
+    Build the chat messages asking the LLM to fold messages into summary.
+    """
+    transcript = '\n\n'.join(f'{message.role}: {message.content}' for message in messages)
+    return [
+        # About 0.75 words per token
+        {'role': 'system', 'content': SUMMARY_PROMPT.format(words=settings.RAG_SUMMARY_TOKENS * 3 // 4)},
+        {'role': 'user', 'content': f"Summary so far:\n{summary or '(none)'}\n\nNew messages:\n{transcript}"},
+    ]
+
+
+def update_summary(conversation_id):
+    """
+    Fold the messages that left the history window into the conversation's
+    summary. Returns True if the summary changed.
+
+    The LLM call runs outside any transaction; the summary is saved only
+    if no concurrent update got there first.
+    """
+    conversation = Conversation.objects.only(
+        'message_count', 'summary', 'summary_message_count'
+    ).get(pk=conversation_id)
+    count = unsummarized_count(conversation)
+    if count <= 0:
+        return False
+    start = conversation.summary_message_count
+    messages = list(
+        conversation.messages.order_by('created_at', 'id').only('role', 'content')[start:start + count]
+    )
+    summary = chat_completion(summary_messages(conversation.summary, messages)).strip()
+    return Conversation.objects.filter(pk=conversation_id, summary_message_count=start).update(
+        summary=summary,
+        summary_message_count=start + len(messages),
+    ) == 1
@@ -0,0 +1,11 @@
+from celery import shared_task
+
+from .summary import update_summary
+
+
+@shared_task(ignore_result=True)
+def summarize_conversation(conversation_id):
+    """
+    Update a conversation's rolling summary (see summary.py).
+    """
+    update_summary(conversation_id)
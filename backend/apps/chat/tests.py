@@ -1,3 +1,231 @@
-from django.test import TestCase
+import json
+from unittest import mock
+from urllib.parse import parse_qs, urlsplit
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from apps.accounts import quotas
+from apps.accounts.quotas import LocalQuotaBackend, consume_question
+from apps.manuals.models import Manual
+from apps.rag.async_pipeline import arecent_history
+from apps.rag.query_pipeline import AnswerStream, recent_history
+from .models import Conversation, Message
+from .pagination import MessageKeysetPagination
+
+
+class MessageKeysetPaginationTests(TestCase):
+    """
+    Pages walk (created_at, id) without gaps or repeats, including
+    messages saved in the same instant.
+    """
+    
+    @classmethod
+    def setUpTestData(cls):
+        manual = Manual.objects.create(name='SH-101', manufacturer='Roland', pdf_path='Roland/SH-101.pdf')
+        cls.conversation = Conversation.objects.create(manual=manual, session_id='test-session')
+        messages = Message.objects.bulk_create(
+            Message(conversation=cls.conversation, role='user', content=f'Message {index}')
+            for index in range(7)
+        )
+        # Ties on created_at: 0-2 share one instant and 3-6 another
+        first, second = timezone.now(), timezone.now() + timezone.timedelta(seconds=1)
+        for index, message in enumerate(messages):
+            message.created_at = first if index < 3 else second
+        Message.objects.bulk_update(messages, ['created_at'])
+        cls.ids = [message.pk for message in messages]
+    
+    def paginate(self, **params):
+        paginator = MessageKeysetPagination()
+        request = Request(APIRequestFactory().get('/messages/', {'page_size': 3, **params}))
+        page = paginator.paginate_queryset(self.conversation.messages.all(), request)
+        return paginator, [message.pk for message in page]
+    
+    @staticmethod
+    def cursor(link, param):
+        return parse_qs(urlsplit(link).query)[param][0]
+    
+    def test_latest_page_then_older_pages(self):
+        paginator, page = self.paginate()
+        self.assertEqual(page, self.ids[4:])
+        self.assertIsNone(paginator.get_next_link())
+        
+        seen = page
+        while paginator.get_previous_link():
+            paginator, page = self.paginate(before=self.cursor(paginator.get_previous_link(), 'before'))
+            seen = page + seen
+        self.assertEqual(seen, self.ids)
+    
+    def test_after_walks_forward_through_ties(self):
+        cursor = MessageKeysetPagination.encode_cursor(Message.objects.get(pk=self.ids[1]))
+        paginator, page = self.paginate(after=cursor)
+        self.assertEqual(page, self.ids[2:5])
+        
+        paginator, page = self.paginate(after=self.cursor(paginator.get_next_link(), 'after'))
+        self.assertEqual(page, self.ids[5:])
+        self.assertIsNone(paginator.get_next_link())
+    
+    def test_before_excludes_the_cursor_message(self):
+        cursor = MessageKeysetPagination.encode_cursor(Message.objects.get(pk=self.ids[4]))
+        _, page = self.paginate(before=cursor)
+        self.assertEqual(page, self.ids[1:4])
+
+
+class ConversationListTests(TestCase):
+    """
+    The conversation list reads counts and previews from the conversation rows.
+    """
+    
+    def test_query_count_does_not_grow_with_conversations(self):
+        user = User.objects.create_user('alice', password='secret')
+        for index in range(5):
+            manual = Manual.objects.create(name=f'Synth {index}', manufacturer='Roland', pdf_path=f'Roland/{index}.pdf')
+            conversation = Conversation.objects.create(manual=manual, user=user)
+            Message.objects.bulk_create(
+                Message(conversation=conversation, role=role, content=f'{role} {index}')
+                for role in ('user', 'assistant')
+            )
+        self.client.force_login(user)
+        
+        # Session, user, one page of conversations with their manuals
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/conversations/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 5)
+
+
+class MessageSearchTests(TestCase):
+    """
+    Full-text search stays within the caller's conversations.
+    """
+    
+    def test_only_the_callers_messages_match(self):
+        manual = Manual.objects.create(name='SH-101', manufacturer='Roland', pdf_path='Roland/SH-101.pdf')
+        alice = User.objects.create_user('alice', password='secret')
+        bob = User.objects.create_user('bob', password='secret')
+        mine = Conversation.objects.create(manual=manual, user=alice)
+        theirs = Conversation.objects.create(manual=manual, user=bob)
+        anonymous = Conversation.objects.create(manual=manual, session_id='other-session')
+        for conversation in (mine, theirs, anonymous):
+            Message.objects.create(conversation=conversation, role='user', content='How do I set the filter envelope?')
+        Message.objects.create(conversation=mine, role='assistant', content='Press the arpeggio button.')
+        self.client.force_login(alice)
+        
+        response = self.client.get('/api/conversations/search/', {'q': 'filter envelope'})
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual([result['conversation'] for result in results], [mine.pk])
+        self.assertIn('<mark>', results[0]['snippet'])
+
+
+@override_settings(RAG_SUMMARY_BATCH_MESSAGES=6)
+class ConversationHistoryTests(TestCase):
+    """
+    Prompt history starts where the rolling summary ends.
+    """
+    
+    @classmethod
+    def setUpTestData(cls):
+        manual = Manual.objects.create(name='SH-101', manufacturer='Roland', pdf_path='Roland/SH-101.pdf')
+        cls.conversation = Conversation.objects.create(manual=manual, session_id='test-session', message_count=20)
+        messages = Message.objects.bulk_create(
+            Message(conversation=cls.conversation, role='user', content=f'Message {index}')
+            for index in range(20)
+        )
+        cls.ids = [message.pk for message in messages]
+    
+    def history(self, summarized):
+        self.conversation.summary_message_count = summarized
+        synced = [message.pk for message in recent_history(self.conversation)]
+        awaited = [message.pk for message in async_to_sync(arecent_history)(self.conversation)]
+        self.assertEqual(synced, awaited)
+        return synced
+    
+    def test_history_covers_every_unsummarized_message(self):
+        self.assertEqual(self.history(10), self.ids[10:])
+        self.assertEqual(self.history(20), [])
+    
+    def test_history_is_capped_when_the_summary_lags(self):
+        self.assertEqual(self.history(0), self.ids[-12:])
+
+
+async def failing_deltas(messages):
+    yield 'Half an '
+    raise RuntimeError('connection reset')
+
+
+@override_settings(RAG_CHAT_PROVIDER='stub', QUESTION_QUOTAS={'free': 5})
+class SendMessageTests(TestCase):
+    """
+    Streamed answers and quota refunds in the async send_message view.
+    """
+    
+    def setUp(self):
+        manual = Manual.objects.create(name='SH-101', manufacturer='Roland', pdf_path='Roland/SH-101.pdf')
+        self.user = User.objects.create_user('alice', password='secret')
+        self.conversation = Conversation.objects.create(manual=manual, user=self.user)
+        self.async_client.force_login(self.user)
+        self.url = f'/api/conversations/{self.conversation.pk}/messages/'
+        # A fresh quota backend, so used counts start at zero
+        backend = mock.patch.object(quotas, '_backend', LocalQuotaBackend())
+        backend.start()
+        self.addCleanup(backend.stop)
+        citations = [{'page': 3, 'heading': 'VCF'}]
+        stream = AnswerStream(manual, citations, messages=[
+            {'role': 'system', 'content': '[page 3] Turn the cutoff knob.'},
+            {'role': 'user', 'content': 'How do I open the filter?'},
+        ])
+        answer = mock.patch('apps.chat.views.astream_answer', mock.AsyncMock(return_value=stream))
+        answer.start()
+        self.addCleanup(answer.stop)
+    
+    async def stream(self):
+        response = await self.async_client.post(
+            self.url,
+            {'content': 'How do I open the filter?'},
+            content_type='application/json',
+            headers={'Accept': 'text/event-stream'},
+        )
+        self.assertEqual(response.status_code, 200)
+        body = b''.join([chunk async for chunk in response.streaming_content]).decode()
+        return [
+            (lines[0].removeprefix('event: '), json.loads(lines[1].removeprefix('data: ')))
+            for lines in (event.split('\n') for event in body.split('\n\n') if event)
+        ]
+    
+    def used_questions(self):
+        # Counting one more question reports how many were already used
+        return consume_question(self.user).used - 1
+    
+    async def test_events_arrive_in_order(self):
+        events = await self.stream()
+        names = [name for name, _ in events]
+        self.assertEqual(names[0], 'user_message')
+        self.assertEqual(set(names[1:-1]), {'token'})
+        self.assertEqual(names[-1], 'done')
+        
+        text = ''.join(data['text'] for name, data in events if name == 'token')
+        done = events[-1][1]
+        self.assertEqual(done['ai_message']['content'], text)
+        self.assertEqual(done['user_message']['content'], 'How do I open the filter?')
+        self.assertEqual(done['citations'], [{'page': 3, 'heading': 'VCF'}])
+        self.assertEqual(await Message.objects.filter(conversation=self.conversation).acount(), 2)
+        self.assertEqual(await sync_to_async(self.used_questions)(), 1)
+    
+    async def test_content_must_be_a_non_blank_string(self):
+        for body in ({'content': 5}, {'content': '   '}, {}, ['x']):
+            response = await self.async_client.post(self.url, body, content_type='application/json')
+            self.assertEqual(response.status_code, 400, body)
+        self.assertEqual(await sync_to_async(self.used_questions)(), 0)
+    
+    async def test_failed_answer_sends_an_error_and_refunds_the_question(self):
+        with mock.patch('apps.rag.query_pipeline.stream_chat_completion', failing_deltas):
+            with self.assertLogs('apps.chat.streaming', 'ERROR'):
+                events = await self.stream()
+        self.assertEqual([name for name, _ in events], ['user_message', 'token', 'error'])
+        self.assertFalse(await Message.objects.filter(conversation=self.conversation).aexists())
+        self.assertEqual(await sync_to_async(self.used_questions)(), 0)
@@ -1,8 +1,11 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import ConversationViewSet
+from .views import ConversationViewSet, conversation_messages
 
 router = DefaultRouter()
 router.register(r'conversations', ConversationViewSet, basename='conversation')
 
-urlpatterns = router.urls
\ No newline at end of file
+urlpatterns = [
+    # Async view, outside the DRF viewset (see send_message)
+    path('conversations/<int:pk>/messages/', conversation_messages, name='conversation-messages'),
+] + router.urls
@@ -1,38 +1,70 @@
-from rest_framework import viewsets, status
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from rest_framework import generics, status, viewsets
 from rest_framework.decorators import action
-from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticatedOrReadOnly
+from rest_framework.response import Response
+from apps.accounts.quotas import aconsume_question, arefund_question, tier_for
+from apps.manuals.models import accessible_manuals
+from apps.rag.async_pipeline import aanswer_question, astream_answer
+from elucia.db_routing import ReplicaReadMixin
 from .models import Conversation, Message
+from .pagination import ConversationCursorPagination, MessageKeysetPagination, MessageSearchPagination
+from .search import highlight_snippets, message_search_query
+from .summary import needs_summary
+from .streaming import EVENT_STREAM_HEADERS, EVENT_STREAM_MEDIA_TYPE, answer_events, sse_event
+from .tasks import summarize_conversation
 from .serializers import (
     ConversationSerializer,
     ConversationListSerializer,
+    MessageSearchResultSerializer,
     MessageSerializer
 )
 
 
-class ConversationViewSet(viewsets.ModelViewSet):
+def conversations_for(request):
+    # Return user's conversations or anonymous by session_id
+    if request.user.is_authenticated:
+        return Conversation.objects.filter(user=request.user).select_related('manual')
+    else:
+        session_id = request.session.session_key
+        if not session_id:
+            # session_id=None would match every user's conversations
+            return Conversation.objects.none()
+        return Conversation.objects.filter(session_id=session_id).select_related('manual')
+
+
+class ConversationViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     """
     API endpoint for conversations.
-    GET /api/conversations/ - List user's conversations
+    GET /api/conversations/ - List user's conversations (cursor-paginated)
     POST /api/conversations/ - Create new conversation
-    GET /api/conversations/:id/ - Get conversation with all messages
+    GET /api/conversations/search/?q= - Search messages (see search)
+    GET /api/conversations/:id/ - Get conversation with its latest messages
     DELETE /api/conversations/:id/ - Delete conversation
-    POST /api/conversations/:id/messages/ - Send a message (placeholder)
+    GET /api/conversations/:id/messages/ - Page through messages (see MessageListView)
+    POST /api/conversations/:id/messages/ - Send a message (see send_message)
+    
+    Reads are served from a replica (see elucia/db_routing.py).
     """
     serializer_class = ConversationSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
+    pagination_class = ConversationCursorPagination
+    replica_actions = ('list', 'retrieve', 'search')
     
     def get_queryset(self):
-        # Return user's conversations or anonymous by session_id
-        if self.request.user.is_authenticated:
-            return Conversation.objects.filter(user=self.request.user).select_related('manual')
-        else:
-            session_id = self.request.session.session_key
-            return Conversation.objects.filter(session_id=session_id).select_related('manual')
+        return conversations_for(self.request)
     
     def get_serializer_class(self):
         if self.action == 'list':
             return ConversationListSerializer
+        if self.action == 'search':
+            return MessageSearchResultSerializer
         return ConversationSerializer
     
     def perform_create(self, serializer):
@@ -44,48 +76,195 @@ class ConversationViewSet(viewsets.ModelViewSet):
                 self.request.session.create()
             serializer.save(session_id=self.request.session.session_key)
     
-    @action(detail=True, methods=['post'])
-    def messages(self, request, pk=None):
+    @action(detail=False, pagination_class=MessageSearchPagination)
+    def search(self, request):
         """
-        Send a message in a conversation.
-        POST /api/conversations/:id/messages/
-        Body: {"content": "How do I...?"}
-        
-        TODO: Integrate RAG pipeline here
+        Full-text search over the messages of the caller's conversations.
+        GET /api/conversations/search/?q=filter envelope
+        Results are newest first, cursor-paginated, each with a snippet
+        highlighting the matches (see search.py).
         """
-        conversation = self.get_object()
-        content = request.data.get('content')
+        query = message_search_query(request.query_params.get('q', ''))
+        if query is None:
+            return Response({'error': 'A search query (q) is required'}, status=status.HTTP_400_BAD_REQUEST)
         
-        if not content:
-            return Response(
-                {'error': 'Content is required'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+        messages = Message.objects.filter(
+            conversation__in=self.get_queryset().values('pk'),
+            search_vector=query,
+        ).select_related('conversation__manual').defer('content', 'search_vector')
+        page = self.paginate_queryset(messages)
+        context = self.get_serializer_context()
+        context['snippets'] = highlight_snippets(page, query)
+        serializer = self.get_serializer(page, many=True, context=context)
+        return self.get_paginated_response(serializer.data)
+
+
+
+class MessageListView(ReplicaReadMixin, generics.ListAPIView):
+    """
+    Messages of a conversation, keyset-paginated.
+    GET /api/conversations/:id/messages/
+    GET /api/conversations/:id/messages/?before=<cursor> - older messages
+    GET /api/conversations/:id/messages/?after=<cursor> - newer messages
+    """
+    serializer_class = MessageSerializer
+    permission_classes = [IsAuthenticatedOrReadOnly]
+    pagination_class = MessageKeysetPagination
+    
+    def get_queryset(self):
+        conversation = get_object_or_404(conversations_for(self.request), pk=self.kwargs['pk'])
+        return conversation.messages.all()
+
+
+def _wants_event_stream(request):
+    return (
+        request.GET.get('format') == 'sse'
+        or EVENT_STREAM_MEDIA_TYPE in request.headers.get('Accept', '')
+    )
+
+
+def _error(request, data, status):
+    if _wants_event_stream(request):
+        return HttpResponse(sse_event('error', data), status=status, content_type=EVENT_STREAM_MEDIA_TYPE)
+    return JsonResponse(data, status=status)
+
+
+@sync_to_async
+def _authenticated_user(request):
+    # request.user is resolved lazily with a database query
+    user = request.user
+    return user if user.is_authenticated else None
+
+
+def _message_content(request):
+    """
+    Return the posted message text, or None unless it is a non-blank string.
+    """
+    if request.content_type == 'application/json':
+        try:
+            content = json.loads(request.body or b'{}').get('content')
+        except (ValueError, AttributeError):
+            return None
+    else:
+        content = request.POST.get('content')
+    if not isinstance(content, str) or not content.strip():
+        return None
+    return content
+
+
+@sync_to_async
+def _save_exchange(conversation, content, text):
+    """
+    Save a question and its answer with one INSERT and a single UPDATE of
+    the conversation's denormalized fields, in one transaction. Queues a
+    summary update once enough messages have left the prompt's history.
+    """
+    user_message = Message(conversation=conversation, role='user', content=content)
+    ai_message = Message(conversation=conversation, role='assistant', content=text)
+    
+    with transaction.atomic():
+        Message.objects.bulk_create([user_message, ai_message])
+        fields = conversation.record_messages([user_message, ai_message])
         
-        # Save user message
-        user_message = Message.objects.create(
-            conversation=conversation,
-            role='user',
-            content=content
-        )
+        # Update conversation title from first message
+        if not conversation.title and conversation.message_count == 2:
+            conversation.title = fields['title'] = content[:50]
         
-        # TODO: Call RAG pipeline here to generate response
-        # For now, placeholder response
-        ai_response = "This is a placeholder response. RAG pipeline will be integrated in Phase 7."
+        Conversation.objects.filter(pk=conversation.pk).update(**fields)
         
-        # Save AI message
-        ai_message = Message.objects.create(
-            conversation=conversation,
-            role='assistant',
-            content=ai_response
+        if needs_summary(conversation):
+            # robust: a broker outage mustn't fail the answer
+            transaction.on_commit(lambda: summarize_conversation.delay(conversation.pk), robust=True)
+    return user_message, ai_message
+
+
+async def send_message(request, pk):
+    """
+    Send a message in a conversation and answer it with the async RAG pipeline.
+    POST /api/conversations/:id/messages/
+    Body: {"content": "How do I...?"}
+    With Accept: text/event-stream (or ?format=sse) the answer is streamed
+    (see streaming.py). The conversation's extra_manuals are searched too,
+    premium ones only for premium users.
+
+    Async so that under ASGI a request waiting on the LLM doesn't hold a thread.
+    """
+    user = await _authenticated_user(request)
+    if user is None:
+        return _error(request, {'detail': 'Authentication credentials were not provided.'}, 403)
+
+    try:
+        conversation = await Conversation.objects.select_related('manual', 'user__profile').aget(
+            pk=pk, user=user
         )
-        
-        # Update conversation title from first message
-        if not conversation.title and conversation.messages.count() == 2:
-            conversation.title = content[:50]
-            conversation.save()
-        
-        return Response({
-            'user_message': MessageSerializer(user_message).data,
-            'ai_message': MessageSerializer(ai_message).data,
-        })
\ No newline at end of file
+    except Conversation.DoesNotExist:
+        return _error(request, {'detail': 'Not found.'}, 404)
+
+    content = _message_content(request)
+    if not content:
+        return _error(request, {'error': 'Content is required'}, 400)
+
+    tier = tier_for(conversation.user)
+    quota = await aconsume_question(conversation.user, tier=tier)
+    if not quota.allowed:
+        return _error(request, {'error': 'Question limit reached', 'limit': quota.limit}, 429)
+
+    # Checked again here, as the user's tier may have changed since
+    extra_manuals = accessible_manuals([manual async for manual in conversation.extra_manuals.all()], tier)
+
+    async def refund():
+        # The question is only charged if it gets an answer
+        await arefund_question(quota)
+
+    # The question is saved together with its answer (see _save_exchange)
+    if _wants_event_stream(request):
+        try:
+            answer_stream = await astream_answer(
+                conversation.manual, content, conversation, extra_manuals=extra_manuals
+            )
+        except Exception:
+            await refund()
+            raise
+
+        async def finish(text):
+            user_message, ai_message = await _save_exchange(conversation, content, text)
+            return {
+                'user_message': MessageSerializer(user_message).data,
+                'ai_message': MessageSerializer(ai_message).data,
+            }
+
+        return StreamingHttpResponse(
+            answer_events({'role': 'user', 'content': content}, answer_stream, finish, refund),
+            content_type=EVENT_STREAM_MEDIA_TYPE,
+            headers=EVENT_STREAM_HEADERS,
+        )
+
+    try:
+        answer = await aanswer_question(conversation.manual, content, conversation, extra_manuals=extra_manuals)
+    except asyncio.TimeoutError:
+        await refund()
+        return JsonResponse({'error': 'The answer took too long to generate'}, status=504)
+    except Exception:
+        await refund()
+        raise
+    user_message, ai_message = await _save_exchange(conversation, content, answer.text)
+
+    return JsonResponse({
+        'user_message': MessageSerializer(user_message).data,
+        'ai_message': MessageSerializer(ai_message).data,
+        'citations': answer.citations,
+    })
+
+
+_list_messages = MessageListView.as_view()
+
+
+async def conversation_messages(request, pk):
+    """
+    GET lists messages (sync DRF view), POST sends one (async view).
+    """
+    if request.method == 'POST':
+        return await send_message(request, pk)
+    if request.method in ('GET', 'HEAD', 'OPTIONS'):
+        return await sync_to_async(_list_messages)(request, pk=pk)
+    return JsonResponse({'detail': f'Method "{request.method}" not allowed.'}, status=405)
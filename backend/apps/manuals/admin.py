@@ -1,10 +1,26 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.db.models import Prefetch
+from apps.rag.models import IngestionRun
+from apps.rag.tasks import start_ingestion
 from .models import Manual
 
 
+class IngestionRunInline(admin.TabularInline):
+    """Shows ingestion runs and their progress"""
+    model = IngestionRun
+    extra = 0
+    max_num = 0
+    fields = [
+        'status', 'progress', 'pages_total', 'pages_changed',
+        'chunks_embedded', 'chunks_deleted', 'error', 'created_at', 'finished_at',
+    ]
+    readonly_fields = fields
+    can_delete = False
+
+
 @admin.register(Manual)
 class ManualAdmin(admin.ModelAdmin):
-    list_display = ['name', 'manufacturer', 'category', 'is_premium', 'created_at']
+    list_display = ['name', 'manufacturer', 'category', 'is_premium', 'ingestion', 'created_at']
     list_filter = ['category', 'is_premium', 'manufacturer']
     search_fields = ['name', 'manufacturer', 'description']
     readonly_fields = ['created_at', 'updated_at']
@@ -21,4 +37,35 @@ class ManualAdmin(admin.ModelAdmin):
         ('Technical', {
             'fields': ('pinecone_namespace', 'created_at', 'updated_at')
         }),
-    )
\ No newline at end of file
+    )
+    inlines = [IngestionRunInline]
+    actions = ['ingest', 'reingest']
+    
+    def get_queryset(self, request):
+        # Latest run per manual, in one query for the whole page
+        latest_runs = IngestionRun.objects.order_by('manual_id', '-created_at').distinct('manual_id')
+        return super().get_queryset(request).prefetch_related(
+            Prefetch('ingestion_runs', queryset=latest_runs, to_attr='latest_runs')
+        )
+    
+    @admin.display(description='Ingestion')
+    def ingestion(self, obj):
+        return obj.latest_runs[0].progress if obj.latest_runs else '-'
+    
+    def _start(self, request, queryset, force):
+        busy = [manual.name for manual in queryset if start_ingestion(manual, force=force) is None]
+        queued = len(queryset) - len(busy)
+        if queued:
+            self.message_user(request, f'Queued ingestion of {queued} manual(s).', messages.SUCCESS)
+        if busy:
+            self.message_user(
+                request, f"Already being ingested, skipped: {', '.join(busy)}.", messages.WARNING
+            )
+    
+    @admin.action(description='Ingest selected manuals (changed pages only)')
+    def ingest(self, request, queryset):
+        self._start(request, queryset, force=False)
+    
+    @admin.action(description='Re-ingest selected manuals (every page)')
+    def reingest(self, request, queryset):
+        self._start(request, queryset, force=True)
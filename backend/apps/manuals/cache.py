@@ -0,0 +1,100 @@
+"""
+Versioned response cache for the manual catalog.
+
+Rendered list and detail responses are cached under the current catalog
+version, keyed by action, object id, query params (filters, search,
+ordering) and the caller's tier. Saving or deleting a Manual bumps the
+version (see signals.py), which orphans every cached response at once.
+
+The version is the time of the last catalog change, so it doubles as
+Last-Modified. Each cached response also carries a strong ETag of its body,
+and conditional requests are answered with 304 Not Modified. On a cache hit
+no catalog query runs.
+"""
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework.renderers import JSONRenderer
+
+from apps.accounts.quotas import tier_for
+
+VERSION_KEY = 'manuals:catalog-version'
+
+
+def get_catalog_version():
+    """
+    Return the catalog version: the timestamp of the last change.
+    """
+    return cache.get_or_set(VERSION_KEY, lambda: int(time.time()), None)
+
+
+def bump_catalog_version():
+    """
+    Invalidate every cached catalog response.
+    """
+    # Never go backwards, even if two changes land within the same second
+    version = max(int(time.time()), cache.get(VERSION_KEY, 0) + 1)
+    cache.set(VERSION_KEY, version, None)
+    return version
+
+
+def catalog_tier(request):
+    if not request.user.is_authenticated:
+        return 'anonymous'
+    return tier_for(request.user)
+
+
+def _cache_key(version, action, request, pk):
+    params = urlencode(sorted(
+        (key, value)
+        for key, values in request.query_params.lists()
+        for value in values
+    ))
+    digest = hashlib.sha256(params.encode('utf-8')).hexdigest()[:32]
+    return f'manuals:{version}:{action}:{catalog_tier(request)}:{pk or ""}:{digest}'
+
+
+def _response(request, entry):
+    response = HttpResponse(entry['body'], content_type='application/json')
+    response['ETag'] = entry['etag']
+    response['Last-Modified'] = http_date(entry['last_modified'])
+    # Clients may keep the response but must revalidate it with the ETag
+    response['Cache-Control'] = 'no-cache'
+    return get_conditional_response(
+        request,
+        etag=entry['etag'],
+        last_modified=entry['last_modified'],
+        response=response,
+    )
+
+
+def cached_catalog_response(request, action, render, pk=None):
+    """
+    Return the cached JSON response for a catalog request, calling
+    render() to build the DRF Response on a miss. Non-JSON renderers
+    (the browsable API) bypass the cache.
+    """
+    if request.accepted_renderer.format != 'json':
+        return render()
+
+    version = get_catalog_version()
+    key = _cache_key(version, action, request, pk)
+    entry = cache.get(key)
+    if entry is None:
+        response = render()
+        if response.status_code != 200:
+            return response
+        body = JSONRenderer().render(response.data)
+        entry = {
+            'body': body,
+            'etag': '"%s"' % hashlib.sha256(body).hexdigest()[:32],
+            'last_modified': version,
+        }
+        cache.set(key, entry, settings.CATALOG_CACHE_TIMEOUT)
+    return _response(request, entry)
@@ -0,0 +1,77 @@
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramWordSimilarity
+from django.db import connection
+from django.db.models import F
+from rest_framework import filters
+
+_TERM = re.compile(r'[a-z0-9]+')
+
+_trigram_available = None
+
+
+def trigram_available():
+    """
+    Whether pg_trgm is installed (it is optional, see migration 0002).
+    """
+    global _trigram_available
+    if _trigram_available is None:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+            _trigram_available = cursor.fetchone() is not None
+    return _trigram_available
+
+
+def manual_search_query(value):
+    """
+    Build the tsquery for a search string: every term as a prefix, or all
+    terms run together, so "digi takt" and "juno106" find "Digitakt" and
+    "JUNO-106". Description words also match by English stem.
+    """
+    terms = _TERM.findall(value.lower())
+    if not terms:
+        return None
+    words = ' & '.join(f'{term}:*' for term in terms)
+    raw = f"({words}) | {''.join(terms)}:*"
+    return (
+        SearchQuery(raw, search_type='raw', config='simple')
+        | SearchQuery(value, search_type='websearch', config='english')
+    )
+
+
+class ManualSearchFilter(filters.SearchFilter):
+    """
+    Ranked full-text search on Manual.search_vector for ?search=, falling
+    back to trigram similarity on the name when nothing matches (typos).
+    Results are ordered by rank unless ?ordering= is given, so this filter
+    must run after OrderingFilter.
+
+    On databases other than Postgres it behaves like DRF's SearchFilter.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        if connection.vendor != 'postgresql':
+            return super().filter_queryset(request, queryset, view)
+
+        value = request.query_params.get(self.search_param, '').strip()
+        query = manual_search_query(value) if value else None
+        if query is None:
+            return queryset
+        keep_ordering = bool(request.query_params.get(filters.OrderingFilter.ordering_param))
+
+        results = queryset.filter(search_vector=query)
+        if results.exists():
+            if keep_ordering:
+                return results
+            return results.annotate(
+                rank=SearchRank(F('search_vector'), query)
+            ).order_by('-rank', 'name')
+
+        if not trigram_available():
+            return results
+        results = queryset.filter(name__trigram_word_similar=value)
+        if keep_ordering:
+            return results
+        return results.annotate(
+            similarity=TrigramWordSimilarity(value, 'name')
+        ).order_by('-similarity', 'name')
@@ -0,0 +1,73 @@
+# Generated by Django 4.2.26 on 2026-10-17 20:37
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+# Names are indexed both as words ("juno", "106") and compacted ("juno106"),
+# so "juno 106", "juno-106" and "juno106" all match. Punctuation is replaced
+# before parsing because the parser reads "-106" as a negative number.
+SEARCH_VECTOR_TRIGGER = """
+CREATE OR REPLACE FUNCTION manuals_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('simple', regexp_replace(coalesce(NEW.name, ''), '[^[:alnum:]]+', ' ', 'g')), 'A')
+        || setweight(to_tsvector('simple', lower(regexp_replace(coalesce(NEW.name, ''), '[^[:alnum:]]+', '', 'g'))), 'A')
+        || setweight(to_tsvector('simple', regexp_replace(coalesce(NEW.manufacturer, ''), '[^[:alnum:]]+', ' ', 'g')), 'B')
+        || setweight(to_tsvector('english', coalesce(NEW.description, '')), 'C');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER manuals_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF name, manufacturer, description ON manuals
+    FOR EACH ROW EXECUTE FUNCTION manuals_search_vector_update();
+
+UPDATE manuals SET name = name;
+"""
+
+DROP_SEARCH_VECTOR_TRIGGER = """
+DROP TRIGGER IF EXISTS manuals_search_vector_trigger ON manuals;
+DROP FUNCTION IF EXISTS manuals_search_vector_update();
+"""
+
+
+def create_trigram_index(apps, schema_editor):
+    # Fuzzy name matching needs pg_trgm; without it search uses full text only
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS manuals_name_trgm ON manuals USING gin (name gin_trgm_ops)"
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    schema_editor.execute("DROP INDEX IF EXISTS manuals_name_trgm")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("manuals", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="manual",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="manual",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"], name="manuals_search_vector_gin"
+            ),
+        ),
+        migrations.RunSQL(SEARCH_VECTOR_TRIGGER, DROP_SEARCH_VECTOR_TRIGGER),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
@@ -1,6 +1,16 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 
 
+def accessible_manuals(manuals, tier):
+    """
+    Return the manuals a subscription tier may use: premium manuals need
+    the premium tier.
+    """
+    return [manual for manual in manuals if tier == 'premium' or not manual.is_premium]
+
+
 class Manual(models.Model):
     """
     Stores metadata about music gear manuals.
@@ -37,6 +47,9 @@ class Manual(models.Model):
         blank=True,
         help_text="Namespace in Pinecone for this manual's vectors"
     )
+    # Maintained by a database trigger from name, manufacturer and
+    # description (see migration 0002_manual_search_vector)
+    search_vector = SearchVectorField(null=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -46,5 +59,8 @@ class Manual(models.Model):
     class Meta:
         db_table = 'manuals'
         ordering = ['-created_at']
+        indexes = [
+            GinIndex(fields=['search_vector'], name='manuals_search_vector_gin'),
+        ]
         verbose_name = 'Manual'
         verbose_name_plural = 'Manuals'
\ No newline at end of file
@@ -0,0 +1,12 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import bump_catalog_version
+from .models import Manual
+
+
+@receiver(post_save, sender=Manual)
+@receiver(post_delete, sender=Manual)
+def invalidate_catalog(sender, **kwargs):
+    # Catalog responses are cached per version (see cache.py)
+    bump_catalog_version()
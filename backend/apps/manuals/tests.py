@@ -1,3 +1,83 @@
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 
-# Create your tests here.
+from apps.rag.ingestion import set_page_count
+from .cache import get_catalog_version
+from .filters import trigram_available
+from .models import Manual
+
+
+class CatalogCacheTests(TestCase):
+    """
+    Versioned catalog responses and conditional requests.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.manual = Manual.objects.create(name='Juno-106', manufacturer='Roland', pdf_path='Roland/Juno-106.pdf')
+
+    def test_unchanged_catalog_answers_not_modified(self):
+        response = self.client.get('/api/manuals/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['ETag'])
+
+        # Served from the cache: no catalog query
+        with self.assertNumQueries(0):
+            again = self.client.get('/api/manuals/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(again.status_code, 304)
+
+    def test_changes_invalidate_cached_responses(self):
+        etag = self.client.get('/api/manuals/')['ETag']
+
+        version = get_catalog_version()
+        Manual.objects.create(name='SH-101', manufacturer='Roland', pdf_path='Roland/SH-101.pdf')
+        self.assertGreater(get_catalog_version(), version)
+        response = self.client.get('/api/manuals/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 2)
+
+        version = get_catalog_version()
+        set_page_count(self.manual, 12)
+        self.assertGreater(get_catalog_version(), version)
+        self.assertEqual(self.client.get(f'/api/manuals/{self.manual.pk}/').json()['page_count'], 12)
+
+        version = get_catalog_version()
+        self.manual.delete()
+        self.assertGreater(get_catalog_version(), version)
+        self.assertEqual(len(self.client.get('/api/manuals/').json()), 1)
+
+    def test_browsable_api_is_not_cached(self):
+        response = self.client.get('/api/manuals/', HTTP_ACCEPT='text/html')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response)
+
+        # Nothing was stored: the next JSON request is a miss
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/api/manuals/')
+        self.assertTrue(queries)
+
+
+class ManualSearchTests(TestCase):
+    """
+    Ranked ?search= with the trigram fallback for typos.
+    """
+
+    def setUp(self):
+        cache.clear()
+        for name, manufacturer in [('Digitakt', 'Elektron'), ('Digitone', 'Elektron'), ('JUNO-106', 'Roland')]:
+            Manual.objects.create(name=name, manufacturer=manufacturer, pdf_path=f'{manufacturer}/{name}.pdf')
+
+    def search(self, value):
+        return [manual['name'] for manual in self.client.get('/api/manuals/', {'search': value}).json()]
+
+    def test_terms_match_as_prefixes_or_run_together(self):
+        self.assertEqual(self.search('juno106'), ['JUNO-106'])
+        self.assertEqual(self.search('digi takt'), ['Digitakt'])
+        self.assertEqual(self.search('elektron'), ['Digitakt', 'Digitone'])
+
+    def test_typos_fall_back_to_trigram_similarity(self):
+        if not trigram_available():
+            self.skipTest('pg_trgm is not installed')
+        self.assertEqual(self.search('digitakk')[0], 'Digitakt')
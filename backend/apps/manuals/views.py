@@ -1,25 +1,56 @@
+import time
+
+from django.conf import settings
 from rest_framework import viewsets, filters
 from rest_framework.permissions import AllowAny
 from django_filters.rest_framework import DjangoFilterBackend
+from elucia.db_routing import ReplicaReadMixin
+from .cache import cached_catalog_response, get_catalog_version
+from .filters import ManualSearchFilter
 from .models import Manual
 from .serializers import ManualSerializer, ManualListSerializer
 
 
-class ManualViewSet(viewsets.ReadOnlyModelViewSet):
+class ManualViewSet(ReplicaReadMixin, viewsets.ReadOnlyModelViewSet):
     """
     API endpoint for viewing manuals.
     GET /api/manuals/ - List all manuals
+    GET /api/manuals/?search=juno106 - Ranked full-text search
     GET /api/manuals/:id/ - Get single manual detail
+    
+    JSON responses are cached until a manual changes and carry
+    ETag/Last-Modified for conditional requests (see cache.py). Cache
+    misses are rendered from a read replica.
     """
     queryset = Manual.objects.all()
     permission_classes = [AllowAny]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    # Search last: it orders by rank unless ?ordering= is given
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, ManualSearchFilter]
     filterset_fields = ['category', 'manufacturer', 'is_premium']
     search_fields = ['name', 'manufacturer', 'description']
     ordering_fields = ['name', 'manufacturer', 'created_at']
     ordering = ['-created_at']
     
+    def reads_from_replica(self, request):
+        # Right after a catalog change a lagging replica could put the old
+        # data in the cache under the new version
+        recently_changed = time.time() - get_catalog_version() < settings.DATABASE_REPLICA_PIN_SECONDS
+        return not recently_changed and super().reads_from_replica(request)
+    
     def get_serializer_class(self):
         if self.action == 'list':
             return ManualListSerializer
-        return ManualSerializer
\ No newline at end of file
+        return ManualSerializer
+    
+    def list(self, request, *args, **kwargs):
+        return cached_catalog_response(
+            request, 'list', lambda: super(ManualViewSet, self).list(request, *args, **kwargs)
+        )
+    
+    def retrieve(self, request, *args, **kwargs):
+        return cached_catalog_response(
+            request,
+            'detail',
+            lambda: super(ManualViewSet, self).retrieve(request, *args, **kwargs),
+            pk=kwargs.get('pk'),
+        )
@@ -0,0 +1,164 @@
+"""
+Semantic answer cache in front of the RAG pipeline.
+
+Each manual keeps up to RAG_ANSWER_CACHE_MAX_ENTRIES recent questions with
+their embeddings, answers and citations in the Django cache. A question whose
+embedding has cosine similarity >= RAG_ANSWER_CACHE_THRESHOLD with a cached
+one is answered from the cache without retrieval or an LLM call.
+
+A manual's questions are held in one index entry (their embeddings as a
+single float16 matrix, plus timestamps); each answer and its citations
+are stored under their own key, so a lookup loads the index and, on a
+hit, one answer. Index updates take a short lock (cache.add on a lock
+key) so concurrent stores don't overwrite each other; a store that can't
+get the lock within LOCK_WAIT_SECONDS is dropped.
+
+Entries are keyed by the manual's content version, so re-ingesting a manual
+invalidates its answers. Entries expire after RAG_ANSWER_CACHE_TTL seconds
+and the least recently used ones are evicted when a manual's cache is full.
+Hit, miss and eviction counts are shared by all workers (`manage.py
+cache_stats`).
+"""
+import time
+import uuid
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+
+from .cache_versions import get_manual_version
+from .embedding_cache import CacheStats
+from .local_index import normalize
+
+# Hits refresh an entry's last-used time at most this often, to keep reads mostly read-only
+TOUCH_INTERVAL_SECONDS = 60
+
+# How long a store waits for the index lock, and how long a crashed
+# writer can hold it
+LOCK_WAIT_SECONDS = 0.2
+LOCK_TIMEOUT_SECONDS = 5
+LOCK_POLL_SECONDS = 0.01
+
+stats = CacheStats('answers')
+
+
+def _index_key(manual_id):
+    return f'rag:answers:{manual_id}:{get_manual_version(manual_id)}'
+
+
+def enabled():
+    return settings.RAG_ANSWER_CACHE_MAX_ENTRIES > 0
+
+
+def _acquire(lock_key, wait):
+    deadline = time.monotonic() + wait
+    while not cache.add(lock_key, 1, LOCK_TIMEOUT_SECONDS):
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(LOCK_POLL_SECONDS)
+    return True
+
+
+def _live(index, now):
+    """
+    Drop expired entries from an index. Returns the index and the ids
+    that were dropped.
+    """
+    keep = now - index['created_at'] < settings.RAG_ANSWER_CACHE_TTL
+    return _subset(index, keep), [entry_id for entry_id, kept in zip(index['ids'], keep) if not kept]
+
+
+def _subset(index, mask):
+    return {
+        'ids': [entry_id for entry_id, kept in zip(index['ids'], mask) if kept],
+        'vectors': index['vectors'][mask],
+        'created_at': index['created_at'][mask],
+        'last_used_at': index['last_used_at'][mask],
+    }
+
+
+def _touch(index_key, entry_id, now):
+    """
+    Mark an entry as used, unless another worker holds the index lock.
+    """
+    lock_key = f'{index_key}:lock'
+    if not _acquire(lock_key, 0):
+        return
+    try:
+        index = cache.get(index_key)
+        if index is not None and entry_id in index['ids']:
+            index['last_used_at'][index['ids'].index(entry_id)] = now
+            cache.set(index_key, index, settings.RAG_ANSWER_CACHE_TTL)
+    finally:
+        cache.delete(lock_key)
+
+
+def lookup(manual, question_vector):
+    """
+    Return the cached (text, citations) for the closest similar question,
+    or None on a miss.
+    """
+    now = time.time()
+    index_key = _index_key(manual.pk)
+    index = cache.get(index_key)
+    if index is not None and index['ids']:
+        scores = index['vectors'].astype(np.float32) @ normalize(question_vector)[0]
+        scores[now - index['created_at'] >= settings.RAG_ANSWER_CACHE_TTL] = -np.inf
+        best = int(np.argmax(scores))
+        if scores[best] >= settings.RAG_ANSWER_CACHE_THRESHOLD:
+            entry_id = index['ids'][best]
+            answer = cache.get(f'{index_key}:{entry_id}')
+            if answer is not None:
+                if now - index['last_used_at'][best] > TOUCH_INTERVAL_SECONDS:
+                    _touch(index_key, entry_id, now)
+                stats.record(hits=1)
+                return answer
+    stats.record(misses=1)
+    return None
+
+
+def store(manual, question_vector, text, citations):
+    """
+    Cache an answer for a question, evicting the least recently used
+    entries beyond RAG_ANSWER_CACHE_MAX_ENTRIES.
+    """
+    now = time.time()
+    index_key = _index_key(manual.pk)
+    entry_id = uuid.uuid4().hex
+    cache.set(f'{index_key}:{entry_id}', (text, citations), settings.RAG_ANSWER_CACHE_TTL)
+
+    lock_key = f'{index_key}:lock'
+    if not _acquire(lock_key, LOCK_WAIT_SECONDS):
+        cache.delete(f'{index_key}:{entry_id}')
+        return
+    try:
+        vector = normalize(question_vector)[0].astype(np.float16)
+        index = cache.get(index_key)
+        dropped = []
+        if index is None:
+            index = {
+                'ids': [],
+                'vectors': np.empty((0, len(vector)), dtype=np.float16),
+                'created_at': np.empty(0),
+                'last_used_at': np.empty(0),
+            }
+        else:
+            index, dropped = _live(index, now)
+        index = {
+            'ids': index['ids'] + [entry_id],
+            'vectors': np.vstack([index['vectors'], vector]),
+            'created_at': np.append(index['created_at'], now),
+            'last_used_at': np.append(index['last_used_at'], now),
+        }
+        excess = len(index['ids']) - settings.RAG_ANSWER_CACHE_MAX_ENTRIES
+        if excess > 0:
+            keep = np.ones(len(index['ids']), dtype=bool)
+            keep[np.argsort(index['last_used_at'], kind='stable')[:excess]] = False
+            dropped += [entry_id for entry_id, kept in zip(index['ids'], keep) if not kept]
+            index = _subset(index, keep)
+            stats.record(evictions=excess)
+        cache.set(index_key, index, settings.RAG_ANSWER_CACHE_TTL)
+    finally:
+        cache.delete(lock_key)
+    if dropped:
+        cache.delete_many([f'{index_key}:{dropped_id}' for dropped_id in dropped])
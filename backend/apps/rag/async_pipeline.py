@@ -0,0 +1,179 @@
+"""
+Async RAG query pipeline, used by the chat view under ASGI.
+
+Stages, each with its own timeout:
+    1. concurrently: question embedding (RAG_EMBEDDING_TIMEOUT_MS), history
+       loading and keyword retrieval (RAG_RETRIEVAL_BUDGET_MS)
+    2. answer cache lookup, then vector retrieval (RAG_RETRIEVAL_BUDGET_MS)
+       Retrieval runs for every manual of the question at once.
+    3. optional reranking (RAG_RERANK_BUDGET_MS, see reranker.py)
+    4. generation (RAG_GENERATION_TIMEOUT)
+
+API calls are awaited on the event loop and only short database and NumPy
+work runs in threads, so a worker can hold many requests waiting on the LLM
+without a thread each. As in hybrid_search, a retrieval stage that fails or
+times out is dropped; without a question embedding the answer is built from
+keyword hits alone.
+"""
+import asyncio
+import logging
+from dataclasses import dataclass, field
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+
+from . import answer_cache
+from .embedding_cache import aget_cached_embeddings
+from .openai_client import achat_completion
+from .query_pipeline import Answer, AnswerStream, build_prompt, citations_for, history_limit
+from .retrieval import _in_worker, fuse_manuals, keyword_search, vector_search
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Retrieval:
+    """
+    Output of the retrieval stages. cached is the answer cache's
+    (text, citations) on a hit, in which case chunks is empty.
+    """
+    history: list
+    summary: str = ''
+    question_vector: list = None
+    cacheable: bool = False
+    cached: tuple = None
+    chunks: list = field(default_factory=list)
+
+
+async def arecent_history(conversation, limit=None, exclude=None):
+    """
+    Return the last `limit` messages of a conversation (by default those
+    after its summary, see history_limit), oldest first, leaving out the
+    message `exclude`.
+    """
+    limit = history_limit(conversation) if limit is None else limit
+    messages = conversation.messages.order_by('-created_at', '-id')
+    if exclude is not None:
+        messages = messages.exclude(pk=exclude.pk)
+    return [message async for message in messages[:limit]][::-1]
+
+
+def _in_thread(function, *args):
+    # Off the request's thread, so the retrievers overlap each other
+    return sync_to_async(_in_worker, thread_sensitive=False)(function, *args)
+
+
+async def _stage(name, awaitable, timeout, default):
+    try:
+        return await asyncio.wait_for(awaitable, timeout)
+    except asyncio.TimeoutError:
+        logger.warning('%s stage exceeded its %.0f ms timeout', name, timeout * 1000)
+    except Exception as error:
+        logger.warning('%s stage failed: %s', name, error)
+    return default
+
+
+async def release_connections():
+    """
+    Close the request's database connections before a long wait on the LLM,
+    so in-flight requests don't each hold a Postgres connection. The next
+    query reconnects (cheaply, behind a pooler).
+    """
+    await sync_to_async(connections.close_all)()
+
+
+async def aretrieve(manual, question, conversation=None, current_message=None, extra_manuals=()):
+    """
+    Run the retrieval stages for a question about manual and extra_manuals.
+    History comes from the conversation, leaving out current_message (the
+    one being answered).
+    """
+    budget = settings.RAG_RETRIEVAL_BUDGET_MS / 1000.0
+    candidates = settings.RAG_RETRIEVAL_CANDIDATES
+    manuals = [manual, *extra_manuals]
+
+    keyword_task = asyncio.ensure_future(asyncio.gather(*(
+        _stage('Keyword retrieval', _in_thread(keyword_search, each, question, candidates), budget, [])
+        for each in manuals
+    )))
+    if conversation is not None:
+        history_stage = _stage('History', arecent_history(conversation, exclude=current_message), budget, [])
+    else:
+        history_stage = asyncio.sleep(0, [])
+    history, vectors = await asyncio.gather(
+        history_stage,
+        _stage('Embedding', aget_cached_embeddings([question]), settings.RAG_EMBEDDING_TIMEOUT_MS / 1000.0, None),
+    )
+    retrieval = Retrieval(
+        history=history,
+        summary=conversation.summary if conversation is not None else '',
+        question_vector=vectors[0] if vectors else None,
+    )
+
+    if retrieval.question_vector is not None:
+        retrieval.cacheable = answer_cache.enabled() and not history and not extra_manuals
+        if retrieval.cacheable:
+            retrieval.cached = await sync_to_async(answer_cache.lookup)(manual, retrieval.question_vector)
+            if retrieval.cached is not None:
+                keyword_task.cancel()
+                return retrieval
+        vector_results = await asyncio.gather(*(
+            _stage(
+                'Vector retrieval',
+                _in_thread(vector_search, each, question, candidates, retrieval.question_vector),
+                budget,
+                [],
+            )
+            for each in manuals
+        ))
+    else:
+        vector_results = [[] for _ in manuals]
+
+    keyword_results = await keyword_task
+    retrieval.chunks = await sync_to_async(fuse_manuals)(
+        manuals, question, vector_results, keyword_results, settings.RAG_TOP_K
+    )
+    return retrieval
+
+
+async def aanswer_question(manual, question, conversation=None, current_message=None, extra_manuals=()):
+    """
+    Answer a question about a manual, and any extra_manuals. Returns an
+    Answer. Raises asyncio.TimeoutError if generation exceeds
+    RAG_GENERATION_TIMEOUT.
+    """
+    retrieval = await aretrieve(manual, question, conversation, current_message, extra_manuals)
+    if retrieval.cached is not None:
+        return Answer(*retrieval.cached)
+
+    await release_connections()
+    prompt = build_prompt(
+        manual, question, retrieval.chunks, retrieval.history, retrieval.summary, extra_manuals
+    )
+    text = await asyncio.wait_for(achat_completion(prompt.messages), settings.RAG_GENERATION_TIMEOUT)
+    answer = Answer(text=text, citations=citations_for(prompt.chunks))
+    if retrieval.cacheable:
+        await sync_to_async(answer_cache.store)(manual, retrieval.question_vector, answer.text, answer.citations)
+    return answer
+
+
+async def astream_answer(manual, question, conversation=None, current_message=None, extra_manuals=()):
+    """
+    Run the retrieval stages and return an AnswerStream that generates
+    the answer when iterated.
+    """
+    retrieval = await aretrieve(manual, question, conversation, current_message, extra_manuals)
+    if retrieval.cached is not None:
+        text, citations = retrieval.cached
+        return AnswerStream(manual, citations, text=text)
+    await release_connections()
+    prompt = build_prompt(
+        manual, question, retrieval.chunks, retrieval.history, retrieval.summary, extra_manuals
+    )
+    return AnswerStream(
+        manual,
+        citations_for(prompt.chunks),
+        messages=prompt.messages,
+        question_vector=retrieval.question_vector if retrieval.cacheable else None,
+    )
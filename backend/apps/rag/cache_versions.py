@@ -0,0 +1,33 @@
+"""
+Per-manual content versions, bumped whenever a manual is re-ingested.
+
+Caches derived from a manual's chunks (hot vector indexes, answer caches)
+record the version they were built at and treat any other version as stale.
+Versions live in the Django cache so every worker sees the same value.
+"""
+from django.core.cache import cache
+
+VERSION_TIMEOUT = None  # never expire
+
+
+def _key(manual_id):
+    return f'rag:manual-version:{manual_id}'
+
+
+def get_manual_version(manual_id):
+    """
+    Return the current content version of a manual.
+    """
+    return cache.get_or_set(_key(manual_id), 1, VERSION_TIMEOUT)
+
+
+def bump_manual_version(manual_id):
+    """
+    Invalidate everything cached for a manual. Returns the new version.
+    """
+    try:
+        return cache.incr(_key(manual_id))
+    except ValueError:
+        # Key missing (never read, or evicted): start past the default
+        cache.set(_key(manual_id), 2, VERSION_TIMEOUT)
+        return 2
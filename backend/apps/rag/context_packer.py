@@ -0,0 +1,274 @@
+"""
+Prompt assembly under a token budget.
+
+Retrieved chunks become excerpts before they go into the prompt:
+    - chunks with the same text (boilerplate repeated across pages) are
+      kept once
+    - chunks that continue each other are joined into one excerpt: the
+      overlapping token windows of a section, and a section running on
+      from one page to the next
+
+The prompt is then filled up to RAG_PROMPT_TOKEN_BUDGET: the system prompt
+and question first, then up to RAG_HISTORY_TOKEN_BUDGET of history (the
+conversation summary, cut to RAG_SUMMARY_TOKENS, then messages newest first,
+those before the last exchange cut to RAG_HISTORY_MESSAGE_TOKENS), then
+excerpts in relevance order while they fit.
+
+The prompt size is kept as a running sum of its pieces plus a fixed
+per-message overhead, so nothing is re-tokenized as the prompt grows.
+Token counts are cached per text: the system prompt, a conversation's
+history and popular chunks recur from one question to the next, so
+usually only the new question is tokenized.
+"""
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from functools import lru_cache
+
+from django.conf import settings
+
+from .text_chunker import get_tokenizer
+
+# Tokens the chat format adds around each message
+MESSAGE_OVERHEAD = 4
+
+# How far back from the end of an excerpt to look for the next chunk's
+# start; chunk windows overlap by about 50 tokens
+MAX_OVERLAP_CHARS = 2000
+OVERLAP_PROBE_CHARS = 32
+
+# Tokens of the blank line between two excerpts
+SEPARATOR_TOKENS = 1
+
+TRUNCATION_MARK = ' …'
+
+# Messages kept whole when history is trimmed (the last exchange)
+RECENT_MESSAGES = 2
+
+SUMMARY_TITLE = 'Summary of the earlier conversation'
+
+TOKEN_COUNT_CACHE_SIZE = 4096
+
+_token_counts = OrderedDict()
+_token_counts_lock = threading.Lock()
+
+
+@dataclass
+class Excerpt:
+    """
+    One or more joined chunks of a manual section. rank is the best
+    retrieval rank among them (0 is best); source names the manual when
+    several were searched.
+    """
+    source: str
+    heading: str
+    text: str
+    first_page: int
+    last_page: int
+    rank: int
+    chunks: list = field(default_factory=list)
+
+    def render(self):
+        if self.first_page == self.last_page:
+            pages = f'page {self.first_page}'
+        else:
+            pages = f'pages {self.first_page}-{self.last_page}'
+        if self.source:
+            pages = f'{pages}, {self.source}'
+        return f"[{pages}] {self.heading}\n{self.text}".strip()
+
+
+@dataclass
+class PackedPrompt:
+    """
+    Chat messages for the LLM, the chunks they include (for citations)
+    and their token count.
+    """
+    messages: list
+    chunks: list
+    tokens: int
+
+
+def _overlap(before, after):
+    """
+    Return how many leading characters of `after` repeat the end of
+    `before`, or 0 if `after` doesn't continue `before`.
+    """
+    probe = after[:OVERLAP_PROBE_CHARS]
+    if not probe:
+        return 0
+    start = before.find(probe, max(0, len(before) - MAX_OVERLAP_CHARS))
+    while start != -1:
+        if after.startswith(before[start:]):
+            return len(before) - start
+        start = before.find(probe, start + 1)
+    return 0
+
+
+def _join(first, second):
+    """
+    Join two excerpts of the same section if one continues the other,
+    else return None.
+    """
+    if first.heading != second.heading or first.source != second.source:
+        return None
+    for before, after in ((first, second), (second, first)):
+        if not before.first_page <= after.first_page <= before.last_page + 1:
+            continue
+        overlap = _overlap(before.text, after.text)
+        if overlap:
+            text = before.text + after.text[overlap:]
+        elif after.first_page == before.last_page + 1:
+            text = before.text + '\n' + after.text
+        else:
+            continue
+        return Excerpt(
+            source=first.source,
+            heading=first.heading,
+            text=text,
+            first_page=before.first_page,
+            last_page=max(before.last_page, after.last_page),
+            rank=min(first.rank, second.rank),
+            chunks=first.chunks + second.chunks,
+        )
+    return None
+
+
+def build_excerpts(chunks):
+    """
+    Deduplicate and join retrieved chunks (best first) into Excerpts,
+    best first.
+    """
+    excerpts = []
+    seen = set()
+    for rank, chunk in enumerate(chunks):
+        key = ' '.join(chunk.text.split())
+        if key in seen:
+            continue
+        seen.add(key)
+        excerpt = Excerpt(
+            chunk.source, chunk.heading, chunk.text, chunk.page_number, chunk.page_number, rank, [chunk]
+        )
+        # A new chunk can bridge excerpts, so keep joining until nothing fits
+        joined = True
+        while joined:
+            joined = False
+            for index, other in enumerate(excerpts):
+                merged = _join(other, excerpt)
+                if merged is not None:
+                    del excerpts[index]
+                    excerpt = merged
+                    joined = True
+                    break
+        excerpts.append(excerpt)
+    excerpts.sort(key=lambda excerpt: excerpt.rank)
+    return excerpts
+
+
+def token_counts(texts):
+    """
+    Return the token count of each text, tokenizing only texts not seen
+    recently (in one batch).
+    """
+    counts = {}
+    with _token_counts_lock:
+        for text in dict.fromkeys(texts):
+            if text in _token_counts:
+                _token_counts.move_to_end(text)
+                counts[text] = _token_counts[text]
+    # Tokenized outside the lock; the result never reads the cache again,
+    # so evictions by other threads in between don't matter
+    missing = [text for text in dict.fromkeys(texts) if text not in counts]
+    if missing:
+        tokenized = [len(tokens) for tokens in get_tokenizer().encode_batch(missing)]
+        counts.update(zip(missing, tokenized))
+        with _token_counts_lock:
+            _token_counts.update(zip(missing, tokenized))
+            while len(_token_counts) > TOKEN_COUNT_CACHE_SIZE:
+                _token_counts.popitem(last=False)
+    return [counts[text] for text in texts]
+
+
+@lru_cache(maxsize=1024)
+def _truncate(text, count, limit):
+    """
+    Cut text (count tokens long) to `limit` tokens. Returns (text, token
+    count). Cached, as the same old messages are cut on every turn.
+    """
+    if count <= limit:
+        return text, count
+    tokenizer = get_tokenizer()
+    tokens = tokenizer.encode_batch([text])[0]
+    return tokenizer.decode(text, tokens, 0, limit).rstrip() + TRUNCATION_MARK, limit + 1
+
+
+def pack_prompt(system_prompt, context_title, question, chunks, history=(), summary='', budget=None):
+    """
+    Build the chat messages for a question within `budget` tokens
+    (default RAG_PROMPT_TOKEN_BUDGET). chunks are RetrievedChunks, best
+    first; history is chat Message rows, oldest first, and summary covers
+    the conversation before them. Returns a PackedPrompt.
+    """
+    budget = budget or settings.RAG_PROMPT_TOKEN_BUDGET
+    history = list(history)
+    excerpts = build_excerpts(chunks)
+    header = f'{context_title}:\n\n'
+    summary = f'{SUMMARY_TITLE}:\n{summary}' if summary else ''
+
+    rendered = [excerpt.render() for excerpt in excerpts]
+    counts = token_counts(
+        [system_prompt, header, question, summary]
+        + [message.content for message in history]
+        + rendered
+    )
+    used = sum(counts[:3]) + 3 * MESSAGE_OVERHEAD
+    history_counts = counts[4:4 + len(history)]
+    excerpt_counts = counts[4 + len(history):]
+
+    # Summary, then newest history first, within the history budget
+    history_budget = min(settings.RAG_HISTORY_TOKEN_BUDGET, max(budget - used, 0))
+    kept = []
+    if summary:
+        summary, count = _truncate(summary, counts[3], settings.RAG_SUMMARY_TOKENS)
+        if count + MESSAGE_OVERHEAD <= history_budget:
+            history_budget -= count + MESSAGE_OVERHEAD
+            used += count + MESSAGE_OVERHEAD
+        else:
+            summary = ''
+    for age, (message, count) in enumerate(zip(reversed(history), reversed(history_counts))):
+        content = message.content
+        if age >= RECENT_MESSAGES:
+            content, count = _truncate(content, count, settings.RAG_HISTORY_MESSAGE_TOKENS)
+        if count + MESSAGE_OVERHEAD > history_budget:
+            break
+        history_budget -= count + MESSAGE_OVERHEAD
+        used += count + MESSAGE_OVERHEAD
+        kept.append({'role': message.role, 'content': content})
+    kept.reverse()
+
+    # Excerpts in relevance order, skipping any that don't fit
+    sections = []
+    included = []
+    for excerpt, text, count in zip(excerpts, rendered, excerpt_counts):
+        count += SEPARATOR_TOKENS
+        if used + count > budget:
+            space = budget - used - SEPARATOR_TOKENS - 1
+            if sections or space <= 0:
+                continue
+            # Nothing fits yet: cut the best excerpt to the space left
+            text, count = _truncate(text, count - SEPARATOR_TOKENS, space)
+            count += SEPARATOR_TOKENS
+        sections.append(text)
+        included.extend(excerpt.chunks)
+        used += count
+
+    messages = [
+        {'role': 'system', 'content': system_prompt},
+        {'role': 'system', 'content': header + '\n\n'.join(sections)},
+        *([{'role': 'system', 'content': summary}] if summary else []),
+        *kept,
+        {'role': 'user', 'content': question},
+    ]
+    order = {id(chunk): rank for rank, chunk in enumerate(chunks)}
+    included.sort(key=lambda chunk: order[id(chunk)])
+    return PackedPrompt(messages=messages, chunks=included, tokens=used)
@@ -0,0 +1,213 @@
+"""
+Persistent embedding cache in front of the embedding provider.
+
+Entries are keyed by (provider and model, hash of normalized text), so
+boilerplate that repeats across manuals, revisions and user questions is
+embedded once, and stub vectors are never served as real ones. Both
+ingestion and the query path go through get_cached_embeddings.
+"""
+import hashlib
+import re
+import threading
+import time
+import unicodedata
+from datetime import timedelta
+
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import EmbeddingCacheEntry
+from .openai_client import aget_embeddings, get_embedding_provider, get_embeddings
+
+# Hits refresh last_used_at at most this often, to keep reads mostly read-only
+TOUCH_INTERVAL = timedelta(hours=1)
+
+# Eviction trims this fraction below the limit, and stores check the size
+# (a full count) at most every EVICTION_INTERVAL seconds per process
+EVICTION_HEADROOM = 0.1
+EVICTION_INTERVAL = 300
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+class CacheStats:
+    """
+    Hit, miss and eviction counters kept in the Django cache, so they add
+    up across workers (see `manage.py cache_stats`).
+    """
+    FIELDS = ('hits', 'misses', 'evictions')
+
+    def __init__(self, name):
+        self.name = name
+
+    def _key(self, field):
+        return f'rag:stats:{self.name}:{field}'
+
+    def record(self, **counts):
+        for field, count in counts.items():
+            if not count:
+                continue
+            key = self._key(field)
+            try:
+                cache.incr(key, count)
+            except ValueError:
+                # First count, unless another worker just added it
+                if not cache.add(key, count, None):
+                    cache.incr(key, count)
+
+    def reset(self):
+        cache.delete_many([self._key(field) for field in self.FIELDS])
+
+    def as_dict(self):
+        values = cache.get_many([self._key(field) for field in self.FIELDS])
+        counts = {field: values.get(self._key(field), 0) for field in self.FIELDS}
+        total = counts['hits'] + counts['misses']
+        counts['hit_rate'] = counts['hits'] / total if total else 0.0
+        return counts
+
+
+stats = CacheStats('embeddings')
+
+_next_eviction = 0.0
+_eviction_lock = threading.Lock()
+
+
+def normalize_text(text):
+    """
+    Normalize text before hashing: Unicode NFC and collapsed whitespace.
+    """
+    return _WHITESPACE.sub(' ', unicodedata.normalize('NFC', text)).strip()
+
+
+def cache_model(provider):
+    """
+    Return the cache namespace of an embedding provider: its name and model.
+    """
+    return f'{provider.name}:{provider.model}'
+
+
+def cache_key(model, text):
+    """
+    Return the cache key for a text embedded with a given cache_model.
+    """
+    payload = f'{model}\x00{normalize_text(text)}'
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _lookup(keys):
+    """
+    Return {key: vector} for the cached keys, refreshing their last use.
+    """
+    found = {
+        entry.key: np.frombuffer(bytes(entry.vector), dtype=np.float32).tolist()
+        for entry in EmbeddingCacheEntry.objects.filter(key__in=set(keys)).only('key', 'vector')
+    }
+    if found:
+        now = timezone.now()
+        EmbeddingCacheEntry.objects.filter(
+            key__in=list(found),
+            last_used_at__lt=now - TOUCH_INTERVAL,
+        ).update(last_used_at=now)
+    return found
+
+
+def _missing(keys, texts, found):
+    missing = {}
+    for key, text in zip(keys, texts):
+        if key not in found:
+            missing.setdefault(key, normalize_text(text))
+    return missing
+
+
+def _store(model, keys, vectors):
+    EmbeddingCacheEntry.objects.bulk_create([
+        EmbeddingCacheEntry(
+            key=key,
+            model=model,
+            vector=np.asarray(vector, dtype=np.float32).tobytes(),
+        )
+        for key, vector in zip(keys, vectors)
+    ], ignore_conflicts=True)
+    _maybe_evict()
+
+
+def _maybe_evict():
+    global _next_eviction
+    now = time.monotonic()
+    with _eviction_lock:
+        if now < _next_eviction:
+            return
+        _next_eviction = now + EVICTION_INTERVAL
+    evict()
+
+
+def get_cached_embeddings(texts, provider=None):
+    """
+    Embed texts, serving repeats from the cache and embedding only misses.
+    Returns vectors in input order.
+    """
+    texts = list(texts)
+    if not texts:
+        return []
+    provider = provider or get_embedding_provider()
+    model = cache_model(provider)
+    keys = [cache_key(model, text) for text in texts]
+
+    found = _lookup(keys)
+    missing = _missing(keys, texts, found)
+    if missing:
+        vectors = get_embeddings(list(missing.values()), provider)
+        found.update(zip(missing, vectors))
+        _store(model, list(missing), vectors)
+
+    stats.record(hits=len(keys) - len(missing), misses=len(missing))
+    return [found[key] for key in keys]
+
+
+async def aget_cached_embeddings(texts, provider=None):
+    """
+    Async get_cached_embeddings. Only the cache reads and writes run in a
+    thread; the provider call is awaited on the event loop.
+    """
+    texts = list(texts)
+    if not texts:
+        return []
+    provider = provider or get_embedding_provider()
+    model = cache_model(provider)
+    keys = [cache_key(model, text) for text in texts]
+
+    found = await sync_to_async(_lookup)(keys)
+    missing = _missing(keys, texts, found)
+    if missing:
+        vectors = await aget_embeddings(list(missing.values()), provider)
+        found.update(zip(missing, vectors))
+        await sync_to_async(_store)(model, list(missing), vectors)
+
+    await sync_to_async(stats.record)(hits=len(keys) - len(missing), misses=len(missing))
+    return [found[key] for key in keys]
+
+
+def get_cached_embedding(text):
+    """
+    Embed a single text through the cache.
+    """
+    return get_cached_embeddings([text])[0]
+
+
+def evict(max_entries=None):
+    """
+    Delete least recently used entries once the cache exceeds max_entries.
+    Returns the number of entries deleted.
+    """
+    max_entries = max_entries or settings.EMBEDDING_CACHE_MAX_ENTRIES
+    excess = EmbeddingCacheEntry.objects.count() - max_entries
+    if excess <= 0:
+        return 0
+    excess += int(max_entries * EVICTION_HEADROOM)
+    oldest = EmbeddingCacheEntry.objects.order_by('last_used_at').values_list('key', flat=True)[:excess]
+    deleted, _ = EmbeddingCacheEntry.objects.filter(key__in=list(oldest)).delete()
+    stats.record(evictions=deleted)
+    return deleted
@@ -0,0 +1,261 @@
+"""
+Manual ingestion pipeline.
+
+Pages stream out of the PDF extractor and are processed one at a time,
+so a manual is never held in memory as a whole.
+
+Re-ingestion is incremental: every page and chunk carries a content hash,
+and only pages whose hash changed are re-chunked and re-embedded. A page's
+hash covers the heading path carried into it, so a changed heading also
+re-chunks the pages under it. Vectors for chunks that no longer exist are
+deleted from the vector store.
+"""
+import hashlib
+import itertools
+import json
+import re
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+
+from apps.manuals.cache import bump_catalog_version
+from apps.manuals.models import Manual
+from .models import Chunk, KeywordIndex, ManualPage
+from .cache_versions import bump_manual_version
+from .embedding_cache import get_cached_embeddings
+from .keyword_index import build_keyword_index
+from .pdf_processor import DEFAULT_BATCH_SIZE, iter_documents
+from .text_chunker import HeadingTracker, chunk_sections
+from .vector_store import get_vector_store
+
+# Changed pages are buffered and synced together so embedding calls are batched
+SYNC_BATCH_PAGES = 16
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+@dataclass
+class IngestionStats:
+    """
+    Summary of one manual's ingestion run.
+    """
+    manual_id: int
+    pages: int = 0
+    pages_changed: int = 0
+    pages_removed: int = 0
+    chunks_embedded: int = 0
+    chunks_deleted: int = 0
+    seconds: float = 0.0
+
+
+def content_hash(text):
+    """
+    Hash of text with whitespace normalized, so re-extraction noise
+    doesn't count as a change.
+    """
+    normalized = _WHITESPACE.sub(' ', text).strip()
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
+def page_content_hash(text, heading_path):
+    """
+    Hash of a page's text and the heading path carried into it from earlier
+    pages, so a heading change also marks the later pages it applies to.
+    """
+    payload = json.dumps([list(heading_path), content_hash(text)])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def resolve_pdf_path(manual):
+    """
+    Return the filesystem path of a manual's PDF.
+    Relative pdf_path values are resolved against settings.MANUALS_ROOT.
+    """
+    path = Path(manual.pdf_path)
+    if not path.is_absolute():
+        path = Path(settings.MANUALS_ROOT) / path
+    return path
+
+
+def ingest_manuals(manuals, executor=None, batch_size=DEFAULT_BATCH_SIZE, force=False, on_manual_done=None):
+    """
+    Ingest several manuals, sharing one extraction stream (and pool) across them.
+    With force=True every page is treated as changed.
+    on_manual_done(manual, stats) is called as each manual finishes.
+    Returns a list of IngestionStats in input order.
+    """
+    manuals = list(manuals)
+    by_path = {str(resolve_pdf_path(manual)): manual for manual in manuals}
+    results = {manual.pk: IngestionStats(manual_id=manual.pk) for manual in manuals}
+
+    stream = iter_documents(list(by_path), executor, batch_size)
+    started = time.perf_counter()
+    for path, items in itertools.groupby(stream, key=lambda item: str(item[0])):
+        manual = by_path[path]
+        stats = results[manual.pk]
+        _ingest_pages(manual, items, stats, force)
+        stats.seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        if on_manual_done:
+            on_manual_done(manual, stats)
+
+    return [results[manual.pk] for manual in manuals]
+
+
+def ingest_manual(manual, executor=None, batch_size=DEFAULT_BATCH_SIZE, force=False):
+    """
+    Ingest a single manual. Returns its IngestionStats.
+    """
+    return ingest_manuals([manual], executor, batch_size, force)[0]
+
+
+def set_page_count(manual, page_count):
+    """
+    Save a manual's page count. update() sends no post_save, so the
+    catalog cache is invalidated here.
+    """
+    Manual.objects.filter(pk=manual.pk).update(page_count=page_count)
+    manual.page_count = page_count
+    bump_catalog_version()
+
+
+def _ingest_pages(manual, items, stats, force):
+    known_hashes = dict(
+        ManualPage.objects.filter(manual=manual).values_list('page_number', 'content_hash')
+    )
+    tracker = HeadingTracker()
+    seen = set()
+    changed = []
+
+    for _, page_count, page in items:
+        if stats.pages == 0 and manual.page_count != page_count:
+            # Record the page count as soon as the first batch lands
+            set_page_count(manual, page_count)
+        stats.pages += 1
+        seen.add(page.page_number)
+
+        # Headings carry across pages, so every page goes through the tracker
+        page_hash = page_content_hash(page.text, tracker.path)
+        sections = tracker.sections(page)
+        if not force and known_hashes.get(page.page_number) == page_hash:
+            continue
+        changed.append((page, page_hash, sections))
+        if len(changed) >= SYNC_BATCH_PAGES:
+            _sync_pages(manual, changed, stats)
+            changed = []
+
+    if changed:
+        _sync_pages(manual, changed, stats)
+
+    finish_manual(manual, set(known_hashes) - seen, stats, force)
+
+
+def finish_manual(manual, removed, stats, force=False):
+    """
+    Last step of an ingestion: drop pages that are gone, let the vector
+    store finish its index, then rebuild the keyword index and invalidate
+    caches if any chunk changed.
+    """
+    if removed:
+        remove_pages(manual, removed, stats)
+    get_vector_store().finish(manual)
+
+    changed_chunks = stats.chunks_embedded or stats.chunks_deleted
+    if force or changed_chunks or not KeywordIndex.objects.filter(manual=manual).exists():
+        build_keyword_index(manual)
+        bump_manual_version(manual.pk)
+
+
+def _sync_pages(manual, changed, stats):
+    """
+    Re-chunk changed pages, embed only chunks not already stored,
+    and delete vectors of chunks that disappeared.
+    """
+    new_chunks, stale = plan_chunks(manual, changed)
+    embeddings = get_cached_embeddings([chunk.text for chunk in new_chunks]) if new_chunks else []
+    page_hashes = [(page.page_number, page_hash) for page, page_hash, _ in changed]
+    store_chunks(manual, page_hashes, new_chunks, stale, embeddings)
+
+    stats.pages_changed += len(changed)
+    stats.chunks_embedded += len(new_chunks)
+    stats.chunks_deleted += len(stale)
+
+
+def plan_chunks(manual, changed):
+    """
+    Chunk changed pages, given as (page, page_hash, sections), and compare
+    with the stored chunks. Returns (new_chunks, stale): unsaved Chunks
+    that need embedding, and stored Chunks that no longer exist.
+    """
+    page_numbers = [page.page_number for page, _, _ in changed]
+    # Matched on heading too, so a chunk whose heading changed is replaced
+    existing = {
+        (chunk.page_number, chunk.content_hash, chunk.heading): chunk
+        for chunk in Chunk.objects.filter(manual=manual, page_number__in=page_numbers)
+    }
+
+    sections = [section for _, _, page_sections in changed for section in page_sections]
+    wanted = {}
+    for text_chunk in chunk_sections(sections):
+        key = (text_chunk.page_number, content_hash(text_chunk.text), text_chunk.heading)
+        wanted.setdefault(key, text_chunk)
+
+    stale = [chunk for key, chunk in existing.items() if key not in wanted]
+    new_chunks = [
+        Chunk(
+            manual=manual,
+            page_number=page_number,
+            content_hash=chunk_hash,
+            vector_id=f'{manual.pk}-{page_number}-{chunk_hash[:16]}',
+            text=text_chunk.text,
+            heading=text_chunk.heading,
+            token_count=text_chunk.token_count,
+        )
+        for (page_number, chunk_hash, heading), text_chunk in wanted.items()
+        if (page_number, chunk_hash, heading) not in existing
+    ]
+    return new_chunks, stale
+
+
+def store_chunks(manual, page_hashes, new_chunks, stale, embeddings):
+    """
+    Apply a planned batch: update the vector store, then save the chunks
+    and the (page_number, content_hash) of each page in one transaction.
+    """
+    store = get_vector_store()
+    # Removed first: a chunk whose heading changed keeps its vector_id
+    if stale:
+        store.remove(manual, [chunk.vector_id for chunk in stale])
+    if new_chunks:
+        store.add(manual, new_chunks, embeddings)
+
+    with transaction.atomic():
+        Chunk.objects.filter(pk__in=[chunk.pk for chunk in stale]).delete()
+        Chunk.objects.bulk_insert(new_chunks)
+        ManualPage.objects.bulk_create(
+            [
+                ManualPage(manual=manual, page_number=page_number, content_hash=page_hash)
+                for page_number, page_hash in page_hashes
+            ],
+            update_conflicts=True,
+            unique_fields=['manual', 'page_number'],
+            update_fields=['content_hash', 'updated_at'],
+        )
+
+
+def remove_pages(manual, page_numbers, stats):
+    """
+    Drop pages that no longer exist in the PDF, along with their vectors.
+    """
+    stale = Chunk.objects.filter(manual=manual, page_number__in=page_numbers)
+    vector_ids = list(stale.values_list('vector_id', flat=True))
+    if vector_ids:
+        get_vector_store().remove(manual, vector_ids)
+    with transaction.atomic():
+        stale.delete()
+        ManualPage.objects.filter(manual=manual, page_number__in=page_numbers).delete()
+    stats.pages_removed += len(page_numbers)
+    stats.chunks_deleted += len(vector_ids)
@@ -0,0 +1,193 @@
+"""
+Per-manual BM25 keyword index.
+
+Gear questions hinge on exact tokens ("CC 74", "FUNC + TRIG 5", "SH-101"),
+which embeddings blur. Terms are lowercase alphanumeric runs plus the join
+of each adjacent pair, and letter/digit runs are also split, so "SH-101",
+"SH101" and "sh 101" all share the term "sh101".
+
+The index is built during ingestion and stored compactly as compressed
+CSR postings arrays on a KeywordIndex row.
+"""
+import io
+import math
+import re
+import threading
+from collections import Counter, OrderedDict
+
+import numpy as np
+
+from .cache_versions import get_manual_version
+from .models import Chunk, KeywordIndex
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+LOADED_INDEX_CACHE_SIZE = 64
+
+_WORD = re.compile(r'[a-z0-9]+')
+_LETTER_DIGIT_SPLIT = re.compile(r'[a-z]+|[0-9]+')
+STOPWORDS = frozenset(
+    'a an and are as at be by can do does for from how i in is it of on or '
+    'the this to what when where which with you your'.split()
+)
+
+
+def tokenize(text):
+    """
+    Return the index terms of a text (with repeats, for term frequency).
+    """
+    words = _WORD.findall(text.lower())
+    terms = [word for word in words if word not in STOPWORDS]
+    for word in words:
+        parts = _LETTER_DIGIT_SPLIT.findall(word)
+        if len(parts) > 1:
+            terms.extend(parts)
+    terms.extend(first + second for first, second in zip(words, words[1:]))
+    return terms
+
+
+class BM25Index:
+    """
+    Immutable BM25 index over a manual's chunks, identified by vector_id.
+    Postings are stored CSR-style: term t's postings are
+    doc_ids[offsets[t]:offsets[t + 1]] with matching term_freqs.
+    """
+
+    def __init__(self, vocabulary, offsets, doc_ids, term_freqs, doc_lengths, vector_ids):
+        self.vocabulary = vocabulary
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.term_freqs = term_freqs
+        self.doc_lengths = doc_lengths
+        self.vector_ids = vector_ids
+        self.avg_length = float(doc_lengths.mean()) if len(doc_lengths) else 0.0
+
+    def __len__(self):
+        return len(self.vector_ids)
+
+    @classmethod
+    def build(cls, documents):
+        """
+        Build from (vector_id, text) pairs.
+        """
+        postings = {}
+        vector_ids = []
+        doc_lengths = []
+        for doc_id, (vector_id, text) in enumerate(documents):
+            counts = Counter(tokenize(text))
+            vector_ids.append(vector_id)
+            doc_lengths.append(sum(counts.values()))
+            for term, count in counts.items():
+                postings.setdefault(term, []).append((doc_id, count))
+
+        vocabulary = {term: term_id for term_id, term in enumerate(sorted(postings))}
+        offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        doc_ids = []
+        term_freqs = []
+        for term, term_id in vocabulary.items():
+            entries = postings[term]
+            offsets[term_id + 1] = offsets[term_id] + len(entries)
+            doc_ids.extend(doc_id for doc_id, _ in entries)
+            term_freqs.extend(count for _, count in entries)
+
+        return cls(
+            vocabulary,
+            offsets,
+            np.asarray(doc_ids, dtype=np.int32),
+            np.minimum(np.asarray(term_freqs, dtype=np.int64), np.iinfo(np.uint16).max).astype(np.uint16),
+            np.asarray(doc_lengths, dtype=np.float32),
+            vector_ids,
+        )
+
+    def search(self, query, top_k=10):
+        """
+        Return up to top_k (vector_id, score) pairs, best first.
+        """
+        count = len(self.vector_ids)
+        if not count:
+            return []
+        scores = np.zeros(count, dtype=np.float32)
+        norms = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths / max(self.avg_length, 1e-9))
+        for term in set(tokenize(query)):
+            term_id = self.vocabulary.get(term)
+            if term_id is None:
+                continue
+            start, stop = self.offsets[term_id], self.offsets[term_id + 1]
+            docs = self.doc_ids[start:stop]
+            freqs = self.term_freqs[start:stop].astype(np.float32)
+            idf = math.log(1 + (count - len(docs) + 0.5) / (len(docs) + 0.5))
+            scores[docs] += idf * freqs * (BM25_K1 + 1) / (freqs + norms[docs])
+
+        matched = np.flatnonzero(scores)
+        if not len(matched):
+            return []
+        k = min(top_k, len(matched))
+        best = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        best = best[np.argsort(-scores[best])]
+        return [(self.vector_ids[doc], float(scores[doc])) for doc in best]
+
+    def to_bytes(self):
+        buffer = io.BytesIO()
+        np.savez_compressed(
+            buffer,
+            terms=np.frombuffer('\n'.join(self.vocabulary).encode('utf-8'), dtype=np.uint8),
+            vector_ids=np.frombuffer('\n'.join(self.vector_ids).encode('utf-8'), dtype=np.uint8),
+            offsets=self.offsets,
+            doc_ids=self.doc_ids,
+            term_freqs=self.term_freqs,
+            doc_lengths=self.doc_lengths,
+        )
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data):
+        arrays = np.load(io.BytesIO(data))
+        terms = arrays['terms'].tobytes().decode('utf-8')
+        vector_ids = arrays['vector_ids'].tobytes().decode('utf-8')
+        return cls(
+            {term: term_id for term_id, term in enumerate(terms.split('\n'))} if terms else {},
+            arrays['offsets'],
+            arrays['doc_ids'],
+            arrays['term_freqs'],
+            arrays['doc_lengths'],
+            vector_ids.split('\n') if vector_ids else [],
+        )
+
+
+def build_keyword_index(manual):
+    """
+    Rebuild and store a manual's keyword index from its chunks.
+    """
+    documents = Chunk.objects.filter(manual=manual).values_list('vector_id', 'text').iterator()
+    index = BM25Index.build(documents)
+    KeywordIndex.objects.update_or_create(
+        manual=manual,
+        defaults={'data': index.to_bytes(), 'chunk_count': len(index)},
+    )
+    return index
+
+
+_loaded = OrderedDict()
+_loaded_lock = threading.Lock()
+
+
+def get_keyword_index(manual):
+    """
+    Return a manual's BM25Index (empty if none has been built).
+    Loaded indexes are kept per manual content version.
+    """
+    key = (manual.pk, get_manual_version(manual.pk))
+    with _loaded_lock:
+        index = _loaded.get(key)
+        if index is not None:
+            _loaded.move_to_end(key)
+            return index
+
+    data = KeywordIndex.objects.filter(manual=manual).values_list('data', flat=True).first()
+    index = BM25Index.from_bytes(bytes(data)) if data else BM25Index.build([])
+
+    with _loaded_lock:
+        _loaded[key] = index
+        while len(_loaded) > LOADED_INDEX_CACHE_SIZE:
+            _loaded.popitem(last=False)
+    return index
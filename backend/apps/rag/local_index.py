@@ -0,0 +1,286 @@
+"""
+In-process NumPy vector index.
+
+Each manual's embeddings are stored L2-normalized in one contiguous matrix
+(float32, or float16 to halve disk and page cache), memory-mapped from
+settings.RAG_LOCAL_INDEX_DIR. Top-k is one matmul plus argpartition, so
+a hot manual is searched in well under a millisecond.
+
+Serves as a full vector store for development and CI (RAG_VECTOR_STORE =
+'local') and as a RAM cache for the most-queried manuals in front of
+pgvector (see HotCacheVectorStore).
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+EMPTY_VERSION = 0
+
+
+class ManualIndex:
+    """
+    Normalized embedding matrix for one manual plus per-row metadata.
+    rows[i] is (vector_id, page_number, heading, text) for matrix[i].
+    """
+
+    def __init__(self, matrix, rows, version=EMPTY_VERSION):
+        self.matrix = matrix
+        self.rows = rows
+        self.version = version
+
+    def __len__(self):
+        return len(self.rows)
+
+    @classmethod
+    def empty(cls, dimensions, dtype):
+        return cls(np.empty((0, dimensions), dtype=dtype), [])
+
+    def search(self, queries, top_k):
+        """
+        Return, for each query row, a list of (row_index, score) best first.
+        queries must be a 2-D array of L2-normalized vectors.
+        """
+        if not len(self.rows):
+            return [[] for _ in range(len(queries))]
+        scores = queries.astype(self.matrix.dtype, copy=False) @ self.matrix.T
+        scores = scores.astype(np.float32, copy=False)
+        k = min(top_k, scores.shape[1])
+        if k < scores.shape[1]:
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        else:
+            top = np.broadcast_to(np.arange(k), (len(scores), k))
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+        return [
+            list(zip(indexes.tolist(), values.tolist()))
+            for indexes, values in zip(top, top_scores)
+        ]
+
+
+def normalize(vectors):
+    """
+    Return vectors as a 2-D float32 array with unit-length rows.
+    """
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class LocalVectorStore:
+    """
+    Vector store backed by per-manual .npy files, with an LRU of loaded indexes.
+
+    Files for a manual live in <root>/<manual_id>/. Each save writes a new
+    generation of vectors-<n>.npy and rows-<n>.json, then atomically points
+    CURRENT at it, so readers in other processes never see a half-written index.
+
+    During ingestion add() and remove() only write small pending-*.json
+    files (with a pending-*.npy of vectors for adds), possibly from several
+    workers; finish() applies them in order in a single new generation, so
+    ingesting a manual writes its matrix once rather than once per batch.
+    Pending changes aren't searchable until then.
+    """
+
+    def __init__(self, root=None, dtype=None, cache_size=None):
+        self.root = Path(root or settings.RAG_LOCAL_INDEX_DIR)
+        self.dtype = np.dtype(dtype or settings.RAG_LOCAL_INDEX_DTYPE)
+        self.cache_size = cache_size or settings.RAG_LOCAL_INDEX_CACHE_SIZE
+        self.dimensions = settings.EMBEDDING_DIMENSIONS
+        self._loaded = OrderedDict()
+        self._lock = threading.Lock()
+
+    # Storage
+
+    def _dir(self, manual_id):
+        return self.root / str(manual_id)
+
+    def _current_generation(self, manual_id):
+        try:
+            return int((self._dir(manual_id) / 'CURRENT').read_text())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def load(self, manual_id):
+        """
+        Return the ManualIndex for a manual, or None if it has never been built.
+        Loaded indexes stay cached until their files change.
+        """
+        generation = self._current_generation(manual_id)
+        if generation is None:
+            return None
+        with self._lock:
+            cached = self._loaded.get(manual_id)
+            if cached and cached[0] == generation:
+                self._loaded.move_to_end(manual_id)
+                return cached[1]
+
+        directory = self._dir(manual_id)
+        matrix = np.load(directory / f'vectors-{generation}.npy', mmap_mode='r')
+        with open(directory / f'rows-{generation}.json') as handle:
+            meta = json.load(handle)
+        index = ManualIndex(matrix, [tuple(row) for row in meta['rows']], meta['version'])
+
+        with self._lock:
+            self._loaded[manual_id] = (generation, index)
+            self._loaded.move_to_end(manual_id)
+            while len(self._loaded) > self.cache_size:
+                self._loaded.popitem(last=False)
+        return index
+
+    def save(self, manual_id, index):
+        """
+        Write a ManualIndex as the manual's new current generation.
+        """
+        directory = self._dir(manual_id)
+        directory.mkdir(parents=True, exist_ok=True)
+        previous = self._current_generation(manual_id)
+        generation = (previous or 0) + 1
+
+        np.save(directory / f'vectors-{generation}.npy', np.ascontiguousarray(index.matrix, dtype=self.dtype))
+        with open(directory / f'rows-{generation}.json', 'w') as handle:
+            json.dump({'version': index.version, 'rows': index.rows}, handle)
+        pointer = directory / 'CURRENT.tmp'
+        pointer.write_text(str(generation))
+        os.replace(pointer, directory / 'CURRENT')
+
+        if previous is not None:
+            for name in (f'vectors-{previous}.npy', f'rows-{previous}.json'):
+                try:
+                    (directory / name).unlink()
+                except FileNotFoundError:
+                    pass
+
+    def drop(self, manual_id):
+        """
+        Forget a manual's index, on disk and in memory.
+        """
+        with self._lock:
+            self._loaded.pop(manual_id, None)
+        directory = self._dir(manual_id)
+        if directory.exists():
+            for path in directory.iterdir():
+                path.unlink()
+            directory.rmdir()
+
+    def build(self, manual, chunks, version=EMPTY_VERSION):
+        """
+        Replace a manual's index with the given Chunk rows (which must have embeddings).
+        """
+        chunks = [chunk for chunk in chunks if chunk.embedding is not None]
+        matrix = normalize([chunk.embedding for chunk in chunks]) if chunks else None
+        index = ManualIndex.empty(self.dimensions, self.dtype) if matrix is None else ManualIndex(
+            matrix.astype(self.dtype),
+            [(chunk.vector_id, chunk.page_number, chunk.heading, chunk.text) for chunk in chunks],
+        )
+        index.version = version
+        self.save(manual.pk, index)
+        return self.load(manual.pk)
+
+    # Vector store interface
+
+    def _write_pending(self, manual_id, meta, vectors=None):
+        directory = self._dir(manual_id)
+        directory.mkdir(parents=True, exist_ok=True)
+        # Named to sort in the order the changes were made
+        name = f'pending-{time.time_ns():020d}-{uuid.uuid4().hex[:8]}'
+        if vectors is not None:
+            np.save(directory / f'{name}.npy', vectors)
+        # The .json is written last and marks the change as complete
+        temporary = directory / f'{name}.tmp'
+        with open(temporary, 'w') as handle:
+            json.dump(meta, handle)
+        os.replace(temporary, directory / f'{name}.json')
+
+    def add(self, manual, chunks, embeddings):
+        if not chunks:
+            return
+        self._write_pending(
+            manual.pk,
+            {'rows': [(chunk.vector_id, chunk.page_number, chunk.heading, chunk.text) for chunk in chunks]},
+            normalize(embeddings).astype(self.dtype),
+        )
+
+    def remove(self, manual, vector_ids):
+        vector_ids = list(vector_ids)
+        if vector_ids:
+            self._write_pending(manual.pk, {'remove': vector_ids})
+
+    def finish(self, manual):
+        """
+        Apply the pending adds and removes as the manual's new generation.
+        """
+        directory = self._dir(manual.pk)
+        pending = sorted(directory.glob('pending-*.json')) if directory.exists() else []
+        if not pending:
+            return
+        index = self.load(manual.pk) or ManualIndex.empty(self.dimensions, self.dtype)
+
+        # vector_id -> (source, row in source, row metadata); source 0 is
+        # the current matrix, the others are pending adds
+        sources = [index.matrix]
+        rows = {row[0]: (0, position, row) for position, row in enumerate(index.rows)}
+        for path in pending:
+            with open(path) as handle:
+                meta = json.load(handle)
+            for vector_id in meta.get('remove', ()):
+                rows.pop(vector_id, None)
+            if 'rows' in meta:
+                sources.append(np.load(path.with_suffix('.npy'), mmap_mode='r'))
+                for position, row in enumerate(meta['rows']):
+                    rows[row[0]] = (len(sources) - 1, position, tuple(row))
+
+        matrix = np.empty((len(rows), sources[-1].shape[1]), dtype=self.dtype)
+        picks = [([], []) for _ in sources]
+        for target, (source, position, _) in enumerate(rows.values()):
+            picks[source][0].append(target)
+            picks[source][1].append(position)
+        for source, (targets, positions) in zip(sources, picks):
+            if targets:
+                matrix[targets] = source[positions]
+        self.save(manual.pk, ManualIndex(matrix, [row for _, _, row in rows.values()], index.version))
+
+        for path in pending:
+            for name in (path.name, path.with_suffix('.npy').name):
+                try:
+                    (directory / name).unlink()
+                except FileNotFoundError:
+                    pass
+
+    def delete_manual(self, manual):
+        self.drop(manual.pk)
+
+    def query(self, manual, vector, top_k=5):
+        return self.query_batch(manual, [vector], top_k)[0]
+
+    def query_batch(self, manual, vectors, top_k=5):
+        """
+        Search several query vectors against one manual in a single matmul.
+        """
+        from .vector_store import VectorMatch
+
+        index = self.load(manual.pk)
+        if index is None:
+            return [[] for _ in vectors]
+        return [
+            [
+                VectorMatch(
+                    vector_id=index.rows[row][0],
+                    score=score,
+                    page_number=index.rows[row][1],
+                    heading=index.rows[row][2],
+                    text=index.rows[row][3],
+                )
+                for row, score in hits
+            ]
+            for hits in index.search(normalize(vectors), top_k)
+        ]
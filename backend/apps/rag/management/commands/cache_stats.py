@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from apps.rag import answer_cache, embedding_cache
+
+
+class Command(BaseCommand):
+    help = 'Print hit, miss and eviction counts of the embedding and answer caches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Zero the counters after printing them.')
+
+    def handle(self, *args, **options):
+        for name, stats in (('embeddings', embedding_cache.stats), ('answers', answer_cache.stats)):
+            counts = stats.as_dict()
+            self.stdout.write(
+                f"{name}: {counts['hits']} hits, {counts['misses']} misses "
+                f"({counts['hit_rate']:.1%} hit rate), {counts['evictions']} evictions"
+            )
+            if options['reset']:
+                stats.reset()
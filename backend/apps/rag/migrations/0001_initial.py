@@ -0,0 +1,94 @@
+# Generated by Django 4.2.26 on 2026-10-17 20:16
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ("manuals", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ManualPage",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("page_number", models.PositiveIntegerField()),
+                ("content_hash", models.CharField(max_length=64)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "manual",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="pages",
+                        to="manuals.manual",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "manual_pages",
+                "ordering": ["manual", "page_number"],
+            },
+        ),
+        migrations.CreateModel(
+            name="Chunk",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("page_number", models.PositiveIntegerField()),
+                ("content_hash", models.CharField(max_length=64)),
+                ("vector_id", models.CharField(max_length=255)),
+                ("text", models.TextField()),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "manual",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="chunks",
+                        to="manuals.manual",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "chunks",
+                "ordering": ["manual", "page_number", "id"],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="manualpage",
+            constraint=models.UniqueConstraint(
+                fields=("manual", "page_number"), name="unique_manual_page"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="chunk",
+            index=models.Index(
+                fields=["manual", "page_number"], name="chunks_manual__57bffc_idx"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="chunk",
+            constraint=models.UniqueConstraint(
+                fields=("manual", "vector_id"), name="unique_manual_vector_id"
+            ),
+        ),
+    ]
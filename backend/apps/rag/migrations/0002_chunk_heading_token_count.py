@@ -0,0 +1,27 @@
+# Generated by Django 4.2.26 on 2026-10-17 20:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("rag", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="chunk",
+            name="heading",
+            field=models.CharField(
+                blank=True,
+                help_text="Section heading path, e.g. 'PARAMETERS > LFO'",
+                max_length=500,
+            ),
+        ),
+        migrations.AddField(
+            model_name="chunk",
+            name="token_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
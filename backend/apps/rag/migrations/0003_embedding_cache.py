@@ -0,0 +1,34 @@
+# Generated by Django 4.2.26 on 2026-10-17 20:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("rag", "0002_chunk_heading_token_count"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EmbeddingCacheEntry",
+            fields=[
+                (
+                    "key",
+                    models.CharField(max_length=64, primary_key=True, serialize=False),
+                ),
+                ("model", models.CharField(max_length=100)),
+                ("vector", models.BinaryField(help_text="float32 vector bytes")),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "last_used_at",
+                    models.DateTimeField(auto_now_add=True, db_index=True),
+                ),
+            ],
+            options={
+                "verbose_name": "Embedding Cache Entry",
+                "verbose_name_plural": "Embedding Cache Entries",
+                "db_table": "embedding_cache",
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.26 on 2026-10-17 20:20
+
+from django.db import migrations
+import pgvector.django
+import pgvector.django.indexes
+import pgvector.django.vector
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("rag", "0003_embedding_cache"),
+    ]
+
+    operations = [
+        pgvector.django.VectorExtension(),
+        migrations.AddField(
+            model_name="chunk",
+            name="embedding",
+            field=pgvector.django.vector.VectorField(
+                blank=True,
+                dimensions=1536,
+                help_text="Only populated when RAG_VECTOR_STORE is 'pgvector'",
+                null=True,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="chunk",
+            index=pgvector.django.indexes.HnswIndex(
+                ef_construction=64,
+                fields=["embedding"],
+                m=16,
+                name="chunks_embedding_hnsw",
+                opclasses=["vector_cosine_ops"],
+            ),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.26 on 2026-10-17 20:23
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("manuals", "0001_initial"),
+        ("rag", "0004_chunk_embedding"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="KeywordIndex",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("data", models.BinaryField()),
+                ("chunk_count", models.PositiveIntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "manual",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="keyword_index",
+                        to="manuals.manual",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Keyword Index",
+                "verbose_name_plural": "Keyword Indexes",
+                "db_table": "keyword_indexes",
+            },
+        ),
+    ]
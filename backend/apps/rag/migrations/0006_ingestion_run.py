@@ -0,0 +1,95 @@
+# Generated by Django 4.2.26 on 2026-10-17 20:48
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("manuals", "0002_manual_search_vector"),
+        ("rag", "0005_keyword_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="IngestionRun",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "force",
+                    models.BooleanField(
+                        default=False,
+                        help_text="Re-embed every page, even if unchanged",
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Pending"),
+                            ("running", "Running"),
+                            ("succeeded", "Succeeded"),
+                            ("failed", "Failed"),
+                        ],
+                        default="pending",
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "stage",
+                    models.CharField(
+                        choices=[
+                            ("extract", "Extract"),
+                            ("chunk", "Chunk, embed and index"),
+                            ("finish", "Finish"),
+                        ],
+                        default="extract",
+                        max_length=20,
+                    ),
+                ),
+                ("pages_total", models.PositiveIntegerField(default=0)),
+                ("pages_extracted", models.PositiveIntegerField(default=0)),
+                ("pages_changed", models.PositiveIntegerField(default=0)),
+                ("pages_removed", models.PositiveIntegerField(default=0)),
+                ("batches_total", models.PositiveIntegerField(default=0)),
+                ("batches_chunked", models.PositiveIntegerField(default=0)),
+                ("batches_embedded", models.PositiveIntegerField(default=0)),
+                ("batches_indexed", models.PositiveIntegerField(default=0)),
+                ("chunks_embedded", models.PositiveIntegerField(default=0)),
+                ("chunks_deleted", models.PositiveIntegerField(default=0)),
+                ("error", models.TextField(blank=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("finished_at", models.DateTimeField(blank=True, null=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "manual",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="ingestion_runs",
+                        to="manuals.manual",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Ingestion Run",
+                "verbose_name_plural": "Ingestion Runs",
+                "db_table": "ingestion_runs",
+                "ordering": ["-created_at"],
+                "indexes": [
+                    models.Index(
+                        fields=["manual", "-created_at"],
+                        name="ingestion_r_manual__00cf10_idx",
+                    )
+                ],
+            },
+        ),
+    ]
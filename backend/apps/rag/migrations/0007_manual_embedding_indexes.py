@@ -0,0 +1,37 @@
+# Generated by Django 4.2.26 on 2026-10-17 21:12
+
+from django.db import migrations
+
+
+def create_manual_indexes(apps, schema_editor):
+    Chunk = apps.get_model("rag", "Chunk")
+    manual_ids = (
+        Chunk.objects.filter(embedding__isnull=False)
+        .values_list("manual_id", flat=True)
+        .distinct()
+    )
+    for manual_id in manual_ids:
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS chunks_embedding_hnsw_m{manual_id} "
+            "ON chunks USING hnsw (embedding vector_cosine_ops) "
+            f"WITH (m = 16, ef_construction = 64) WHERE manual_id = {manual_id}"
+        )
+
+
+def drop_manual_indexes(apps, schema_editor):
+    Chunk = apps.get_model("rag", "Chunk")
+    for manual_id in Chunk.objects.values_list("manual_id", flat=True).distinct():
+        schema_editor.execute(
+            f"DROP INDEX IF EXISTS chunks_embedding_hnsw_m{manual_id}"
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("rag", "0006_ingestion_run"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_manual_indexes, drop_manual_indexes),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.26 on 2026-10-17 21:18
+
+from django.db import migrations, models
+
+
+def fail_duplicate_active_runs(apps, schema_editor):
+    # Keep the newest pending or running run of each manual
+    IngestionRun = apps.get_model("rag", "IngestionRun")
+    active = IngestionRun.objects.filter(status__in=["pending", "running"])
+    newest = {}
+    for run in active.order_by("-created_at").only("id", "manual_id"):
+        newest.setdefault(run.manual_id, run.pk)
+    active.exclude(pk__in=newest.values()).update(
+        status="failed", error="Superseded by a newer run"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("rag", "0007_manual_embedding_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(fail_duplicate_active_runs, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="ingestionrun",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("status__in", ["pending", "running"])),
+                fields=("manual",),
+                name="ingestion_runs_one_active_per_manual",
+            ),
+        ),
+    ]
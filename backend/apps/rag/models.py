@@ -1,3 +1,266 @@
-from django.db import models
+import csv
+import io
 
-# Create your models here.
+from django.db import connections, models, router
+from django.utils import timezone
+from pgvector.django import HnswIndex, VectorField
+
+# Rows per COPY statement when bulk inserting chunks
+COPY_BATCH_SIZE = 2000
+
+
+class ManualPage(models.Model):
+    """
+    Content hash of each extracted page, used to skip unchanged pages
+    when a manual is re-ingested.
+    """
+    
+    manual = models.ForeignKey(
+        'manuals.Manual',
+        on_delete=models.CASCADE,
+        related_name='pages'
+    )
+    page_number = models.PositiveIntegerField()
+    content_hash = models.CharField(max_length=64)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.manual} - page {self.page_number}"
+    
+    class Meta:
+        db_table = 'manual_pages'
+        ordering = ['manual', 'page_number']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['manual', 'page_number'],
+                name='unique_manual_page'
+            ),
+        ]
+
+
+class ChunkManager(models.Manager):
+    
+    def bulk_insert(self, chunks):
+        """
+        Insert unsaved chunks in batches. Uses COPY on PostgreSQL, which is far
+        cheaper than per-row INSERTs for embedding-sized rows; other backends
+        fall back to bulk_create. Inserted objects don't get their pk set.
+        """
+        chunks = list(chunks)
+        if not chunks:
+            return
+        using = router.db_for_write(self.model)
+        connection = connections[using]
+        if connection.vendor != 'postgresql':
+            self.using(using).bulk_create(chunks, batch_size=COPY_BATCH_SIZE)
+            return
+        
+        columns = [
+            'manual_id', 'page_number', 'content_hash', 'vector_id',
+            'heading', 'text', 'token_count', 'embedding', 'created_at',
+        ]
+        copy_sql = (
+            f"COPY {self.model._meta.db_table} ({', '.join(columns)}) "
+            # Empty CSV fields are NULL unless forced, which only embedding may be
+            "FROM STDIN WITH (FORMAT csv, FORCE_NOT_NULL (content_hash, vector_id, heading, text))"
+        )
+        now = timezone.now().isoformat()
+        with connection.cursor() as cursor:
+            for start in range(0, len(chunks), COPY_BATCH_SIZE):
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                for chunk in chunks[start:start + COPY_BATCH_SIZE]:
+                    embedding = chunk.embedding
+                    if embedding is not None:
+                        embedding = '[' + ','.join(repr(float(value)) for value in embedding) + ']'
+                    writer.writerow([
+                        chunk.manual_id, chunk.page_number, chunk.content_hash,
+                        chunk.vector_id, chunk.heading, chunk.text,
+                        chunk.token_count, embedding, now,
+                    ])
+                buffer.seek(0)
+                cursor.copy_expert(copy_sql, buffer)
+
+
+class Chunk(models.Model):
+    """
+    A chunk of manual text, its vector id and (with the pgvector store)
+    its embedding.
+    """
+    
+    manual = models.ForeignKey(
+        'manuals.Manual',
+        on_delete=models.CASCADE,
+        related_name='chunks'
+    )
+    page_number = models.PositiveIntegerField()
+    content_hash = models.CharField(max_length=64)
+    vector_id = models.CharField(max_length=255)
+    heading = models.CharField(
+        max_length=500,
+        blank=True,
+        help_text="Section heading path, e.g. 'PARAMETERS > LFO'"
+    )
+    text = models.TextField()
+    token_count = models.PositiveIntegerField(default=0)
+    embedding = VectorField(
+        dimensions=1536,
+        null=True,
+        blank=True,
+        help_text="Only populated when RAG_VECTOR_STORE is 'pgvector'"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    objects = ChunkManager()
+    
+    def __str__(self):
+        return f"{self.manual} - page {self.page_number} ({self.vector_id})"
+    
+    class Meta:
+        db_table = 'chunks'
+        ordering = ['manual', 'page_number', 'id']
+        indexes = [
+            # Leading manual_id lets single-manual searches scan only that
+            # manual's rows; the HNSW index serves library-wide searches.
+            # Each manual also gets a partial HNSW index, created by
+            # ingestion (see vector_store.PgVectorStore).
+            models.Index(fields=['manual', 'page_number']),
+            HnswIndex(
+                name='chunks_embedding_hnsw',
+                fields=['embedding'],
+                m=16,
+                ef_construction=64,
+                opclasses=['vector_cosine_ops'],
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['manual', 'vector_id'],
+                name='unique_manual_vector_id'
+            ),
+        ]
+
+
+class EmbeddingCacheEntry(models.Model):
+    """
+    Content-addressed embedding cache, keyed by model and normalized text hash.
+    """
+    
+    key = models.CharField(max_length=64, primary_key=True)
+    model = models.CharField(max_length=100)
+    vector = models.BinaryField(help_text="float32 vector bytes")
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    
+    def __str__(self):
+        return f"{self.model} - {self.key[:12]}"
+    
+    class Meta:
+        db_table = 'embedding_cache'
+        verbose_name = 'Embedding Cache Entry'
+        verbose_name_plural = 'Embedding Cache Entries'
+
+
+class KeywordIndex(models.Model):
+    """
+    Compressed BM25 postings for a manual's chunks (see keyword_index.py).
+    """
+    
+    manual = models.OneToOneField(
+        'manuals.Manual',
+        on_delete=models.CASCADE,
+        related_name='keyword_index'
+    )
+    data = models.BinaryField()
+    chunk_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.manual} - {self.chunk_count} chunks"
+    
+    class Meta:
+        db_table = 'keyword_indexes'
+        verbose_name = 'Keyword Index'
+        verbose_name_plural = 'Keyword Indexes'
+
+
+class IngestionRun(models.Model):
+    """
+    A background ingestion of one manual (see tasks.py), with per-stage
+    progress counters updated as page batches complete.
+    """
+    
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+    ]
+    
+    ACTIVE_STATUSES = ['pending', 'running']
+    
+    STAGE_CHOICES = [
+        ('extract', 'Extract'),
+        ('chunk', 'Chunk, embed and index'),
+        ('finish', 'Finish'),
+    ]
+    
+    manual = models.ForeignKey(
+        'manuals.Manual',
+        on_delete=models.CASCADE,
+        related_name='ingestion_runs'
+    )
+    force = models.BooleanField(default=False, help_text="Re-embed every page, even if unchanged")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    stage = models.CharField(max_length=20, choices=STAGE_CHOICES, default='extract')
+    pages_total = models.PositiveIntegerField(default=0)
+    pages_extracted = models.PositiveIntegerField(default=0)
+    pages_changed = models.PositiveIntegerField(default=0)
+    pages_removed = models.PositiveIntegerField(default=0)
+    # Batches of changed pages, each chunked, embedded and indexed in turn
+    batches_total = models.PositiveIntegerField(default=0)
+    batches_chunked = models.PositiveIntegerField(default=0)
+    batches_embedded = models.PositiveIntegerField(default=0)
+    batches_indexed = models.PositiveIntegerField(default=0)
+    chunks_embedded = models.PositiveIntegerField(default=0)
+    chunks_deleted = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.manual} - {self.get_status_display()} ({self.progress})"
+    
+    @property
+    def progress(self):
+        """
+        Human-readable progress of the current stage.
+        """
+        if self.status in ('pending', 'succeeded', 'failed'):
+            return self.get_status_display()
+        if self.stage == 'extract':
+            return f"Extracted {self.pages_extracted}/{self.pages_total} pages"
+        if self.stage == 'chunk':
+            return (
+                f"Batches: {self.batches_chunked} chunked, {self.batches_embedded} embedded, "
+                f"{self.batches_indexed} indexed of {self.batches_total}"
+            )
+        return "Finishing"
+    
+    class Meta:
+        db_table = 'ingestion_runs'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['manual', '-created_at']),
+        ]
+        constraints = [
+            # At most one pending or running ingestion per manual
+            models.UniqueConstraint(
+                fields=['manual'],
+                condition=models.Q(status__in=['pending', 'running']),
+                name='ingestion_runs_one_active_per_manual',
+            ),
+        ]
+        verbose_name = 'Ingestion Run'
+        verbose_name_plural = 'Ingestion Runs'
@@ -0,0 +1,341 @@
+"""
+OpenAI client wrapper.
+
+Embedding requests are packed with as many texts as the provider accepts
+per call, and batches run concurrently under a semaphore. Rate limits and
+transient errors are retried with exponential backoff, so no batch is
+dropped.
+
+RAG_EMBEDDING_PROVIDER = 'stub' and RAG_CHAT_PROVIDER = 'stub' swap in
+deterministic offline providers for tests and benchmarks.
+"""
+import asyncio
+import hashlib
+import os
+import random
+import re
+import threading
+import weakref
+from contextlib import asynccontextmanager
+
+import numpy as np
+import openai
+from django.conf import settings
+
+from .text_chunker import count_tokens
+
+# OpenAI embedding request limits
+MAX_INPUTS_PER_REQUEST = 2048
+MAX_TOKENS_PER_REQUEST = 300_000
+
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 30.0
+
+_RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APIConnectionError,
+    openai.APITimeoutError,
+    openai.InternalServerError,
+)
+
+_client = None
+_async_clients = weakref.WeakKeyDictionary()
+
+# Event loop that runs the sync wrappers' coroutines, so sync callers share
+# one set of async clients instead of leaking a client per call
+_sync_loop = None
+_sync_loop_pid = None
+_sync_loop_lock = threading.Lock()
+
+
+def get_client():
+    """
+    Return a shared synchronous OpenAI client, created on first use.
+    """
+    global _client
+    if _client is None:
+        _client = openai.OpenAI(api_key=getattr(settings, 'OPENAI_API_KEY', None))
+    return _client
+
+
+def get_async_client(max_retries=openai.DEFAULT_MAX_RETRIES):
+    """
+    Return an AsyncOpenAI client shared by everything on the running event
+    loop, so concurrent requests reuse its connection pool (and skip the
+    TLS handshake). One client per max_retries setting.
+    """
+    clients = _async_clients.setdefault(asyncio.get_running_loop(), {})
+    client = clients.get(max_retries)
+    if client is None:
+        client = clients[max_retries] = openai.AsyncOpenAI(
+            api_key=getattr(settings, 'OPENAI_API_KEY', None),
+            max_retries=max_retries,
+        )
+    return client
+
+
+def _run_sync(coroutine):
+    """
+    Run a coroutine on the process's background event loop and wait for its
+    result. The loop (and its thread) is started on first use, and again in a
+    forked child, where the parent's thread no longer exists.
+    """
+    global _sync_loop, _sync_loop_pid
+    with _sync_loop_lock:
+        if _sync_loop is None or _sync_loop_pid != os.getpid():
+            _sync_loop = asyncio.new_event_loop()
+            _sync_loop_pid = os.getpid()
+            threading.Thread(target=_sync_loop.run_forever, name='openai-sync-loop', daemon=True).start()
+        loop = _sync_loop
+    return asyncio.run_coroutine_threadsafe(coroutine, loop).result()
+
+
+class OpenAIEmbeddingProvider:
+    """
+    Embeddings from the OpenAI API.
+    """
+    name = 'openai'
+    max_inputs = MAX_INPUTS_PER_REQUEST
+    max_tokens = MAX_TOKENS_PER_REQUEST
+
+    def __init__(self, model, dimensions):
+        self.model = model
+        self.dimensions = dimensions
+
+    @asynccontextmanager
+    async def connect(self):
+        # Retries are handled by _embed_with_retry, not the SDK
+        yield _OpenAISession(get_async_client(max_retries=0), self.model)
+
+
+class _OpenAISession:
+    def __init__(self, client, model):
+        self.client = client
+        self.model = model
+
+    async def embed(self, texts):
+        response = await self.client.embeddings.create(model=self.model, input=texts)
+        return [item.embedding for item in response.data]
+
+
+class StubEmbeddingProvider:
+    """
+    Deterministic offline embeddings: a unit vector seeded from the text's hash.
+    Identical texts always map to identical vectors.
+    """
+    name = 'stub'
+    max_inputs = MAX_INPUTS_PER_REQUEST
+    max_tokens = MAX_TOKENS_PER_REQUEST
+
+    def __init__(self, model, dimensions):
+        self.model = model
+        self.dimensions = dimensions
+
+    @asynccontextmanager
+    async def connect(self):
+        yield self
+
+    async def embed(self, texts):
+        return [self.vector(text) for text in texts]
+
+    def vector(self, text):
+        seed = int.from_bytes(hashlib.sha256(text.encode('utf-8')).digest()[:8], 'little')
+        vector = np.random.default_rng(seed).standard_normal(self.dimensions).astype(np.float32)
+        vector /= np.linalg.norm(vector)
+        return vector.tolist()
+
+
+EMBEDDING_PROVIDERS = {
+    'openai': OpenAIEmbeddingProvider,
+    'stub': StubEmbeddingProvider,
+}
+
+
+def get_embedding_provider():
+    """
+    Return the embedding provider selected by settings.RAG_EMBEDDING_PROVIDER.
+    """
+    provider_class = EMBEDDING_PROVIDERS[settings.RAG_EMBEDDING_PROVIDER]
+    return provider_class(settings.OPENAI_EMBEDDING_MODEL, settings.EMBEDDING_DIMENSIONS)
+
+
+def pack_batches(texts, max_inputs=MAX_INPUTS_PER_REQUEST, max_tokens=MAX_TOKENS_PER_REQUEST):
+    """
+    Split texts into consecutive (start, stop) ranges that each fit in one request.
+    """
+    batches = []
+    start = 0
+    batch_tokens = 0
+    for index, tokens in enumerate(count_tokens(texts)):
+        full = index - start >= max_inputs or batch_tokens + tokens > max_tokens
+        if full and index > start:
+            batches.append((start, index))
+            start = index
+            batch_tokens = 0
+        batch_tokens += tokens
+    if start < len(texts):
+        batches.append((start, len(texts)))
+    return batches
+
+
+def _backoff_seconds(attempt, error):
+    retry_after = None
+    response = getattr(error, 'response', None)
+    if response is not None:
+        retry_after = response.headers.get('retry-after')
+    if retry_after:
+        try:
+            return min(BACKOFF_MAX_SECONDS, max(0.0, float(retry_after)))
+        except ValueError:
+            pass
+    delay = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt)
+    return delay * random.uniform(0.5, 1.0)
+
+
+async def _embed_with_retry(session, texts, max_retries):
+    attempt = 0
+    while True:
+        try:
+            return await session.embed(texts)
+        except _RETRYABLE_ERRORS as error:
+            if attempt >= max_retries:
+                raise
+            await asyncio.sleep(_backoff_seconds(attempt, error))
+            attempt += 1
+
+
+async def aget_embeddings(texts, provider=None, concurrency=None):
+    """
+    Embed a list of texts, packing them into as few requests as possible and
+    running up to `concurrency` requests at once. Returns vectors in input order.
+    """
+    texts = list(texts)
+    if not texts:
+        return []
+    provider = provider or get_embedding_provider()
+    semaphore = asyncio.Semaphore(concurrency or settings.EMBEDDING_CONCURRENCY)
+    max_retries = settings.EMBEDDING_MAX_RETRIES
+
+    async with provider.connect() as session:
+        async def run(start, stop):
+            async with semaphore:
+                return await _embed_with_retry(session, texts[start:stop], max_retries)
+
+        results = await asyncio.gather(*(
+            run(start, stop)
+            for start, stop in pack_batches(texts, provider.max_inputs, provider.max_tokens)
+        ))
+    return [vector for batch in results for vector in batch]
+
+
+def get_embeddings(texts, provider=None, concurrency=None):
+    """
+    Synchronous wrapper around aget_embeddings.
+    """
+    return _run_sync(aget_embeddings(texts, provider, concurrency))
+
+
+async def aget_embedding(text):
+    """
+    Embed a single text.
+    """
+    return (await aget_embeddings([text]))[0]
+
+
+def get_embedding(text):
+    """
+    Embed a single text.
+    """
+    return get_embeddings([text])[0]
+
+
+class OpenAIChatProvider:
+    """
+    Chat completions from the OpenAI API.
+    """
+
+    def __init__(self, model):
+        self.model = model
+
+    def complete(self, messages):
+        response = get_client().chat.completions.create(model=self.model, messages=messages)
+        return response.choices[0].message.content
+
+    async def acomplete(self, messages):
+        response = await get_async_client().chat.completions.create(model=self.model, messages=messages)
+        return response.choices[0].message.content
+
+    async def stream(self, messages):
+        """
+        Yield the reply's text deltas as the API produces them.
+        """
+        response = await get_async_client().chat.completions.create(
+            model=self.model,
+            messages=messages,
+            stream=True,
+        )
+        async for event in response:
+            if event.choices and event.choices[0].delta.content:
+                yield event.choices[0].delta.content
+
+
+class StubChatProvider:
+    """
+    Deterministic offline chat: answers with the opening of the first context block.
+    """
+
+    def __init__(self, model):
+        self.model = model
+
+    def complete(self, messages):
+        question = next(
+            (message['content'] for message in reversed(messages) if message['role'] == 'user'),
+            '',
+        )
+        context = next(
+            (message['content'] for message in messages if message['role'] == 'system' and '[page' in message['content']),
+            '',
+        )
+        excerpt = context[context.find('[page'):][:200] if context else 'No matching manual sections.'
+        return f'(stub) {question.strip()}\n\n{excerpt}'
+
+    async def acomplete(self, messages):
+        return self.complete(messages)
+
+    async def stream(self, messages):
+        for word in re.findall(r'\S+\s*', self.complete(messages)):
+            yield word
+
+
+CHAT_PROVIDERS = {
+    'openai': OpenAIChatProvider,
+    'stub': StubChatProvider,
+}
+
+
+def get_chat_provider():
+    """
+    Return the chat provider selected by settings.RAG_CHAT_PROVIDER.
+    """
+    return CHAT_PROVIDERS[settings.RAG_CHAT_PROVIDER](settings.OPENAI_CHAT_MODEL)
+
+
+def chat_completion(messages):
+    """
+    Return the assistant reply for a list of chat messages.
+    """
+    return get_chat_provider().complete(messages)
+
+
+async def achat_completion(messages):
+    """
+    Async chat_completion.
+    """
+    return await get_chat_provider().acomplete(messages)
+
+
+def stream_chat_completion(messages):
+    """
+    Return an async iterator over the text deltas of the assistant reply.
+    """
+    return get_chat_provider().stream(messages)
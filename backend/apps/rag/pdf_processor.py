@@ -0,0 +1,161 @@
+"""
+PDF text extraction for manual ingestion.
+
+Pages are extracted in small batches across a process pool and yielded in
+page order, so only a bounded window of page text is held in memory no
+matter how large the manual is.
+"""
+import os
+import re
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+
+import pypdfium2 as pdfium
+
+# Pages handed to a worker per task. Small enough to keep memory flat,
+# large enough that the PDF open cost is amortized.
+DEFAULT_BATCH_SIZE = 8
+
+_CONTROL_CHARS = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f\x7f]')
+_HYPHENATED_BREAK = re.compile(r'(\w)-\n(\w)')
+_INLINE_WHITESPACE = re.compile(r'[ \t ]+')
+_EXTRA_NEWLINES = re.compile(r'\n{3,}')
+
+
+@dataclass(frozen=True)
+class PageText:
+    """
+    Text of a single PDF page. page_number is 1-based.
+    """
+    page_number: int
+    text: str
+
+
+def clean_text(text):
+    """
+    Normalize raw extracted text: line endings, control characters,
+    hyphenated line breaks and runs of whitespace.
+    """
+    text = text.replace('\r\n', '\n').replace('\r', '\n')
+    # pdfium marks soft hyphens at line ends with \x02
+    text = text.replace('\x02', '-')
+    text = _CONTROL_CHARS.sub('', text)
+    text = _HYPHENATED_BREAK.sub(r'\1\2', text)
+    text = _INLINE_WHITESPACE.sub(' ', text)
+    text = '\n'.join(line.strip() for line in text.split('\n'))
+    text = _EXTRA_NEWLINES.sub('\n\n', text)
+    return text.strip()
+
+
+def find_pdfs(path):
+    """
+    Return the PDF files at path (a single file or a directory tree),
+    sorted so runs are reproducible.
+    """
+    path = Path(path)
+    if path.is_file():
+        return [path]
+    return sorted(p for p in path.rglob('*') if p.suffix.lower() == '.pdf')
+
+
+def count_pages(pdf_path):
+    """
+    Return the number of pages in a PDF without extracting any text.
+    """
+    try:
+        pdf = pdfium.PdfDocument(str(pdf_path))
+    except pdfium.PdfiumError:
+        import pdfplumber
+        with pdfplumber.open(str(pdf_path)) as pdf:
+            return len(pdf.pages)
+    try:
+        return len(pdf)
+    finally:
+        pdf.close()
+
+
+def extract_page_range(pdf_path, start, stop):
+    """
+    Extract pages [start, stop) (0-based) from a PDF.
+    Runs inside pool workers, so it opens its own document handle.
+    """
+    try:
+        pdf = pdfium.PdfDocument(str(pdf_path))
+    except pdfium.PdfiumError:
+        return _extract_page_range_pdfplumber(pdf_path, start, stop)
+
+    pages = []
+    try:
+        for index in range(start, stop):
+            page = pdf[index]
+            textpage = page.get_textpage()
+            try:
+                text = textpage.get_text_range()
+            finally:
+                textpage.close()
+                page.close()
+            pages.append(PageText(index + 1, clean_text(text)))
+    finally:
+        pdf.close()
+    return pages
+
+
+def _extract_page_range_pdfplumber(pdf_path, start, stop):
+    # Slower fallback for files pdfium refuses to open
+    import pdfplumber
+
+    pages = []
+    with pdfplumber.open(str(pdf_path)) as pdf:
+        for index in range(start, stop):
+            page = pdf.pages[index]
+            pages.append(PageText(index + 1, clean_text(page.extract_text() or '')))
+            page.close()
+    return pages
+
+
+def iter_documents(pdf_paths, executor=None, batch_size=DEFAULT_BATCH_SIZE, max_in_flight=None):
+    """
+    Yield (pdf_path, page_count, PageText) for every page of every PDF, in order.
+
+    With an executor, page batches from all documents are submitted to the
+    pool through a single sliding window, so small documents don't leave
+    workers idle and at most max_in_flight batches are ever buffered.
+    """
+    if max_in_flight is None:
+        max_in_flight = (os.cpu_count() or 1) * 2
+
+    def batches():
+        for pdf_path in pdf_paths:
+            page_count = count_pages(pdf_path)
+            for start in range(0, page_count, batch_size):
+                yield pdf_path, page_count, start, min(start + batch_size, page_count)
+
+    if executor is None:
+        for pdf_path, page_count, start, stop in batches():
+            for page in extract_page_range(pdf_path, start, stop):
+                yield pdf_path, page_count, page
+        return
+
+    pending = deque()
+    for pdf_path, page_count, start, stop in batches():
+        future = executor.submit(extract_page_range, str(pdf_path), start, stop)
+        pending.append((pdf_path, page_count, future))
+        if len(pending) >= max_in_flight:
+            yield from _drain(pending.popleft())
+    while pending:
+        yield from _drain(pending.popleft())
+
+
+def _drain(item):
+    pdf_path, page_count, future = item
+    for page in future.result():
+        yield pdf_path, page_count, page
+
+
+def iter_pages(pdf_path, executor=None, batch_size=DEFAULT_BATCH_SIZE, max_in_flight=None):
+    """
+    Yield PageText for each page of a single PDF, in order.
+    """
+    for _, _, page in iter_documents([pdf_path], executor, batch_size, max_in_flight):
+        yield page
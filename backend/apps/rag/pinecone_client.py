@@ -0,0 +1,103 @@
+"""
+Pinecone client wrapper, talking to the index's data plane over HTTP.
+"""
+import httpx
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+API_VERSION = '2025-01'
+UPSERT_BATCH_SIZE = 100
+DELETE_BATCH_SIZE = 1000
+
+_client = None
+
+
+def vector_namespace(manual):
+    """
+    Return the Pinecone namespace holding a manual's vectors.
+    """
+    return manual.pinecone_namespace or f'manual-{manual.pk}'
+
+
+class PineconeClient:
+    """
+    Minimal client for the Pinecone vector endpoints used by the pipeline.
+    """
+
+    def __init__(self, api_key, index_host, timeout=30.0):
+        if not api_key or not index_host:
+            raise ImproperlyConfigured('PINECONE_API_KEY and PINECONE_INDEX_HOST must be set')
+        if not index_host.startswith('http'):
+            index_host = f'https://{index_host}'
+        self.http = httpx.Client(
+            base_url=index_host,
+            timeout=timeout,
+            headers={
+                'Api-Key': api_key,
+                'X-Pinecone-API-Version': API_VERSION,
+            },
+        )
+
+    def _post(self, path, payload):
+        response = self.http.post(path, json=payload)
+        response.raise_for_status()
+        return response.json() if response.content else {}
+
+    def upsert_vectors(self, namespace, vectors):
+        """
+        Upsert vectors, given as dicts with 'id', 'values' and 'metadata'.
+        """
+        for start in range(0, len(vectors), UPSERT_BATCH_SIZE):
+            self._post('/vectors/upsert', {
+                'namespace': namespace,
+                'vectors': vectors[start:start + UPSERT_BATCH_SIZE],
+            })
+
+    def delete_vectors(self, namespace, ids):
+        """
+        Delete vectors by id.
+        """
+        ids = list(ids)
+        for start in range(0, len(ids), DELETE_BATCH_SIZE):
+            self._post('/vectors/delete', {
+                'namespace': namespace,
+                'ids': ids[start:start + DELETE_BATCH_SIZE],
+            })
+
+    def delete_namespace(self, namespace):
+        """
+        Delete every vector in a namespace. A namespace that doesn't exist
+        is already gone.
+        """
+        try:
+            self._post('/vectors/delete', {'namespace': namespace, 'deleteAll': True})
+        except httpx.HTTPStatusError as error:
+            if error.response.status_code != 404:
+                raise
+
+    def query_vectors(self, namespace, vector, top_k=5, filter=None):
+        """
+        Return the top_k matches for a query vector, with metadata.
+        """
+        payload = {
+            'namespace': namespace,
+            'vector': list(vector),
+            'topK': top_k,
+            'includeMetadata': True,
+        }
+        if filter:
+            payload['filter'] = filter
+        return self._post('/query', payload).get('matches', [])
+
+
+def get_pinecone_client():
+    """
+    Return a shared PineconeClient configured from settings.
+    """
+    global _client
+    if _client is None:
+        _client = PineconeClient(
+            getattr(settings, 'PINECONE_API_KEY', None),
+            getattr(settings, 'PINECONE_INDEX_HOST', None),
+        )
+    return _client
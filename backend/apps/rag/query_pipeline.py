@@ -0,0 +1,169 @@
+"""
+RAG query pipeline: question -> hybrid retrieval -> prompt -> LLM answer.
+
+This is the synchronous pipeline, for management commands and workers.
+The chat view uses async_pipeline, which shares the prompt building and
+AnswerStream defined here.
+
+Questions asked without prior turns go through the semantic answer cache
+(see answer_cache); follow-ups depend on their history and always run
+the full pipeline.
+"""
+import asyncio
+from dataclasses import dataclass, field
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from . import answer_cache
+from .context_packer import pack_prompt
+from .embedding_cache import get_cached_embedding
+from .openai_client import chat_completion, stream_chat_completion
+from .retrieval import search_manuals
+
+# Messages kept out of the conversation's rolling summary (see
+# apps.chat.summary). The prompt considers every message the summary doesn't
+# cover yet, up to HISTORY_MESSAGES + RAG_SUMMARY_BATCH_MESSAGES, and the
+# packer keeps as many as fit RAG_HISTORY_TOKEN_BUDGET.
+HISTORY_MESSAGES = 6
+
+SYSTEM_PROMPT = (
+    "You are Elucia, an assistant that answers questions about music gear "
+    "using only the manual excerpts provided. Cite the pages you used like "
+    "(p. 12). If the excerpts don't contain the answer, say you don't know."
+)
+
+
+@dataclass
+class Answer:
+    """
+    Generated answer plus the manual pages it was grounded on.
+    """
+    text: str
+    citations: list = field(default_factory=list)
+
+
+def context_title(manuals):
+    names = [str(manual) for manual in manuals]
+    if len(names) == 1:
+        return f"Excerpts from the {names[0]} manual"
+    return f"Excerpts from the {', '.join(names[:-1])} and {names[-1]} manuals"
+
+
+def build_prompt(manual, question, chunks, history=(), summary='', extra_manuals=()):
+    """
+    Pack the question, its context and prior turns into the prompt token
+    budget. history is a sequence of chat Message rows, oldest first;
+    summary is the conversation's rolling summary of earlier messages.
+    Returns a PackedPrompt; its chunks are the ones that made it in.
+    """
+    return pack_prompt(
+        SYSTEM_PROMPT, context_title([manual, *extra_manuals]), question, chunks, history, summary
+    )
+
+
+def citations_for(chunks):
+    """
+    Return unique {'page', 'heading'} citations in retrieval order, with
+    'manual' added for chunks retrieved across several manuals.
+    """
+    seen = set()
+    citations = []
+    for chunk in chunks:
+        key = (chunk.source, chunk.page_number, chunk.heading)
+        if key not in seen:
+            seen.add(key)
+            citation = {'page': chunk.page_number, 'heading': chunk.heading}
+            if chunk.source:
+                citation['manual'] = chunk.source
+            citations.append(citation)
+    return citations
+
+
+def history_limit(conversation):
+    """
+    Return how many of a conversation's latest messages its summary
+    doesn't cover, capped at HISTORY_MESSAGES + RAG_SUMMARY_BATCH_MESSAGES.
+    """
+    unsummarized = conversation.message_count - conversation.summary_message_count
+    return max(0, min(unsummarized, HISTORY_MESSAGES + settings.RAG_SUMMARY_BATCH_MESSAGES))
+
+
+def recent_history(conversation, limit=None):
+    """
+    Return the last `limit` messages of a conversation (by default those
+    after its summary, see history_limit), oldest first.
+    """
+    limit = history_limit(conversation) if limit is None else limit
+    return list(conversation.messages.order_by('-created_at', '-id')[:limit])[::-1]
+
+
+def _retrieve(manual, question, history, extra_manuals):
+    """
+    Return (question_vector, cacheable, cached (text, citations) or None, chunks).
+    Chunks are only retrieved on a cache miss.
+    """
+    cacheable = answer_cache.enabled() and not history and not extra_manuals
+    question_vector = get_cached_embedding(question)
+    if cacheable:
+        cached = answer_cache.lookup(manual, question_vector)
+        if cached is not None:
+            return question_vector, cacheable, cached, []
+    chunks = search_manuals([manual, *extra_manuals], question, question_vector=question_vector)
+    return question_vector, cacheable, None, chunks
+
+
+def answer_question(manual, question, history=(), summary='', extra_manuals=()):
+    """
+    Answer a question about a manual, and any extra_manuals. Returns an
+    Answer.
+    """
+    question_vector, cacheable, cached, chunks = _retrieve(manual, question, history, extra_manuals)
+    if cached is not None:
+        return Answer(*cached)
+
+    prompt = build_prompt(manual, question, chunks, history, summary, extra_manuals)
+    answer = Answer(
+        text=chat_completion(prompt.messages),
+        citations=citations_for(prompt.chunks),
+    )
+    if cacheable:
+        answer_cache.store(manual, question_vector, answer.text, answer.citations)
+    return answer
+
+
+class AnswerStream:
+    """
+    An answer generated incrementally. Iterate with `async for` to get text
+    deltas; afterwards .text holds the full answer. Citations are known
+    before the first delta.
+    """
+
+    def __init__(self, manual, citations, messages=None, text='', question_vector=None):
+        self.manual = manual
+        self.citations = citations
+        self.messages = messages
+        self.text = text
+        self.question_vector = question_vector
+
+    async def __aiter__(self):
+        if self.messages is None:
+            # Cached answer: sent as a single delta
+            yield self.text
+            return
+        parts = []
+        deltas = stream_chat_completion(self.messages).__aiter__()
+        while True:
+            # Fail a stalled stream instead of holding the connection open
+            try:
+                delta = await asyncio.wait_for(deltas.__anext__(), settings.RAG_GENERATION_TIMEOUT)
+            except StopAsyncIteration:
+                break
+            parts.append(delta)
+            yield delta
+        self.text = ''.join(parts)
+        if self.question_vector is not None:
+            await sync_to_async(answer_cache.store)(
+                self.manual, self.question_vector, self.text, self.citations
+            )
+
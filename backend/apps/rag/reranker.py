@@ -0,0 +1,185 @@
+"""
+Optional reranking of fused retrieval candidates.
+
+Rank fusion only sees each retriever's order, so the top of the list often
+holds near-duplicates (overlapping chunk windows, boilerplate repeated on
+several pages) or passages that merely share a rare term with the
+question. With RAG_RERANKER set, fusion keeps RAG_RERANK_CANDIDATES
+chunks, a reranker scores them all in one batch, and the top_k are picked
+greedily, each penalized by its term overlap with the chunks already
+picked.
+
+Rerankers:
+    features       a linear scorer over cheap features (fusion score, both
+                   retriever ranks, question term coverage of the text and
+                   heading, text quality, length)
+    cross-encoder  a sentence-transformers CrossEncoder (RAG_RERANK_MODEL),
+                   for CPU inference; needs the sentence-transformers package
+
+The reranker is built in the background, outside any request's deadline:
+servers start loading it at startup (see elucia/asgi.py), anything else on
+first use. Until it is ready, or if it can't be built (a missing package,
+an unknown name, a model that fails to load, remembered for the life of
+the process), or if scoring fails or takes longer than
+RAG_RERANK_BUDGET_MS, the fused order is used.
+"""
+import logging
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+import numpy as np
+from django.conf import settings
+
+from .keyword_index import tokenize
+
+logger = logging.getLogger(__name__)
+
+# Weight of the term overlap (Jaccard) with an already picked chunk
+REDUNDANCY_PENALTY = 0.5
+
+# Chunks shorter than this many terms are likely page furniture
+MIN_USEFUL_TERMS = 40
+
+_NOISE = re.compile(r'[^\w\s.,;:()\'"%/+-]')
+
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='rag-rerank')
+
+
+class FeatureReranker:
+    """
+    Scores candidates with a linear model over per-chunk features.
+    """
+    # fusion score, 1/vector rank, 1/keyword rank, text term coverage,
+    # heading term coverage, text quality, length
+    WEIGHTS = np.array([1.0, 0.5, 0.5, 1.5, 0.75, 1.0, 0.5])
+
+    def scores(self, question, chunks, term_sets):
+        query_terms = set(tokenize(question))
+        features = np.zeros((len(chunks), len(self.WEIGHTS)))
+        for row, chunk, terms in zip(features, chunks, term_sets):
+            row[0] = chunk.score
+            row[1] = 1.0 / chunk.vector_rank if chunk.vector_rank else 0.0
+            row[2] = 1.0 / chunk.keyword_rank if chunk.keyword_rank else 0.0
+            if query_terms:
+                row[3] = len(query_terms & terms) / len(query_terms)
+                row[4] = len(query_terms & set(tokenize(chunk.heading))) / len(query_terms)
+            row[5] = 1.0 - len(_NOISE.findall(chunk.text)) / max(len(chunk.text), 1)
+            row[6] = min(len(terms) / MIN_USEFUL_TERMS, 1.0)
+        # Fusion scores are tiny (1/(60 + rank)); scale to the best one
+        features[:, 0] /= features[:, 0].max() or 1.0
+        return features @ self.WEIGHTS
+
+
+class CrossEncoderReranker:
+    """
+    Scores (question, chunk) pairs with a cross-encoder model.
+    """
+
+    def __init__(self):
+        from sentence_transformers import CrossEncoder
+        self.model = CrossEncoder(settings.RAG_RERANK_MODEL, device='cpu')
+
+    def scores(self, question, chunks, term_sets):
+        pairs = [(question, f'{chunk.heading}\n{chunk.text}') for chunk in chunks]
+        return self.model.predict(pairs, batch_size=len(pairs))
+
+
+RERANKERS = {
+    'features': FeatureReranker,
+    'cross-encoder': CrossEncoderReranker,
+}
+
+_loading = None
+_loading_lock = threading.Lock()
+
+
+def _build_reranker():
+    try:
+        return RERANKERS[settings.RAG_RERANKER]()
+    except Exception:
+        logger.exception('Loading the %r reranker failed; using fused order', settings.RAG_RERANKER)
+        return None
+
+
+def load_reranker():
+    """
+    Start building the configured reranker in the background, once per
+    process. Returns the Future of the reranker (None if it failed), or
+    None if reranking is off.
+    """
+    global _loading
+    if not settings.RAG_RERANKER:
+        return None
+    with _loading_lock:
+        if _loading is None:
+            _loading = _executor.submit(_build_reranker)
+    return _loading
+
+
+def get_reranker():
+    """
+    Return the configured reranker, or None if reranking is off, or the
+    reranker is still loading or failed to load.
+    """
+    loading = load_reranker()
+    if loading is None or not loading.done():
+        return None
+    return loading.result()
+
+
+def candidate_count(top_k):
+    """
+    Return how many fused chunks to keep for the reranker.
+    """
+    return max(top_k, settings.RAG_RERANK_CANDIDATES) if settings.RAG_RERANKER else top_k
+
+
+def _jaccard(first, second):
+    shared = len(first & second)
+    return shared / ((len(first) + len(second) - shared) or 1)
+
+
+def _score(reranker, question, chunks):
+    term_sets = [set(tokenize(chunk.text)) for chunk in chunks]
+    return np.asarray(reranker.scores(question, chunks, term_sets), dtype=float), term_sets
+
+
+def select(chunks, scores, term_sets, top_k):
+    """
+    Pick top_k chunks by score, penalizing overlap with those picked before.
+    """
+    overlap = np.zeros(len(chunks))
+    available = np.ones(len(chunks), dtype=bool)
+    picked = []
+    for _ in range(min(top_k, len(chunks))):
+        adjusted = np.where(available, scores - REDUNDANCY_PENALTY * overlap, -np.inf)
+        best = int(adjusted.argmax())
+        picked.append(chunks[best])
+        available[best] = False
+        for index in np.flatnonzero(available):
+            overlap[index] = max(overlap[index], _jaccard(term_sets[index], term_sets[best]))
+    return picked
+
+
+def rerank(question, chunks, top_k, budget_ms=None):
+    """
+    Return the top_k of the fused chunks (best first) after reranking, or
+    in fused order if reranking is off, the reranker isn't loaded, or
+    scoring fails or misses its deadline.
+    """
+    reranker = get_reranker()
+    if reranker is None or len(chunks) <= 1:
+        return chunks[:top_k]
+    budget = (budget_ms or settings.RAG_RERANK_BUDGET_MS) / 1000.0
+    future = _executor.submit(_score, reranker, question, chunks)
+    try:
+        scores, term_sets = future.result(timeout=budget)
+    except FutureTimeoutError:
+        logger.warning('Reranking exceeded its %.0f ms budget', budget * 1000)
+        return chunks[:top_k]
+    except Exception as error:
+        logger.warning('Reranking failed: %s', error)
+        return chunks[:top_k]
+    return select(chunks, scores, term_sets, top_k)
@@ -0,0 +1,204 @@
+"""
+Hybrid retrieval: BM25 keyword search fused with vector similarity.
+
+Both retrievers run concurrently and are merged with reciprocal rank
+fusion. If a retriever hasn't finished when the latency budget runs out,
+its results are dropped and the other's are used alone. The fused chunks
+then go through the optional reranker (see reranker.py).
+
+A question can span several manuals (see search_manuals): each is searched
+concurrently, and their results are ranked together before a single fusion
+(see fuse_manuals).
+"""
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from operator import attrgetter, itemgetter
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from .embedding_cache import get_cached_embedding
+from .keyword_index import get_keyword_index
+from .models import Chunk
+from .reranker import candidate_count, rerank
+from .vector_store import get_vector_store
+
+logger = logging.getLogger(__name__)
+
+# Standard RRF damping constant
+RRF_K = 60
+
+_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix='rag-retrieval')
+
+
+@dataclass
+class RetrievedChunk:
+    """
+    A chunk selected for the prompt. Ranks are 1-based, None if the
+    retriever didn't return the chunk. source names the manual when
+    several were searched.
+    """
+    vector_id: str
+    page_number: int
+    heading: str
+    text: str
+    score: float
+    vector_rank: int = None
+    keyword_rank: int = None
+    source: str = ''
+
+
+def reciprocal_rank_fusion(rankings, k=RRF_K):
+    """
+    Fuse several ranked lists of ids. Returns (id, score) pairs, best first.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, item_id in enumerate(ranking, start=1):
+            scores[item_id] = scores.get(item_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+def _in_worker(function, *args):
+    # Threads keep their own DB connections; drop ones that went stale
+    close_old_connections()
+    return function(*args)
+
+
+def vector_search(manual, question, candidates, question_vector=None):
+    """
+    Return VectorMatches for a question from the configured vector store.
+    """
+    if question_vector is None:
+        question_vector = get_cached_embedding(question)
+    return get_vector_store().query(manual, question_vector, candidates)
+
+
+def keyword_search(manual, question, candidates):
+    """
+    Return (vector_id, score) pairs from the manual's BM25 index.
+    """
+    return get_keyword_index(manual).search(question, candidates)
+
+
+def _result_or_empty(future, name):
+    if not future.done():
+        logger.warning('%s retrieval exceeded the latency budget', name)
+        return []
+    if future.exception():
+        logger.warning('%s retrieval failed: %s', name, future.exception())
+        return []
+    return future.result()
+
+
+def fuse(manuals, vector_matches, keyword_hits, top_k):
+    """
+    Merge vector and keyword results (each best first) of the given
+    manuals into top_k RetrievedChunks. Text for keyword-only hits is
+    loaded in one query.
+    """
+    vector_ranks = {match.vector_id: rank for rank, match in enumerate(vector_matches, start=1)}
+    keyword_ranks = {vector_id: rank for rank, (vector_id, _) in enumerate(keyword_hits, start=1)}
+    fused = reciprocal_rank_fusion([
+        [match.vector_id for match in vector_matches],
+        [vector_id for vector_id, _ in keyword_hits],
+    ])[:top_k]
+
+    by_id = {match.vector_id: match for match in vector_matches}
+    missing = [vector_id for vector_id, _ in fused if vector_id not in by_id]
+    if missing:
+        for chunk in Chunk.objects.filter(manual__in=manuals, vector_id__in=missing).only(
+            'vector_id', 'page_number', 'heading', 'text'
+        ):
+            by_id[chunk.vector_id] = chunk
+
+    results = []
+    for vector_id, score in fused:
+        source = by_id.get(vector_id)
+        if source is None:
+            continue
+        results.append(RetrievedChunk(
+            vector_id=vector_id,
+            page_number=source.page_number,
+            heading=source.heading,
+            text=source.text,
+            score=score,
+            vector_rank=vector_ranks.get(vector_id),
+            keyword_rank=keyword_ranks.get(vector_id),
+        ))
+    return results
+
+
+def fuse_manuals(manuals, question, vector_results, keyword_results, top_k):
+    """
+    Fuse the manuals' vector matches and keyword hits, then rerank them
+    into the top_k.
+
+    With several manuals, each retriever's results are first ranked
+    across all of them: vector matches by cosine score, which compares
+    across manuals (one embedding space), and keyword hits by BM25 score
+    relative to their manual's best hit, as BM25 scores scale with each
+    manual's own term statistics. RRF then runs once over the two global
+    rankings.
+    """
+    manual_of = {}
+    vector_matches = []
+    keyword_hits = []
+    for manual, matches, hits in zip(manuals, vector_results, keyword_results):
+        vector_matches.extend(matches)
+        manual_of.update((match.vector_id, manual) for match in matches)
+        if hits:
+            best = max(score for _, score in hits) or 1.0
+            keyword_hits.extend((vector_id, score / best) for vector_id, score in hits)
+            manual_of.update((vector_id, manual) for vector_id, _ in hits)
+    vector_matches.sort(key=attrgetter('score'), reverse=True)
+    keyword_hits.sort(key=itemgetter(1), reverse=True)
+
+    chunks = fuse(manuals, vector_matches, keyword_hits, candidate_count(top_k))
+    if len(manuals) > 1:
+        for chunk in chunks:
+            chunk.source = str(manual_of[chunk.vector_id])
+    return rerank(question, chunks, top_k)
+
+
+def search_manuals(manuals, question, top_k=None, candidates=None, budget_ms=None, question_vector=None):
+    """
+    Return the top_k RetrievedChunks for a question across several manuals,
+    within budget_ms for the retrieval stage. Each manual's vector and
+    keyword searches all run concurrently (one vector store namespace per
+    manual), so latency follows the slowest manual, not the sum. Chunks are
+    labelled with their manual when there's more than one.
+    """
+    top_k = top_k or settings.RAG_TOP_K
+    candidates = candidates or settings.RAG_RETRIEVAL_CANDIDATES
+    deadline = time.monotonic() + (budget_ms or settings.RAG_RETRIEVAL_BUDGET_MS) / 1000.0
+
+    keyword_futures = [
+        _executor.submit(_in_worker, keyword_search, manual, question, candidates) for manual in manuals
+    ]
+    if question_vector is None and len(manuals) > 1:
+        # Embed once for every manual, while the keyword searches run
+        question_vector = get_cached_embedding(question)
+    vector_futures = [
+        _executor.submit(_in_worker, vector_search, manual, question, candidates, question_vector)
+        for manual in manuals
+    ]
+    wait(keyword_futures + vector_futures, timeout=max(deadline - time.monotonic(), 0))
+
+    return fuse_manuals(
+        manuals,
+        question,
+        [_result_or_empty(future, 'Vector') for future in vector_futures],
+        [_result_or_empty(future, 'Keyword') for future in keyword_futures],
+        top_k,
+    )
+
+
+def hybrid_search(manual, question, top_k=None, candidates=None, budget_ms=None, question_vector=None):
+    """
+    Return the top_k RetrievedChunks for a question about a manual,
+    within budget_ms for the retrieval stage.
+    """
+    return search_manuals([manual], question, top_k, candidates, budget_ms, question_vector)
@@ -0,0 +1,17 @@
+import copy
+
+from django.db import transaction
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from apps.manuals.models import Manual
+from .vector_store import get_vector_store
+
+
+@receiver(post_delete, sender=Manual)
+def delete_manual_vectors(sender, instance, **kwargs):
+    # Remove the manual's vectors (or, with pgvector, its partial HNSW
+    # index) once the delete commits. The copy keeps the pk, which Django
+    # clears on the instance after deleting it.
+    manual = copy.copy(instance)
+    transaction.on_commit(lambda: get_vector_store().delete_manual(manual), robust=True)
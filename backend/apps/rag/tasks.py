@@ -0,0 +1,260 @@
+"""
+Celery ingestion pipeline.
+
+start_ingestion() records an IngestionRun and enqueues this task graph:
+
+    ingest_manual_task
+      chord: extract_pages, one task per page batch
+        plan_ingestion        headings and content hashes, in page order
+          chord: chunk_batch -> embed_batch -> index_batch, per batch of
+                 changed pages
+            finish_ingestion  removed pages, keyword index, cache versions
+
+Page batches fan out across every worker process, so a large manual is
+no longer ingested on one core. A manual has at most one pending or
+running IngestionRun (a partial unique constraint); one that hasn't
+advanced for STALE_RUN_SECONDS is taken to have died with its worker. Every task updates the run's counters,
+which ManualAdmin shows; a failure in any of them marks the run failed.
+
+Page text travels through the result backend, embeddings don't:
+embed_batch fills the embedding cache and index_batch reads the vectors
+back from it. Workers must be able to read the PDF (MANUALS_ROOT on
+shared storage). The 'local' vector store is per process, so use it with
+a single worker.
+"""
+from datetime import timedelta
+
+from celery import Task, chain, chord, shared_task
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from apps.manuals.models import Manual
+from .embedding_cache import get_cached_embeddings
+from .ingestion import (
+    SYNC_BATCH_PAGES,
+    IngestionStats,
+    finish_manual,
+    page_content_hash,
+    plan_chunks,
+    resolve_pdf_path,
+    set_page_count,
+    store_chunks,
+)
+from .models import Chunk, IngestionRun, ManualPage
+from .pdf_processor import DEFAULT_BATCH_SIZE, PageText, count_pages, extract_page_range
+from .text_chunker import HeadingTracker, Section
+
+# A run whose counters haven't moved for this long is marked failed when
+# another ingestion of its manual is requested
+STALE_RUN_SECONDS = 3600
+
+
+def _update(run_id, **fields):
+    IngestionRun.objects.filter(pk=run_id).update(updated_at=timezone.now(), **fields)
+
+
+def _advance(run_id, **counts):
+    _update(run_id, **{name: F(name) + count for name, count in counts.items()})
+
+
+def _manual(run_id):
+    return Manual.objects.get(ingestion_runs=run_id)
+
+
+class IngestionTask(Task):
+    """
+    Base for the pipeline's tasks, which all take run_id as a keyword
+    argument: marks the run failed if the task raises.
+    """
+
+    def on_failure(self, exc, task_id, args, kwargs, einfo):
+        _update(
+            kwargs['run_id'],
+            status='failed',
+            error=f'{self.name}: {exc!r}',
+            finished_at=timezone.now(),
+        )
+
+
+def start_ingestion(manual, force=False):
+    """
+    Queue a background ingestion of a manual. Returns its IngestionRun, or
+    None if the manual already has one pending or running.
+    With force=True every page is treated as changed.
+    """
+    IngestionRun.objects.filter(
+        manual=manual,
+        status__in=IngestionRun.ACTIVE_STATUSES,
+        updated_at__lt=timezone.now() - timedelta(seconds=STALE_RUN_SECONDS),
+    ).update(status='failed', error='Abandoned: no progress', finished_at=timezone.now())
+    try:
+        with transaction.atomic():
+            run = IngestionRun.objects.create(manual=manual, force=force)
+    except IntegrityError:
+        return None
+    transaction.on_commit(lambda: ingest_manual_task.delay(run_id=run.pk))
+    return run
+
+
+@shared_task(base=IngestionTask)
+def ingest_manual_task(run_id):
+    manual = _manual(run_id)
+    pdf_path = str(resolve_pdf_path(manual))
+    page_count = count_pages(pdf_path)
+    if manual.page_count != page_count:
+        set_page_count(manual, page_count)
+    _update(run_id, status='running', stage='extract', pages_total=page_count)
+
+    body = plan_ingestion.s(run_id=run_id)
+    if not page_count:
+        body.delay([])
+        return
+    chord(
+        extract_pages.si(pdf_path, start, min(start + DEFAULT_BATCH_SIZE, page_count), run_id=run_id)
+        for start in range(0, page_count, DEFAULT_BATCH_SIZE)
+    )(body)
+
+
+@shared_task(base=IngestionTask)
+def extract_pages(pdf_path, start, stop, run_id):
+    """
+    Extract pages [start, stop) as [page_number, text] pairs.
+    """
+    pages = extract_page_range(pdf_path, start, stop)
+    _advance(run_id, pages_extracted=len(pages))
+    return [[page.page_number, page.text] for page in pages]
+
+
+@shared_task(base=IngestionTask)
+def plan_ingestion(batches, run_id):
+    """
+    Split the extracted pages into sections (headings carry across pages,
+    so this runs over the whole manual in order), keep the pages whose
+    content changed and fan them out in batches.
+    """
+    run = IngestionRun.objects.select_related('manual').get(pk=run_id)
+    known_hashes = dict(
+        ManualPage.objects.filter(manual=run.manual).values_list('page_number', 'content_hash')
+    )
+    tracker = HeadingTracker()
+    seen = set()
+    groups = [[]]
+    for page_number, text in (page for batch in batches for page in batch):
+        seen.add(page_number)
+        page_hash = page_content_hash(text, tracker.path)
+        sections = tracker.sections(PageText(page_number, text))
+        if not run.force and known_hashes.get(page_number) == page_hash:
+            continue
+        if len(groups[-1]) >= SYNC_BATCH_PAGES:
+            groups.append([])
+        groups[-1].append([
+            page_number,
+            page_hash,
+            [[list(section.heading_path), section.text] for section in sections],
+        ])
+    groups = [group for group in groups if group]
+
+    _update(
+        run_id,
+        stage='chunk',
+        pages_changed=sum(len(group) for group in groups),
+        batches_total=len(groups),
+    )
+    body = finish_ingestion.s(run_id=run_id, removed=sorted(set(known_hashes) - seen))
+    if not groups:
+        body.delay([])
+        return
+    chord(
+        chain(
+            chunk_batch.si(group, run_id=run_id),
+            embed_batch.s(run_id=run_id),
+            index_batch.s(run_id=run_id),
+        )
+        for group in groups
+    )(body)
+
+
+@shared_task(base=IngestionTask)
+def chunk_batch(group, run_id):
+    """
+    Chunk a batch of changed pages and work out which chunks are new and
+    which are stale.
+    """
+    changed = [
+        (
+            PageText(page_number, ''),
+            page_hash,
+            [Section(page_number, tuple(path), text) for path, text in sections],
+        )
+        for page_number, page_hash, sections in group
+    ]
+    new_chunks, stale = plan_chunks(_manual(run_id), changed)
+    _advance(run_id, batches_chunked=1)
+    return {
+        'pages': [[page_number, page_hash] for page_number, page_hash, _ in group],
+        'new': [
+            [chunk.page_number, chunk.content_hash, chunk.vector_id, chunk.text, chunk.heading, chunk.token_count]
+            for chunk in new_chunks
+        ],
+        'stale': [[chunk.pk, chunk.vector_id] for chunk in stale],
+    }
+
+
+@shared_task(base=IngestionTask)
+def embed_batch(batch, run_id):
+    """
+    Embed the batch's new chunks into the embedding cache.
+    """
+    if batch['new']:
+        get_cached_embeddings([text for _, _, _, text, _, _ in batch['new']])
+    _advance(run_id, batches_embedded=1)
+    return batch
+
+
+@shared_task(base=IngestionTask)
+def index_batch(batch, run_id):
+    """
+    Write the batch's vectors, chunks and page hashes.
+    """
+    manual = _manual(run_id)
+    new_chunks = [
+        Chunk(
+            manual=manual,
+            page_number=page_number,
+            content_hash=chunk_hash,
+            vector_id=vector_id,
+            text=text,
+            heading=heading,
+            token_count=token_count,
+        )
+        for page_number, chunk_hash, vector_id, text, heading, token_count in batch['new']
+    ]
+    stale = [Chunk(pk=pk, vector_id=vector_id) for pk, vector_id in batch['stale']]
+    # Cache hits: embed_batch just stored them
+    embeddings = get_cached_embeddings([chunk.text for chunk in new_chunks]) if new_chunks else []
+    store_chunks(manual, batch['pages'], new_chunks, stale, embeddings)
+    _advance(run_id, batches_indexed=1, chunks_embedded=len(new_chunks), chunks_deleted=len(stale))
+
+
+@shared_task(base=IngestionTask)
+def finish_ingestion(results, run_id, removed):
+    """
+    Drop removed pages, rebuild the keyword index and bump the manual's
+    cache version, then mark the run succeeded.
+    """
+    run = IngestionRun.objects.select_related('manual').get(pk=run_id)
+    _update(run_id, stage='finish')
+    stats = IngestionStats(
+        manual_id=run.manual_id,
+        chunks_embedded=run.chunks_embedded,
+        chunks_deleted=run.chunks_deleted,
+    )
+    finish_manual(run.manual, removed, stats, run.force)
+    _update(
+        run_id,
+        status='succeeded',
+        pages_removed=stats.pages_removed,
+        chunks_deleted=stats.chunks_deleted,
+        finished_at=timezone.now(),
+    )
@@ -1,3 +1,456 @@
-from django.test import TestCase
+import tempfile
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from apps.manuals.models import Manual
+from . import answer_cache, embedding_cache, reranker, vector_store
+from .context_packer import MESSAGE_OVERHEAD, TRUNCATION_MARK, build_excerpts, pack_prompt, token_counts
+from .ingestion import IngestionStats, _ingest_pages
+from .keyword_index import BM25Index, tokenize
+from .local_index import LocalVectorStore, ManualIndex, normalize
+from .models import Chunk, EmbeddingCacheEntry, IngestionRun, KeywordIndex, ManualPage
+from . import openai_client
+from .openai_client import OpenAIEmbeddingProvider, StubEmbeddingProvider
+from .pdf_processor import PageText
+from .retrieval import RetrievedChunk, fuse_manuals, keyword_search, reciprocal_rank_fusion, vector_search
+from .tasks import start_ingestion
+from .vector_store import VectorMatch
+from .text_chunker import HeadingTracker, Section, chunk_pages, chunk_sections, count_tokens
+
+
+class ChunkerTests(SimpleTestCase):
+    """
+    Heading detection and token windowing.
+    """
+
+    def test_headings_nest_and_carry_across_pages(self):
+        tracker = HeadingTracker()
+        first = tracker.sections(PageText(1, 'LFO SECTION\nThe LFO modulates pitch.\n2.1 Rate Control\nTurn the knob.'))
+        second = tracker.sections(PageText(2, 'More about the rate.'))
+
+        self.assertEqual([section.heading_path for section in first], [('LFO SECTION',), ('LFO SECTION', '2.1 Rate Control')])
+        self.assertEqual(second[0].heading_path, ('LFO SECTION', '2.1 Rate Control'))
+
+    def test_numbered_steps_are_not_headings(self):
+        sections = HeadingTracker().sections(PageText(1, 'SAVING\n2. Press [FUNC] and hold it\nThe display blinks.'))
+        self.assertEqual([section.heading_path for section in sections], [('SAVING',)])
+
+    def test_windows_respect_max_tokens_and_overlap(self):
+        text = ' '.join(f'word{index}' for index in range(400))
+        section = Section(1, ('VCF',), text)
+        chunks = chunk_sections([section], max_tokens=100, overlap=20)
+
+        self.assertGreater(len(chunks), 1)
+        self.assertTrue(all(chunk.token_count <= 100 for chunk in chunks))
+        self.assertEqual(sum(chunk.token_count for chunk in chunks), count_tokens([text])[0] + 20 * (len(chunks) - 1))
+        # Consecutive windows share the overlap
+        self.assertIn(chunks[1].text[:20], chunks[0].text[-len(chunks[1].text):])
+        self.assertTrue(chunks[-1].text.endswith('word399'))
+
+    def test_overlap_must_be_smaller_than_window(self):
+        with self.assertRaises(ValueError):
+            chunk_sections([Section(1, (), 'text')], max_tokens=10, overlap=10)
+
+    def test_chunks_never_span_pages(self):
+        pages = [PageText(number, f'Page {number} text about the filter.') for number in range(1, 40)]
+        chunks = list(chunk_pages(pages, max_tokens=50, overlap=5))
+        self.assertEqual([chunk.page_number for chunk in chunks], list(range(1, 40)))
+
+
+@override_settings(RAG_EMBEDDING_PROVIDER='stub')
+class EmbeddingCacheTests(TestCase):
+    """
+    Cache keys and hits.
+    """
+
+    def test_repeats_are_served_from_the_cache(self):
+        first = embedding_cache.get_cached_embeddings(['Press  WRITE', 'Press WRITE', 'Hold FUNC'])
+        self.assertEqual(first[0], first[1])
+        self.assertEqual(EmbeddingCacheEntry.objects.count(), 2)
+
+        # A lookup and the last-use touch, no insert
+        with self.assertNumQueries(2):
+            again = embedding_cache.get_cached_embeddings(['Hold FUNC'])
+        self.assertEqual(again[0], first[2])
+
+    def test_keys_depend_on_the_provider(self):
+        stub = StubEmbeddingProvider('text-embedding-3-small', 8)
+        openai = OpenAIEmbeddingProvider('text-embedding-3-small', 8)
+        self.assertNotEqual(
+            embedding_cache.cache_key(embedding_cache.cache_model(stub), 'text'),
+            embedding_cache.cache_key(embedding_cache.cache_model(openai), 'text'),
+        )
+
+
+class OpenAIClientTests(SimpleTestCase):
+    """
+    Client reuse and retry backoff.
+    """
+
+    @override_settings(OPENAI_API_KEY='test')
+    def test_sync_callers_share_one_client(self):
+        provider = OpenAIEmbeddingProvider('text-embedding-3-small', 8)
+        clients = []
+
+        async def embed(session, texts, max_retries):
+            clients.append(session.client)
+            return [[0.0] * 8 for _ in texts]
+
+        with mock.patch.object(openai_client, '_embed_with_retry', embed):
+            openai_client.get_embeddings(['a'], provider)
+            openai_client.get_embeddings(['b'], provider)
+        self.assertEqual(len(clients), 2)
+        self.assertIs(clients[0], clients[1])
+
+    def test_retry_after_is_capped(self):
+        error = SimpleNamespace(response=SimpleNamespace(headers={'retry-after': '3600'}))
+        self.assertEqual(openai_client._backoff_seconds(0, error), openai_client.BACKOFF_MAX_SECONDS)
+
+
+class KeywordSearchTests(SimpleTestCase):
+    """
+    BM25 scoring and rank fusion.
+    """
+
+    def setUp(self):
+        self.index = BM25Index.build([
+            ('a', 'The SH-101 arpeggiator plays held notes up and down.'),
+            ('b', 'Set the VCF cutoff and resonance before saving a patch.'),
+            ('c', 'Resonance adds a peak at the cutoff. More resonance self-oscillates.'),
+            ('d', 'Battery compartment and power supply.'),
+        ])
+
+    def test_model_names_match_however_they_are_written(self):
+        self.assertIn('sh101', tokenize('SH-101'))
+        for query in ('SH101', 'sh 101', 'SH-101'):
+            self.assertEqual(self.index.search(query)[0][0], 'a')
+
+    def test_results_are_scored_best_first(self):
+        results = self.index.search('resonance cutoff')
+        self.assertEqual([vector_id for vector_id, _ in results], ['c', 'b'])
+        self.assertGreater(results[0][1], results[1][1])
+
+    def test_top_k_and_misses(self):
+        self.assertEqual(len(self.index.search('resonance cutoff', top_k=1)), 1)
+        self.assertEqual(self.index.search('sequencer'), [])
+        self.assertEqual(BM25Index.build([]).search('resonance'), [])
+
+    def test_round_trips_through_bytes(self):
+        loaded = BM25Index.from_bytes(self.index.to_bytes())
+        self.assertEqual(loaded.search('resonance cutoff'), self.index.search('resonance cutoff'))
+
+    @override_settings(RAG_RERANKER='')
+    def test_manuals_are_ranked_together_before_fusion(self):
+        first, second = Manual(pk=1, name='DFAM'), Manual(pk=2, name='Mother-32')
+
+        def match(vector_id, score):
+            return VectorMatch(vector_id, score, 1, '', vector_id)
+
+        chunks = fuse_manuals(
+            [first, second],
+            'sync',
+            [[match('1-a', 0.9), match('1-b', 0.5)], [match('2-a', 0.8), match('2-b', 0.7)]],
+            # BM25 scores only compare within a manual
+            [[('1-a', 20.0), ('1-b', 10.0)], [('2-b', 2.0), ('2-a', 1.0)]],
+            top_k=4,
+        )
+        self.assertEqual([chunk.vector_id for chunk in chunks], ['1-a', '2-b', '2-a', '1-b'])
+        self.assertEqual([chunk.source for chunk in chunks], [str(first), str(second), str(second), str(first)])
+
+    def test_rank_fusion_rewards_agreement(self):
+        fused = reciprocal_rank_fusion([['a', 'b'], ['b', 'c']], k=60)
+        self.assertEqual([item for item, _ in fused], ['b', 'a', 'c'])
+        self.assertAlmostEqual(dict(fused)['b'], 1 / 62 + 1 / 61)
+        self.assertAlmostEqual(dict(fused)['c'], 1 / 62)
+
+
+@override_settings(RAG_ANSWER_CACHE_MAX_ENTRIES=2, RAG_ANSWER_CACHE_THRESHOLD=0.95)
+class AnswerCacheTests(SimpleTestCase):
+    """
+    Similarity hits, LRU eviction and concurrent writers.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.manual = SimpleNamespace(pk=1)
+
+    def vector(self, *values):
+        return np.array(values + (0.0,) * (4 - len(values)), dtype=np.float32)
+
+    def test_similar_questions_hit(self):
+        answer_cache.store(self.manual, self.vector(1.0, 0.1), 'Hold FUNC.', [{'page': 3}])
+        self.assertEqual(answer_cache.lookup(self.manual, self.vector(1.0, 0.12)), ('Hold FUNC.', [{'page': 3}]))
+        self.assertIsNone(answer_cache.lookup(self.manual, self.vector(0.0, 1.0)))
+        counts = answer_cache.stats.as_dict()
+        self.assertEqual((counts['hits'], counts['misses'], counts['hit_rate']), (1, 1, 0.5))
+
+    def test_least_recently_used_is_evicted(self):
+        for index, text in enumerate(['first', 'second', 'third']):
+            answer_cache.store(self.manual, self.vector(*[0.0] * index, 1.0), text, [])
+        self.assertIsNone(answer_cache.lookup(self.manual, self.vector(1.0)))
+        self.assertEqual(answer_cache.lookup(self.manual, self.vector(0.0, 0.0, 1.0))[0], 'third')
+        self.assertEqual(answer_cache.stats.as_dict()['evictions'], 1)
+
+    def test_store_skips_while_another_writer_holds_the_lock(self):
+        answer_cache.store(self.manual, self.vector(1.0), 'first', [])
+        lock_key = f'{answer_cache._index_key(self.manual.pk)}:lock'
+        cache.add(lock_key, 1)
+        answer_cache.store(self.manual, self.vector(0.0, 1.0), 'second', [])
+        cache.delete(lock_key)
+
+        self.assertEqual(answer_cache.lookup(self.manual, self.vector(1.0))[0], 'first')
+        self.assertIsNone(answer_cache.lookup(self.manual, self.vector(0.0, 1.0)))
+
+
+class LocalVectorStoreTests(SimpleTestCase):
+    """
+    The NumPy index and the store's pending adds and removes.
+    """
+
+    def setUp(self):
+        index_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(index_dir.cleanup)
+        self.store = LocalVectorStore(root=index_dir.name)
+        self.manual = Manual(pk=1)
+
+    @staticmethod
+    def chunk(vector_id):
+        return SimpleNamespace(vector_id=vector_id, page_number=1, heading='VCF', text=vector_id)
+
+    def add(self, *vector_ids):
+        # Each vector points along its own axis
+        vectors = np.zeros((len(vector_ids), 4))
+        vectors[np.arange(len(vector_ids)), [int(vector_id[1:]) for vector_id in vector_ids]] = 2.0
+        self.store.add(self.manual, [self.chunk(vector_id) for vector_id in vector_ids], vectors)
+
+    def search(self, vector, top_k=4):
+        return [match.vector_id for match in self.store.query(self.manual, vector, top_k)]
+
+    def test_search_orders_by_cosine_similarity(self):
+        index = ManualIndex(normalize([[1, 0], [0.6, 0.8], [0, 1]]), [('a',), ('b',), ('c',)])
+        hits = index.search(normalize([[1, 0.1], [0, 1]]), top_k=2)
+        self.assertEqual([[row for row, _ in query] for query in hits], [[0, 1], [2, 1]])
+        self.assertAlmostEqual(hits[1][0][1], 1.0, places=5)
+        self.assertEqual(len(index.search(normalize([[1, 0]]), top_k=10)[0]), 3)
+        self.assertEqual(ManualIndex.empty(2, np.float32).search(normalize([[1, 0]]), 3), [[]])
+
+    def test_changes_apply_in_order_at_finish(self):
+        self.add('v0', 'v1')
+        self.assertEqual(self.search([1, 0, 0, 0]), [])
+        self.store.finish(self.manual)
+        self.assertEqual(self.search([1, 0, 0, 0], top_k=1), ['v0'])
+
+        self.add('v2')
+        self.store.remove(self.manual, ['v0'])
+        self.add('v3')
+        self.store.remove(self.manual, ['v3'])
+        self.add('v3')
+        self.store.finish(self.manual)
+
+        self.assertEqual(sorted(self.search([1, 1, 1, 1])), ['v1', 'v2', 'v3'])
+        self.assertEqual(self.search([0, 0, 0, 1], top_k=1), ['v3'])
+        self.assertEqual(sorted(path.name for path in self.store._dir(1).iterdir()), [
+            'CURRENT', 'rows-2.json', 'vectors-2.npy',
+        ])
+
+
+@override_settings(RAG_EMBEDDING_PROVIDER='stub', RAG_VECTOR_STORE='local')
+class IngestionTests(TestCase):
+    """
+    The Celery ingestion pipeline, run eagerly on a manual shipped in
+    MANUALS_ROOT.
+    """
+
+    def setUp(self):
+        index_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(index_dir.cleanup)
+        local_settings = self.settings(RAG_LOCAL_INDEX_DIR=index_dir.name)
+        local_settings.enable()
+        self.addCleanup(local_settings.disable)
+        # A fresh store, as the shared one may belong to other settings
+        store = mock.patch.object(vector_store, '_store', None)
+        store.start()
+        self.addCleanup(store.stop)
+        self.manual = Manual.objects.create(
+            name='DFAM', manufacturer='Moog', pdf_path='Moog/DFAM/Syncing_Multiple_DFAMS.pdf'
+        )
+
+    def ingest(self, force=False):
+        with self.captureOnCommitCallbacks(execute=True):
+            run = start_ingestion(self.manual, force=force)
+        run.refresh_from_db()
+        return run
+
+    def test_ingests_and_searches_a_manual(self):
+        run = self.ingest()
+
+        self.assertEqual((run.status, run.error), ('succeeded', ''))
+        self.manual.refresh_from_db()
+        self.assertEqual(run.pages_total, self.manual.page_count)
+        self.assertEqual(ManualPage.objects.filter(manual=self.manual).count(), self.manual.page_count)
+        chunks = Chunk.objects.filter(manual=self.manual)
+        self.assertEqual(run.chunks_embedded, chunks.count())
+        self.assertTrue(KeywordIndex.objects.filter(manual=self.manual).exists())
+
+        question = 'How do I sync multiple DFAMs?'
+        vector_ids = set(chunks.values_list('vector_id', flat=True))
+        matches = vector_search(self.manual, question, 5)
+        hits = keyword_search(self.manual, question, 5)
+        self.assertEqual(len(matches), min(5, len(vector_ids)))
+        self.assertTrue(hits)
+        self.assertTrue({match.vector_id for match in matches} | {vector_id for vector_id, _ in hits} <= vector_ids)
+
+    def test_unchanged_manual_embeds_nothing(self):
+        first = self.ingest()
+        again = self.ingest()
+        self.assertEqual(again.status, 'succeeded')
+        self.assertEqual((again.pages_changed, again.chunks_embedded, again.chunks_deleted), (0, 0, 0))
+        self.assertEqual(Chunk.objects.filter(manual=self.manual).count(), first.chunks_embedded)
+
+    def test_heading_changes_reach_later_pages(self):
+        def sync(heading):
+            pages = [PageText(1, f'{heading}\nThe filter section.'), PageText(2, 'Cutoff sets the brightness.')]
+            stats = IngestionStats(manual_id=self.manual.pk)
+            _ingest_pages(self.manual, [(None, 2, page) for page in pages], stats, force=False)
+            return stats
+
+        sync('VCF SECTION')
+        stats = sync('FILTER SECTION')
+        self.assertEqual(stats.pages_changed, 2)
+        self.assertEqual(set(Chunk.objects.filter(manual=self.manual).values_list('heading', flat=True)), {'FILTER SECTION'})
+        index = vector_store.get_vector_store().load(self.manual.pk)
+        self.assertEqual({heading for _, _, heading, _ in index.rows}, {'FILTER SECTION'})
+
+    def test_one_active_run_per_manual(self):
+        pending = IngestionRun.objects.create(manual=self.manual)
+        self.assertIsNone(start_ingestion(self.manual))
+
+        # A run that stopped making progress no longer blocks a new one
+        IngestionRun.objects.filter(pk=pending.pk).update(updated_at='2000-01-01T00:00Z')
+        run = self.ingest()
+        self.assertEqual(run.status, 'succeeded')
+        pending.refresh_from_db()
+        self.assertEqual(pending.status, 'failed')
+
+    def test_deleting_a_manual_removes_its_vectors(self):
+        self.ingest()
+        store = vector_store.get_vector_store()
+        manual_id = self.manual.pk
+        self.assertIsNotNone(store.load(manual_id))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.manual.delete()
+        self.assertIsNone(store.load(manual_id))
+        self.assertFalse(store._dir(manual_id).exists())
+
+
+def words(count, start=0):
+    return ' '.join(f'w{index}' for index in range(start, start + count))
+
+
+def retrieved(text, page=1, heading='VCF', vector_id=None):
+    return RetrievedChunk(vector_id or f'{page}-{text[:12]}', page, heading, text, 0.0)
+
+
+@override_settings(RAG_HISTORY_TOKEN_BUDGET=100, RAG_HISTORY_MESSAGE_TOKENS=20, RAG_SUMMARY_TOKENS=30)
+class PackPromptTests(SimpleTestCase):
+    """
+    Excerpt joining and the prompt token budget.
+    """
+
+    def pack(self, chunks, budget, history=(), summary=''):
+        return pack_prompt('System.', 'Excerpts', 'How?', chunks, history, summary, budget=budget)
+
+    def assertWithinBudget(self, packed, budget):
+        counted = sum(token_counts([message['content'] for message in packed.messages]))
+        self.assertLessEqual(counted + MESSAGE_OVERHEAD * len(packed.messages), budget)
+        self.assertLessEqual(packed.tokens, budget)
+
+    def test_overlapping_and_repeated_chunks_become_one_excerpt(self):
+        first, second = words(60), words(60, start=40)
+        excerpts = build_excerpts([
+            retrieved(first, vector_id='a'),
+            retrieved(second, vector_id='b'),
+            retrieved(' ' + first + ' ', page=9, vector_id='c'),
+        ])
+        self.assertEqual(len(excerpts), 1)
+        self.assertEqual(excerpts[0].text, words(100))
+        self.assertEqual([chunk.vector_id for chunk in excerpts[0].chunks], ['a', 'b'])
+
+    def test_excerpts_that_do_not_fit_are_skipped(self):
+        chunks = [
+            retrieved(words(20), page=1, heading='A'),
+            retrieved(words(200), page=5, heading='B'),
+            retrieved(words(15), page=9, heading='C'),
+        ]
+        packed = self.pack(chunks, budget=120)
+        self.assertEqual([chunk.heading for chunk in packed.chunks], ['A', 'C'])
+        self.assertWithinBudget(packed, 120)
+
+    def test_best_excerpt_is_cut_when_nothing_fits(self):
+        packed = self.pack([retrieved(words(300))], budget=80)
+        self.assertEqual(len(packed.chunks), 1)
+        self.assertTrue(packed.messages[1]['content'].endswith(TRUNCATION_MARK))
+        self.assertWithinBudget(packed, 80)
+
+    def test_history_keeps_the_newest_messages(self):
+        history = [
+            SimpleNamespace(role='user' if index % 2 == 0 else 'assistant', content=words(12, start=index * 100))
+            for index in range(6)
+        ]
+        packed = self.pack([retrieved(words(20))], budget=1000, history=history, summary=words(80))
+        contents = [message['content'] for message in packed.messages]
+
+        # Summary cut to RAG_SUMMARY_TOKENS, which leaves room only for the last exchange
+        self.assertTrue(contents[2].endswith(TRUNCATION_MARK))
+        self.assertEqual(contents[3:-1], [history[4].content, history[5].content])
+        self.assertEqual(contents[-1], 'How?')
+        self.assertWithinBudget(packed, 1000)
+
+    def test_older_history_is_truncated(self):
+        history = [SimpleNamespace(role='user', content=words(12, start=index * 100)) for index in range(3)]
+        packed = self.pack([], budget=1000, history=history)
+        contents = [message['content'] for message in packed.messages]
+        self.assertTrue(contents[2].endswith(TRUNCATION_MARK))
+        self.assertEqual(contents[3:5], [history[1].content, history[2].content])
+
+
+class RerankerTests(SimpleTestCase):
+    """
+    Reranking falls back to the fused order unless a reranker is loaded.
+    """
+
+    def setUp(self):
+        loading = mock.patch.object(reranker, '_loading', None)
+        loading.start()
+        self.addCleanup(loading.stop)
+        self.chunks = [
+            RetrievedChunk('a', 1, 'Battery', words(40), 0.03, vector_rank=1),
+            RetrievedChunk('b', 2, 'Filter cutoff', 'Turn the filter cutoff knob. ' * 10, 0.02, keyword_rank=1),
+        ]
+
+    def rerank(self):
+        reranker.load_reranker().result()
+        return [chunk.vector_id for chunk in reranker.rerank('How do I set the filter cutoff?', self.chunks, 2)]
+
+    @override_settings(RAG_RERANKER='cross-encoder')
+    def test_a_reranker_that_fails_to_load_keeps_the_fused_order(self):
+        build = mock.Mock(side_effect=ModuleNotFoundError("No module named 'sentence_transformers'"))
+        with mock.patch.dict(reranker.RERANKERS, {'cross-encoder': build}), self.assertLogs(reranker.logger):
+            self.assertEqual(self.rerank(), ['a', 'b'])
+            self.assertEqual(self.rerank(), ['a', 'b'])
+        # The failure is remembered
+        build.assert_called_once()
+
+    @override_settings(RAG_RERANKER='features')
+    def test_features_reranker_reorders(self):
+        self.assertEqual(self.rerank(), ['b', 'a'])
+
+    @override_settings(RAG_RERANKER='')
+    def test_off(self):
+        self.assertIsNone(reranker.load_reranker())
+        self.assertEqual([chunk.vector_id for chunk in reranker.rerank('cutoff', self.chunks, 1)], ['a'])
@@ -0,0 +1,252 @@
+"""
+Vector store backends used by ingestion and retrieval.
+
+settings.RAG_VECTOR_STORE selects the backend:
+    'pinecone' - vectors live in the manual's Pinecone namespace
+    'pgvector' - vectors live in Chunk.embedding, searched in Postgres
+    'local'    - vectors live in per-manual NumPy files (development and CI)
+
+With pgvector, RAG_HOT_CACHE_MIN_QUERIES > 0 puts an in-process NumPy index
+in front of Postgres for manuals queried at least that many times.
+
+Every backend has finish(manual), which ingestion calls once a manual's
+chunks are stored, and delete_manual(manual), called once a deleted
+manual's transaction commits (see signals.py).
+"""
+import threading
+from collections import Counter
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from pgvector.django import CosineDistance
+
+from .cache_versions import get_manual_version
+from .local_index import LocalVectorStore
+from .models import Chunk
+from .pinecone_client import get_pinecone_client, vector_namespace
+
+# pgvector's default hnsw.ef_search; an HNSW scan returns at most this
+# many rows
+DEFAULT_EF_SEARCH = 40
+
+
+@dataclass(frozen=True)
+class VectorMatch:
+    """
+    One similarity search result. Higher score is more similar.
+    """
+    vector_id: str
+    score: float
+    page_number: int
+    heading: str
+    text: str
+
+
+class PineconeVectorStore:
+    """
+    Stores each manual's vectors in its own Pinecone namespace.
+    """
+
+    def add(self, manual, chunks, embeddings):
+        """
+        Store embeddings for unsaved chunks.
+        """
+        get_pinecone_client().upsert_vectors(vector_namespace(manual), [
+            {
+                'id': chunk.vector_id,
+                'values': list(embedding),
+                'metadata': {
+                    'manual_id': manual.pk,
+                    'page': chunk.page_number,
+                    'heading': chunk.heading,
+                    'text': chunk.text,
+                },
+            }
+            for chunk, embedding in zip(chunks, embeddings)
+        ])
+
+    def remove(self, manual, vector_ids):
+        """
+        Delete vectors by id.
+        """
+        get_pinecone_client().delete_vectors(vector_namespace(manual), vector_ids)
+
+    def finish(self, manual):
+        pass
+
+    def delete_manual(self, manual):
+        get_pinecone_client().delete_namespace(vector_namespace(manual))
+
+    def query(self, manual, vector, top_k=5):
+        """
+        Return the top_k VectorMatches for a query vector within one manual.
+        """
+        matches = get_pinecone_client().query_vectors(vector_namespace(manual), vector, top_k)
+        return [
+            VectorMatch(
+                vector_id=match['id'],
+                score=match['score'],
+                page_number=int(match['metadata'].get('page', 0)),
+                heading=match['metadata'].get('heading', ''),
+                text=match['metadata'].get('text', ''),
+            )
+            for match in matches
+        ]
+
+
+def manual_index_name(manual_id):
+    return f'chunks_embedding_hnsw_m{int(manual_id)}'
+
+
+def create_manual_index(manual_id, using='default'):
+    """
+    Build a partial HNSW index over one manual's chunk embeddings, unless
+    it exists. Concurrently (not blocking other manuals' ingestion) when
+    not inside a transaction.
+    """
+    connection = connections[using]
+    concurrently = '' if connection.in_atomic_block else 'CONCURRENTLY '
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE INDEX {concurrently}IF NOT EXISTS {manual_index_name(manual_id)} '
+            f'ON {Chunk._meta.db_table} USING hnsw (embedding vector_cosine_ops) '
+            f'WITH (m = 16, ef_construction = 64) WHERE manual_id = {int(manual_id)}'
+        )
+
+
+def drop_manual_index(manual_id, using='default'):
+    """
+    Drop a manual's partial HNSW index, concurrently when not inside a
+    transaction.
+    """
+    connection = connections[using]
+    concurrently = '' if connection.in_atomic_block else 'CONCURRENTLY '
+    with connection.cursor() as cursor:
+        cursor.execute(f'DROP INDEX {concurrently}IF EXISTS {manual_index_name(manual_id)}')
+
+
+class PgVectorStore:
+    """
+    Stores vectors on the Chunk rows themselves.
+    Writes happen when ingestion inserts the chunks; removal happens when
+    it deletes them, so add() and remove() only prepare the rows.
+
+    The global HNSW index can't filter by manual: it returns the
+    ef_search nearest chunks of the whole library and the manual filter
+    is applied afterwards, leaving a few rows or none. Each manual
+    therefore gets its own partial HNSW index (WHERE manual_id = pk),
+    which Postgres picks for single-manual searches, and ef_search is
+    raised to top_k for larger searches.
+    """
+
+    def add(self, manual, chunks, embeddings):
+        for chunk, embedding in zip(chunks, embeddings):
+            chunk.embedding = embedding
+
+    def remove(self, manual, vector_ids):
+        pass
+
+    def finish(self, manual):
+        create_manual_index(manual.pk)
+
+    def delete_manual(self, manual):
+        # The chunks (and their vectors) went with the manual's row
+        drop_manual_index(manual.pk)
+
+    def query(self, manual, vector, top_k=5):
+        using = router.db_for_read(Chunk)
+        chunks = (
+            Chunk.objects.using(using)
+            .filter(manual=manual, embedding__isnull=False)
+            .annotate(distance=CosineDistance('embedding', vector))
+            .only('vector_id', 'page_number', 'heading', 'text')
+            .order_by('distance')[:top_k]
+        )
+        if top_k > DEFAULT_EF_SEARCH:
+            with transaction.atomic(using=using):
+                with connections[using].cursor() as cursor:
+                    cursor.execute('SET LOCAL hnsw.ef_search = %s', [top_k])
+                chunks = list(chunks)
+        return [
+            VectorMatch(
+                vector_id=chunk.vector_id,
+                score=1.0 - chunk.distance,
+                page_number=chunk.page_number,
+                heading=chunk.heading,
+                text=chunk.text,
+            )
+            for chunk in chunks
+        ]
+
+
+class HotCacheVectorStore:
+    """
+    Wraps a primary store and serves frequently queried manuals from a
+    LocalVectorStore built from their Chunk embeddings. A local index is
+    only used while its version matches the manual's current version.
+    """
+
+    def __init__(self, primary, local, min_queries):
+        self.primary = primary
+        self.local = local
+        self.min_queries = min_queries
+        self._query_counts = Counter()
+        self._lock = threading.Lock()
+
+    def add(self, manual, chunks, embeddings):
+        self.primary.add(manual, chunks, embeddings)
+        self.local.drop(manual.pk)
+
+    def remove(self, manual, vector_ids):
+        self.primary.remove(manual, vector_ids)
+        self.local.drop(manual.pk)
+
+    def finish(self, manual):
+        self.primary.finish(manual)
+
+    def delete_manual(self, manual):
+        self.primary.delete_manual(manual)
+        self.local.drop(manual.pk)
+
+    def query(self, manual, vector, top_k=5):
+        version = get_manual_version(manual.pk)
+        index = self.local.load(manual.pk)
+        if index is not None and index.version == version:
+            return self.local.query(manual, vector, top_k)
+
+        with self._lock:
+            self._query_counts[manual.pk] += 1
+            promote = self._query_counts[manual.pk] >= self.min_queries
+        if not promote:
+            return self.primary.query(manual, vector, top_k)
+
+        chunks = Chunk.objects.filter(manual=manual, embedding__isnull=False).only(
+            'vector_id', 'page_number', 'heading', 'text', 'embedding'
+        )
+        self.local.build(manual, chunks, version)
+        with self._lock:
+            self._query_counts.pop(manual.pk, None)
+        return self.local.query(manual, vector, top_k)
+
+
+VECTOR_STORES = {
+    'pinecone': PineconeVectorStore,
+    'pgvector': PgVectorStore,
+    'local': LocalVectorStore,
+}
+
+_store = None
+
+
+def get_vector_store():
+    """
+    Return the shared vector store selected by settings.RAG_VECTOR_STORE.
+    """
+    global _store
+    if _store is None:
+        store = VECTOR_STORES[settings.RAG_VECTOR_STORE]()
+        if settings.RAG_VECTOR_STORE == 'pgvector' and settings.RAG_HOT_CACHE_MIN_QUERIES > 0:
+            store = HotCacheVectorStore(store, LocalVectorStore(), settings.RAG_HOT_CACHE_MIN_QUERIES)
+        _store = store
+    return _store
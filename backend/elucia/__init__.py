@@ -1,4 +1,9 @@
 import os
 
 # Default to development settings
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'elucia.settings.development')
\ No newline at end of file
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'elucia.settings.development')
+
+# Load the Celery app with Django so shared_task uses it
+from .celery import app as celery_app  # noqa: E402
+
+__all__ = ('celery_app',)
@@ -9,8 +9,21 @@ https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
 
 import os
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
+from django.core.exceptions import ImproperlyConfigured
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'elucia.settings')
 
 application = get_asgi_application()
+
+# Persistent connections leak under ASGI (see DB_POOL_MODE in settings)
+if settings.DB_POOL_MODE == 'persistent':
+    raise ImproperlyConfigured(
+        "DB_POOL_MODE 'persistent' doesn't work under ASGI; use 'transaction' with a pooler, or 'direct'"
+    )
+
+# Start loading the optional reranker before the first question needs it
+from apps.rag.reranker import load_reranker  # noqa: E402
+
+load_reranker()
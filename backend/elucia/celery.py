@@ -0,0 +1,17 @@
+"""
+Celery application. Workers are started with:
+
+    celery -A elucia worker --loglevel=info
+
+Settings prefixed CELERY_ configure it; tasks are discovered in each
+app's tasks.py.
+"""
+import os
+
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'elucia.settings.development')
+
+app = Celery('elucia')
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
@@ -0,0 +1,108 @@
+"""
+Read-replica routing.
+
+Replicas are listed in settings.DATABASE_REPLICAS (aliases in DATABASES).
+Reads only go to a replica inside replica_reads(), which views opt into
+with ReplicaReadMixin, and only for models of REPLICA_APPS; everything
+else, including sessions and auth, reads from the primary.
+
+A client that has just written (any unsafe request) is pinned to the
+primary for DATABASE_REPLICA_PIN_SECONDS by a cookie, so it reads its own
+writes despite replication lag.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.utils.decorators import sync_and_async_middleware
+from rest_framework.permissions import SAFE_METHODS
+
+PRIMARY = 'default'
+PIN_COOKIE = 'primary_pin'
+REPLICA_APPS = {'manuals', 'chat'}
+
+_replica_reads = ContextVar('replica_reads', default=False)
+
+
+@contextmanager
+def replica_reads(enabled=True):
+    """
+    Route reads of REPLICA_APPS models to a replica within the block.
+    """
+    token = _replica_reads.set(enabled and bool(settings.DATABASE_REPLICAS))
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def is_pinned(request):
+    return PIN_COOKIE in request.COOKIES
+
+
+class ReplicaRouter:
+    """
+    Writes, migrations and reads outside replica_reads() use the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        if _replica_reads.get() and model._meta.app_label in REPLICA_APPS:
+            return random.choice(settings.DATABASE_REPLICAS)
+        return PRIMARY
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY
+
+
+def _pin(request, response):
+    if request.method not in SAFE_METHODS and settings.DATABASE_REPLICAS:
+        response.set_cookie(
+            PIN_COOKIE,
+            '1',
+            max_age=settings.DATABASE_REPLICA_PIN_SECONDS,
+            secure=settings.SESSION_COOKIE_SECURE,
+            httponly=True,
+            samesite='Lax',
+        )
+    return response
+
+
+@sync_and_async_middleware
+def primary_pinning_middleware(get_response):
+    """
+    Pin clients to the primary after a write (see module docstring).
+    """
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            return _pin(request, await get_response(request))
+    else:
+        def middleware(request):
+            return _pin(request, get_response(request))
+    return middleware
+
+
+class ReplicaReadMixin:
+    """
+    DRF view mixin serving safe requests from a replica, unless the client
+    is pinned to the primary. On viewsets only replica_actions are served.
+    """
+    replica_actions = ('list', 'retrieve')
+
+    def reads_from_replica(self, request):
+        if request.method not in SAFE_METHODS or is_pinned(request):
+            return False
+        action_map = getattr(self, 'action_map', None)
+        return action_map is None or action_map.get(request.method.lower()) in self.replica_actions
+
+    def dispatch(self, request, *args, **kwargs):
+        with replica_reads(self.reads_from_replica(request)):
+            return super().dispatch(request, *args, **kwargs)
@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/3.2/ref/settings/
 
 from pathlib import Path
 import os
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -20,6 +21,9 @@ load_dotenv()
 # Build paths inside the project
 BASE_DIR = Path(__file__).resolve().parent.parent.parent
 
+# Root of the manual PDF tree. Manual.pdf_path is resolved relative to this.
+MANUALS_ROOT = Path(os.getenv('MANUALS_ROOT', BASE_DIR.parent / 'manuals'))
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/3.2/howto/deployment/checklist/
@@ -42,6 +46,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     
     # Third party apps
     'rest_framework',
@@ -63,6 +68,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'elucia.db_routing.primary_pinning_middleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -98,6 +104,37 @@ DATABASES = {
     }
 }
 
+# Postgres connection handling (used by development and production),
+# selected by DB_POOL_MODE:
+#   'direct'      - a new connection for every request (the default)
+#   'persistent'  - connections reused for DB_CONN_MAX_AGE seconds and
+#                   health-checked before reuse; Postgres directly, WSGI
+#                   only
+#   'transaction' - through a transaction-mode pooler (PgBouncer, the
+#                   Supabase pooler on port 6543). Server-side cursors are
+#                   disabled because they don't survive transaction pooling.
+# Under ASGI each request runs in its own thread, so persistent connections
+# are never reused and pile up until Postgres runs out of slots. asgi.py
+# refuses to start with 'persistent': use 'transaction' with a pooler.
+DB_POOL_MODE = os.getenv('DB_POOL_MODE', 'direct')
+if DB_POOL_MODE not in ('direct', 'persistent', 'transaction'):
+    raise ImproperlyConfigured(f'Unknown DB_POOL_MODE {DB_POOL_MODE!r}')
+POSTGRES_CONNECTION = {
+    'CONN_MAX_AGE': 0 if DB_POOL_MODE == 'direct' else int(os.getenv('DB_CONN_MAX_AGE', '600')),
+    'CONN_HEALTH_CHECKS': DB_POOL_MODE != 'direct',
+    'DISABLE_SERVER_SIDE_CURSORS': DB_POOL_MODE == 'transaction',
+    'OPTIONS': {
+        'connect_timeout': int(os.getenv('DB_CONNECT_TIMEOUT', '5')),
+    },
+}
+
+# Read replicas: aliases in DATABASES (see production.py). List and detail
+# reads of manuals and conversations go to a replica, except for clients
+# that wrote within DATABASE_REPLICA_PIN_SECONDS (see elucia/db_routing.py)
+DATABASE_REPLICAS = []
+DATABASE_REPLICA_PIN_SECONDS = int(os.getenv('DATABASE_REPLICA_PIN_SECONDS', '5'))
+DATABASE_ROUTERS = ['elucia.db_routing.ReplicaRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -157,4 +194,74 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.SessionAuthentication',
     ],
-}
\ No newline at end of file
+}
+
+# RAG settings
+OPENAI_EMBEDDING_MODEL = os.getenv('OPENAI_EMBEDDING_MODEL', 'text-embedding-3-small')
+EMBEDDING_DIMENSIONS = 1536
+# 'openai' or 'stub' (deterministic offline vectors for tests and benchmarks)
+RAG_EMBEDDING_PROVIDER = os.getenv('RAG_EMBEDDING_PROVIDER', 'openai')
+EMBEDDING_CONCURRENCY = int(os.getenv('EMBEDDING_CONCURRENCY', '4'))
+EMBEDDING_MAX_RETRIES = int(os.getenv('EMBEDDING_MAX_RETRIES', '6'))
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv('EMBEDDING_CACHE_MAX_ENTRIES', '500000'))
+OPENAI_CHAT_MODEL = os.getenv('OPENAI_CHAT_MODEL', 'gpt-4o-mini')
+RAG_CHAT_PROVIDER = os.getenv('RAG_CHAT_PROVIDER', 'openai')
+# 'pinecone', 'pgvector' or 'local'
+RAG_VECTOR_STORE = os.getenv('RAG_VECTOR_STORE', 'pinecone')
+RAG_LOCAL_INDEX_DIR = Path(os.getenv('RAG_LOCAL_INDEX_DIR', BASE_DIR / 'var' / 'vector_index'))
+RAG_LOCAL_INDEX_DTYPE = os.getenv('RAG_LOCAL_INDEX_DTYPE', 'float32')  # or 'float16'
+RAG_LOCAL_INDEX_CACHE_SIZE = int(os.getenv('RAG_LOCAL_INDEX_CACHE_SIZE', '64'))
+# Queries before a pgvector manual is promoted to the in-process index (0 disables)
+RAG_HOT_CACHE_MIN_QUERIES = int(os.getenv('RAG_HOT_CACHE_MIN_QUERIES', '0'))
+# Hybrid retrieval: chunks returned, candidates per retriever, and the time
+# allowed for both retrievers before falling back to whichever finished
+RAG_TOP_K = int(os.getenv('RAG_TOP_K', '6'))
+RAG_RETRIEVAL_CANDIDATES = int(os.getenv('RAG_RETRIEVAL_CANDIDATES', '30'))
+RAG_RETRIEVAL_BUDGET_MS = int(os.getenv('RAG_RETRIEVAL_BUDGET_MS', '400'))
+# Optional reranking of the fused candidates: '' (off), 'features' or
+# 'cross-encoder' (needs sentence-transformers, model RAG_RERANK_MODEL);
+# candidates rescored, and the deadline before the fused order is used.
+# Reranked results are more precise, so RAG_TOP_K can usually be lowered
+RAG_RERANKER = os.getenv('RAG_RERANKER', '')
+RAG_RERANK_CANDIDATES = int(os.getenv('RAG_RERANK_CANDIDATES', '50'))
+RAG_RERANK_MODEL = os.getenv('RAG_RERANK_MODEL', 'cross-encoder/ms-marco-MiniLM-L-6-v2')
+RAG_RERANK_BUDGET_MS = int(os.getenv('RAG_RERANK_BUDGET_MS', '150'))
+# Prompt token budget (system prompt, excerpts, history and question), the
+# share of it history may use, and the length older messages are cut to
+RAG_PROMPT_TOKEN_BUDGET = int(os.getenv('RAG_PROMPT_TOKEN_BUDGET', '3000'))
+RAG_HISTORY_TOKEN_BUDGET = int(os.getenv('RAG_HISTORY_TOKEN_BUDGET', '800'))
+RAG_HISTORY_MESSAGE_TOKENS = int(os.getenv('RAG_HISTORY_MESSAGE_TOKENS', '150'))
+# Rolling conversation summary: messages that must age out of the prompt's
+# history before they're folded into it (0 disables), and its token limit
+RAG_SUMMARY_BATCH_MESSAGES = int(os.getenv('RAG_SUMMARY_BATCH_MESSAGES', '6'))
+RAG_SUMMARY_TOKENS = int(os.getenv('RAG_SUMMARY_TOKENS', '300'))
+# Async pipeline stage timeouts: question embedding (ms), and LLM generation
+# (seconds for a whole answer, or between two deltas of a streamed one)
+RAG_EMBEDDING_TIMEOUT_MS = int(os.getenv('RAG_EMBEDDING_TIMEOUT_MS', '2000'))
+RAG_GENERATION_TIMEOUT = int(os.getenv('RAG_GENERATION_TIMEOUT', '60'))
+# Semantic answer cache: per-manual entries (0 disables), minimum cosine
+# similarity to reuse an answer, and entry lifetime in seconds
+RAG_ANSWER_CACHE_MAX_ENTRIES = int(os.getenv('RAG_ANSWER_CACHE_MAX_ENTRIES', '200'))
+RAG_ANSWER_CACHE_THRESHOLD = float(os.getenv('RAG_ANSWER_CACHE_THRESHOLD', '0.95'))
+RAG_ANSWER_CACHE_TTL = int(os.getenv('RAG_ANSWER_CACHE_TTL', str(7 * 24 * 3600)))
+
+# Question quotas per subscription tier over a sliding window (None = unlimited)
+QUESTION_QUOTAS = {
+    'free': int(os.getenv('FREE_TIER_DAILY_QUESTIONS', '10')),
+    'premium': None,
+}
+QUOTA_WINDOW_SECONDS = 24 * 3600
+# 'redis' (shared by all workers) or 'local' (in-process, development only)
+QUOTA_BACKEND = os.getenv('QUOTA_BACKEND', 'local')
+QUOTA_REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+# Usage log entries are written in batches by a background thread (0 disables it)
+QUOTA_FLUSH_INTERVAL = int(os.getenv('QUOTA_FLUSH_INTERVAL', '10'))
+QUOTA_FLUSH_BATCH_SIZE = 500
+
+# Rendered manual catalog responses; invalidated whenever a manual changes
+CATALOG_CACHE_TIMEOUT = int(os.getenv('CATALOG_CACHE_TIMEOUT', str(24 * 3600)))
+
+# Celery: the broker and result backend (needed for the ingestion chords)
+# are set per environment. Ingestion tasks are long, so workers take one
+# at a time instead of prefetching batches other workers could run.
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
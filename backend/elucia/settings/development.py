@@ -13,12 +13,17 @@ DATABASES = {
         'PASSWORD': os.getenv('DB_PASSWORD', ''),
         'HOST': os.getenv('DB_HOST', 'localhost'),
         'PORT': os.getenv('DB_PORT', '5432'),
+        **POSTGRES_CONNECTION,
     }
 }
 
 # OpenAI
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
 
+# Pinecone
+PINECONE_API_KEY = os.getenv('PINECONE_API_KEY')
+PINECONE_INDEX_HOST = os.getenv('PINECONE_INDEX_HOST')
+
 # Supabase
 SUPABASE_URL = os.getenv('SUPABASE_URL')
 SUPABASE_KEY = os.getenv('SUPABASE_KEY')
@@ -20,11 +20,25 @@ DATABASES = {
         'PASSWORD': os.getenv('DB_PASSWORD'),
         'HOST': os.getenv('DB_HOST'),
         'PORT': os.getenv('DB_PORT', '5432'),
+        **POSTGRES_CONNECTION,
     }
 }
 
+# Read replicas, as comma-separated host[:port]; same credentials as the primary
+for index, address in enumerate(filter(None, os.getenv('DB_REPLICA_HOSTS', '').split(','))):
+    host, _, port = address.strip().partition(':')
+    DATABASES[f'replica_{index}'] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': port or DATABASES['default']['PORT'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica_{index}')
+
 # Same API keys as development
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
+PINECONE_API_KEY = os.getenv('PINECONE_API_KEY')
+PINECONE_INDEX_HOST = os.getenv('PINECONE_INDEX_HOST')
 SUPABASE_URL = os.getenv('SUPABASE_URL')
 SUPABASE_KEY = os.getenv('SUPABASE_KEY')
 SUPABASE_SERVICE_KEY = os.getenv('SUPABASE_SERVICE_KEY')
@@ -34,4 +48,15 @@ STRIPE_PRICE_ID = os.getenv('STRIPE_PRICE_ID')
 
 # Celery
 CELERY_BROKER_URL = os.getenv('REDIS_URL')
-CELERY_RESULT_BACKEND = os.getenv('REDIS_URL')
\ No newline at end of file
+CELERY_RESULT_BACKEND = os.getenv('REDIS_URL')
+
+# Cache - shared across workers (manual versions, answer and catalog caches)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('REDIS_URL'),
+    }
+}
+
+# Quota counters must be shared across workers
+QUOTA_BACKEND = 'redis'
@@ -0,0 +1,11 @@
+from .development import *
+
+# Celery tasks run inline, with in-memory stand-ins for the broker and
+# result backend, so no Redis or worker is needed
+CELERY_TASK_ALWAYS_EAGER = True
+CELERY_TASK_EAGER_PROPAGATES = True
+CELERY_BROKER_URL = 'memory://'
+CELERY_RESULT_BACKEND = 'cache+memory://'
+
+# Don't start the usage log flusher thread
+QUOTA_FLUSH_INTERVAL = 0
@@ -0,0 +1,39 @@
+from django.contrib.auth.models import User
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from apps.manuals.models import Manual
+from .db_routing import PIN_COOKIE, PRIMARY, ReplicaReadMixin, ReplicaRouter, primary_pinning_middleware, replica_reads
+
+
+@override_settings(DATABASE_REPLICAS=['replica'], DATABASE_REPLICA_PIN_SECONDS=5)
+class ReplicaRoutingTests(SimpleTestCase):
+    """
+    Replica reads are opt-in, and a write pins the client to the primary.
+    """
+
+    def setUp(self):
+        self.router = ReplicaRouter()
+        self.factory = RequestFactory()
+
+    def test_reads_go_to_a_replica_only_when_enabled(self):
+        self.assertEqual(self.router.db_for_read(Manual), PRIMARY)
+        with replica_reads():
+            self.assertEqual(self.router.db_for_read(Manual), 'replica')
+            # Auth and sessions always read from the primary
+            self.assertEqual(self.router.db_for_read(User), PRIMARY)
+            self.assertEqual(self.router.db_for_write(Manual), PRIMARY)
+        with self.settings(DATABASE_REPLICAS=[]), replica_reads():
+            self.assertEqual(self.router.db_for_read(Manual), PRIMARY)
+
+    def test_writes_pin_the_client_to_the_primary(self):
+        middleware = primary_pinning_middleware(lambda request: HttpResponse())
+        self.assertNotIn(PIN_COOKIE, middleware(self.factory.get('/api/manuals/')).cookies)
+        cookie = middleware(self.factory.post('/api/conversations/')).cookies[PIN_COOKIE]
+        self.assertEqual(cookie['max-age'], 5)
+
+        view = ReplicaReadMixin()
+        self.assertTrue(view.reads_from_replica(self.factory.get('/api/manuals/')))
+        pinned = self.factory.get('/api/manuals/')
+        pinned.COOKIES[PIN_COOKIE] = '1'
+        self.assertFalse(view.reads_from_replica(pinned))
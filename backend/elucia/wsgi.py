@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'elucia.settings')
 
 application = get_wsgi_application()
+
+# Start loading the optional reranker before the first question needs it
+from apps.rag.reranker import load_reranker  # noqa: E402
+
+load_reranker()
@@ -0,0 +1,155 @@
+"""
+Load benchmark for database connection handling (DB_POOL_MODE).
+
+Runs the same request load once per pool mode, each in a fresh process so
+the mode's settings apply, and reports throughput, latency percentiles and
+the number of database connections opened. Requests go through the WSGI
+application in-process from a fixed pool of threads, one per simulated
+server thread, so connections are reused exactly as under a threaded WSGI
+server. Point DB_HOST at the real database (or pooler) to include network
+and TLS setup costs.
+
+Usage (from backend/):
+    python -m scripts.benchmark_db_pool --username alice
+    python -m scripts.benchmark_db_pool --username alice --modes direct persistent --threads 16
+"""
+import argparse
+import io
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import django
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'elucia.settings.development')
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.core.wsgi import get_wsgi_application  # noqa: E402
+from django.db import connections  # noqa: E402
+from django.db.backends.signals import connection_created  # noqa: E402
+from django.test import Client  # noqa: E402
+
+MODES = ('direct', 'persistent', 'transaction')
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def session_cookie(username):
+    """
+    Log a user in and return the session cookie to send with requests.
+    """
+    client = Client()
+    client.force_login(get_user_model().objects.get(username=username))
+    connections.close_all()
+    return f'{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}'
+
+
+def run_load(path, cookie, threads, requests, warmup):
+    """
+    Send `requests` GETs (after `warmup` per thread) from `threads`
+    threads and return the latencies and connection count.
+    """
+    application = get_wsgi_application()
+    path, _, query = path.partition('?')
+    opened = []
+    connection_created.connect(lambda sender, connection, **kwargs: opened.append(1), weak=False)
+
+    def request():
+        environ = {
+            'REQUEST_METHOD': 'GET',
+            'PATH_INFO': path,
+            'QUERY_STRING': query,
+            'SERVER_NAME': 'localhost',
+            'SERVER_PORT': '443',
+            'HTTP_HOST': 'localhost',
+            'HTTP_COOKIE': cookie,
+            'wsgi.url_scheme': 'https',
+            'wsgi.input': io.BytesIO(),
+            'wsgi.errors': sys.stderr,
+        }
+        statuses = []
+        started = time.perf_counter()
+        response = application(environ, lambda status, headers: statuses.append(status))
+        try:
+            b''.join(response)
+        finally:
+            # Fires request_finished, which closes expired connections
+            response.close()
+        if not statuses[0].startswith('200'):
+            raise RuntimeError(f'GET {path} returned {statuses[0]}')
+        return time.perf_counter() - started
+
+    def worker(count):
+        return [request() for _ in range(count)]
+
+    counts = [requests // threads + (i < requests % threads) for i in range(threads)]
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(worker, [warmup] * threads))
+        opened_before = len(opened)
+        started = time.perf_counter()
+        latencies = [latency for result in executor.map(worker, counts) for latency in result]
+    return {
+        'seconds': time.perf_counter() - started,
+        'latencies': latencies,
+        'connections': len(opened) - opened_before,
+    }
+
+
+def report(mode, result):
+    latencies = sorted(result['latencies'])
+    milliseconds = {
+        name: percentile(latencies, fraction) * 1000
+        for name, fraction in (('p50', 0.50), ('p95', 0.95), ('p99', 0.99))
+    }
+    print(
+        f'{mode:<12} {len(latencies) / result["seconds"]:>8.0f} req/s   '
+        f'p50 {milliseconds["p50"]:6.2f} ms   p95 {milliseconds["p95"]:6.2f} ms   '
+        f'p99 {milliseconds["p99"]:6.2f} ms   {result["connections"]:>5} connections'
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--username', required=True, help='User to send the requests as')
+    parser.add_argument('--path', default='/api/users/me/', help='Endpoint to request')
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=['direct', 'persistent'])
+    parser.add_argument('--threads', type=int, default=8, help='Concurrent server threads')
+    parser.add_argument('--requests', type=int, default=2000, help='Measured requests per mode')
+    parser.add_argument('--warmup', type=int, default=10, help='Unmeasured requests per thread')
+    parser.add_argument('--run-mode', choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.run_mode:
+        # Child process: settings were loaded with DB_POOL_MODE=run_mode
+        cookie = session_cookie(args.username)
+        result = run_load(args.path, cookie, args.threads, args.requests, args.warmup)
+        print(json.dumps(result))
+        return
+
+    print(f'GET {args.path}: {args.requests} requests per mode from {args.threads} threads')
+    for mode in args.modes:
+        child = subprocess.run(
+            [sys.executable, '-m', 'scripts.benchmark_db_pool', '--run-mode', mode] + (argv or sys.argv[1:]),
+            cwd=BACKEND_DIR,
+            env={**os.environ, 'DB_POOL_MODE': mode},
+            capture_output=True,
+            text=True,
+        )
+        if child.returncode != 0:
+            sys.exit(f'{mode} run failed:\n{child.stderr}')
+        report(mode, json.loads(child.stdout.strip().splitlines()[-1]))
+
+
+if __name__ == '__main__':
+    main()
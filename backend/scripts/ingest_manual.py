@@ -0,0 +1,135 @@
+"""
+Ingest manual PDFs into the RAG knowledge base.
+
+Accepts a single PDF or a directory tree of PDFs. Manuals are looked up by
+pdf_path (relative to settings.MANUALS_ROOT) and created if missing.
+
+Usage (from backend/):
+    python -m scripts.ingest_manual ../manuals/Roland/Juno/JUNO-106.pdf
+    python -m scripts.ingest_manual ../manuals --workers 8
+    python -m scripts.ingest_manual ../manuals --benchmark-chunker
+    python -m scripts.ingest_manual ../manuals --queue   (Celery workers)
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import django
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'elucia.settings.development')
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.utils.text import slugify  # noqa: E402
+
+from apps.manuals.models import Manual  # noqa: E402
+from apps.rag.ingestion import ingest_manuals  # noqa: E402
+from apps.rag.pdf_processor import DEFAULT_BATCH_SIZE, find_pdfs, iter_documents  # noqa: E402
+from apps.rag.tasks import start_ingestion  # noqa: E402
+from apps.rag import text_chunker  # noqa: E402
+
+
+def manual_for_pdf(pdf_path):
+    """
+    Get or create the Manual row for a PDF on disk.
+    """
+    pdf_path = pdf_path.resolve()
+    root = Path(settings.MANUALS_ROOT).resolve()
+    try:
+        relative = pdf_path.relative_to(root)
+    except ValueError:
+        relative = None
+
+    stored_path = str(relative) if relative else str(pdf_path)
+    manual = Manual.objects.filter(pdf_path=stored_path).first()
+    if manual:
+        return manual
+
+    parts = (relative or Path(pdf_path.name)).with_suffix('').parts
+    return Manual.objects.create(
+        name=pdf_path.stem.replace('_', ' '),
+        manufacturer=parts[0] if len(parts) > 1 else '',
+        pdf_path=stored_path,
+        pinecone_namespace='-'.join(slugify(part) for part in parts),
+    )
+
+
+def benchmark_chunker(pdfs):
+    """
+    Print chunking throughput for a set of PDFs, per document.
+    """
+    for pdf in pdfs:
+        pages = [page for _, _, page in iter_documents([pdf])]
+        result = text_chunker.benchmark(pages)
+        print(
+            f'  {pdf.name}: {result["chunks"]} chunks from {result["pages"]} pages, '
+            f'{result["chunks_per_sec"]:,.0f} chunks/s, {result["pages_per_sec"]:,.0f} pages/s'
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('path', type=Path, help='PDF file or directory of PDFs')
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=os.cpu_count() or 1,
+        help='Extraction processes (0 to extract in-process)',
+    )
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='Pages per worker task')
+    parser.add_argument('--force', action='store_true', help='Re-embed every page, even if unchanged')
+    parser.add_argument(
+        '--benchmark-chunker',
+        action='store_true',
+        help='Report chunking throughput for the PDFs without ingesting them',
+    )
+    parser.add_argument(
+        '--queue',
+        action='store_true',
+        help='Queue the manuals for the Celery workers instead of ingesting here',
+    )
+    args = parser.parse_args(argv)
+
+    pdfs = find_pdfs(args.path)
+    if not pdfs:
+        parser.error(f'No PDFs found at {args.path}')
+    if args.benchmark_chunker:
+        benchmark_chunker(pdfs)
+        return
+    manuals = [manual_for_pdf(pdf) for pdf in pdfs]
+    if args.queue:
+        for manual in manuals:
+            run = start_ingestion(manual, force=args.force)
+            if run is None:
+                print(f'  {manual}: already being ingested, skipped')
+                continue
+            print(f'  {manual}: queued as ingestion run {run.pk}')
+        return
+
+    def report(manual, stats):
+        print(
+            f'  {manual}: {stats.pages} pages ({stats.pages_changed} changed, '
+            f'{stats.pages_removed} removed), {stats.chunks_embedded} chunks embedded, '
+            f'{stats.chunks_deleted} deleted in {stats.seconds:.2f}s'
+        )
+
+    print(f'Ingesting {len(manuals)} manual(s) with {args.workers} worker(s)')
+    started = time.perf_counter()
+    if args.workers > 0:
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            results = ingest_manuals(manuals, executor, args.batch_size, args.force, on_manual_done=report)
+    else:
+        results = ingest_manuals(manuals, None, args.batch_size, args.force, on_manual_done=report)
+
+    total_pages = sum(stats.pages for stats in results)
+    print(f'Done: {total_pages} pages in {time.perf_counter() - started:.2f}s')
+
+
+if __name__ == '__main__':
+    main()